@@ -1,6 +1,14 @@
 from pycstruct.pycstruct import StructDef
 from pycstruct.pycstruct import BitfieldDef
 from pycstruct.pycstruct import EnumDef
+from pycstruct.pycstruct import StringDef
+from pycstruct.pycstruct import BytesDef
+from pycstruct.pycstruct import StructView
+from pycstruct.pycstruct import RecordFile
 
 from pycstruct.cparser import parse_file
-from pycstruct.cparser import parse_str
\ No newline at end of file
+from pycstruct.cparser import parse_str
+from pycstruct.cparser import parse_files_parallel
+from pycstruct.cparser import parse_file_async
+from pycstruct.cparser import parse_str_async
+from pycstruct.cparser import IncrementalParser
\ No newline at end of file
@@ -0,0 +1,885 @@
+# Copyright 2020 by Joel Midstjärna.
+# All rights reserved.
+# This file is part of the pycstruct python library and is
+# released under the "MIT License Agreement". Please see the LICENSE
+# file that should have been included as part of this package.
+
+import sys, os, gc, time, json, copy, shutil, tempfile, platform, argparse, tracemalloc, collections
+import xml.etree.ElementTree as ET, xml.sax.saxutils
+import pycstruct, pycstruct.codegen, pycstruct.cparser
+
+
+###############################################################################
+# Global constants
+
+_REPEAT = 3 # Best of this number of measurements is used
+
+_MANY_RECORDS = 100 # Records per call of serialize_many
+
+_ALLOCATION_RECORDS = 100 # Records used when counting memory blocks
+
+_FORMAT_VERSION = 1 # Version of the JSON result format
+
+
+###############################################################################
+# Benchmark cases
+#
+# Each case returns a definition and a sample dictionary (or enum constant)
+# to serialize. The flat and nested cases have the same layouts and values
+# as struct_little.dat and embedded_struct.dat in the tests.
+
+def _flat():
+    m = pycstruct.StructDef('little')
+    for size in [8, 16, 32, 64]:
+        m.add('int{0}'.format(size), 'int{0}_low'.format(size))
+        m.add('int{0}'.format(size), 'int{0}_high'.format(size))
+        m.add('uint{0}'.format(size), 'uint{0}_low'.format(size))
+        m.add('uint{0}'.format(size), 'uint{0}_high'.format(size))
+        m.add('bool{0}'.format(size), 'bool{0}_false'.format(size))
+        m.add('bool{0}'.format(size), 'bool{0}_true'.format(size))
+        if size >= 32:
+            m.add('float{0}'.format(size), 'float{0}_low'.format(size))
+            m.add('float{0}'.format(size), 'float{0}_high'.format(size))
+    m.add('int32', 'int32_array', length = 5)
+    m.add('utf-8', 'utf8_ascii', 100)
+    m.add('utf-8', 'utf8_nonascii', 80)
+    m.add('utf-8', 'utf8_no_term', 4)
+
+    data = {}
+    for size in [8, 16, 32, 64]:
+        data['int{0}_low'.format(size)] = -(1 << (size - 1))
+        data['int{0}_high'.format(size)] = (1 << (size - 1)) - 1
+        data['uint{0}_low'.format(size)] = 0
+        data['uint{0}_high'.format(size)] = (1 << size) - 1
+        data['bool{0}_false'.format(size)] = False
+        data['bool{0}_true'.format(size)] = True
+    data['float32_low'] = 1.23456
+    data['float32_high'] = 12345.6
+    data['float64_low'] = 1.23456789
+    data['float64_high'] = 12345678.9
+    data['int32_array'] = [0, 1, 2, 3, 4]
+    data['utf8_ascii'] = 'This is a normal ASCII string!'
+    data['utf8_nonascii'] = 'This string has special characters ÅÄÖü'
+    data['utf8_no_term'] = 'ABCD'
+    return m, data
+
+def _car_definitions(alignment):
+    car_type = pycstruct.EnumDef('little', size = 4)
+    car_type.add('Sedan', 0)
+    car_type.add('Station_Wagon', 5)
+    car_type.add('Bus', 7)
+    car_type.add('Pickup', 12)
+
+    sedan = pycstruct.StructDef('little', alignment)
+    sedan.add('uint16', 'sedan_code')
+    station_wagon = pycstruct.StructDef('little', alignment)
+    station_wagon.add('int32', 'trunk_volume')
+    bus = pycstruct.StructDef('little', alignment)
+    bus.add('int32', 'number_of_passangers')
+    bus.add('uint16', 'number_of_entries')
+    bus.add('bool8', 'is_accordion_bus')
+    pickup = pycstruct.StructDef('little', alignment)
+    pickup.add('int32', 'truck_bed_volume')
+
+    type_properties = pycstruct.StructDef('little', alignment, union = True)
+    type_properties.add(sedan, 'sedan')
+    type_properties.add(station_wagon, 'station_wagon')
+    type_properties.add(bus, 'bus')
+    type_properties.add(pickup, 'pickup')
+
+    properties = pycstruct.BitfieldDef('little')
+    properties.add('env_class', 3)
+    properties.add('registered', 1)
+    properties.add('over_3500_kg', 1)
+
+    return car_type, type_properties, properties
+
+_CARS = [
+    {'year' : 2011, 'model' : 'Nissan Micra', 'registration_number' : 'AHF432',
+     'properties' : {'env_class' : 0, 'registered' : 1, 'over_3500_kg' : 0},
+     'type' : 'Sedan', 'type_properties' : {'sedan' : {'sedan_code' : 20}}},
+    {'year' : 2005, 'model' : 'Ford Focus', 'registration_number' : 'CCO544',
+     'properties' : {'env_class' : 1, 'registered' : 1, 'over_3500_kg' : 1},
+     'type' : 'Bus', 'type_properties' : {'bus' : {'number_of_passangers' : 44,
+                                                   'number_of_entries' : 3,
+                                                   'is_accordion_bus' : False}}},
+    {'year' : 1998, 'model' : 'Volkswagen Golf', 'registration_number' : 'HHT434',
+     'properties' : {'env_class' : 3, 'registered' : 0, 'over_3500_kg' : 0},
+     'type' : 'Pickup', 'type_properties' : {'pickup' : {'truck_bed_volume' : 155}}}
+]
+
+def _nested():
+    car_type, type_properties, properties = _car_definitions(1)
+
+    car = pycstruct.StructDef('little')
+    car.add('uint16', 'year')
+    car.add('utf-8', 'model', length = 50)
+    car.add('utf-8', 'registration_number', length = 10)
+    car.add(properties, 'properties')
+    car.add(car_type, 'type')
+    car.add(type_properties, 'type_properties')
+
+    garage = pycstruct.StructDef('little')
+    garage.add(car, 'cars', length = 20)
+    garage.add('uint8', 'nbr_registered_parkings')
+
+    house = pycstruct.StructDef('little')
+    house.add('uint8', 'nbr_of_levels')
+    house.add(garage, 'garage')
+
+    data = {'nbr_of_levels' : 5, 'garage' : {'cars' : _CARS, 'nbr_registered_parkings' : 3}}
+    return house, data
+
+def _same_level():
+    car_type, type_properties, properties = _car_definitions(8)
+
+    identity = pycstruct.StructDef('little', 8)
+    identity.add('uint16', 'year')
+    identity.add('utf-8', 'model', length = 50)
+    identity.add('utf-8', 'registration_number', length = 10)
+
+    car = pycstruct.StructDef('little', 8)
+    car.add(identity, 'identity', same_level = True)
+    car.add(properties, 'properties', same_level = True)
+    car.add(car_type, 'type')
+    car.add(type_properties, 'type_properties')
+
+    data = dict(_CARS[1])
+    data.update(data.pop('properties'))
+    return car, data
+
+def _large_array():
+    m = pycstruct.StructDef('little', 8)
+    m.add('uint32', 'counter')
+    m.add('float64', 'samples', length = 1024)
+    m.add('int16', 'levels', length = 4096)
+    m.add('int32', 'big_endian', length = 256, byteorder = 'big')
+
+    data = {'counter' : 1,
+            'samples' : [i * 0.5 for i in range(1024)],
+            'levels' : [i - 2048 for i in range(4096)],
+            'big_endian' : list(range(256))}
+    return m, data
+
+def _union():
+    a = pycstruct.StructDef('little')
+    a.add('uint32', 'id')
+    a.add('float64', 'values', length = 4)
+    b = pycstruct.StructDef('little')
+    b.add('uint8', 'raw', length = 36)
+
+    u = pycstruct.StructDef('little', union = True)
+    u.add(a, 'a')
+    u.add(b, 'b')
+    u.add('uint64', 'u64')
+    return u, {'a' : {'id' : 7, 'values' : [1.0, 2.0, 3.0, 4.0]}}
+
+def _bitfield():
+    b = pycstruct.BitfieldDef('little')
+    b.add('onebit', 1)
+    b.add('twobits', 2)
+    b.add('threebits', 3)
+    b.add('fourbits', 4)
+    b.add('fivesignedbits', 5, signed = True)
+    b.add('eightbits', 8)
+    b.add('eightsignedbits', 8, signed = True)
+    b.add('onesignedbit', 1, signed = True)
+    b.add('foursignedbits', 4, signed = True)
+    b.add('sixteensignedbits', 16, signed = True)
+    b.add('fivebits', 5)
+
+    data = {'onebit' : 1, 'twobits' : 3, 'threebits' : 4, 'fourbits' : 15,
+            'fivesignedbits' : -16, 'eightbits' : 200, 'eightsignedbits' : -100,
+            'onesignedbit' : -1, 'foursignedbits' : 7, 'sixteensignedbits' : -30000,
+            'fivebits' : 31}
+    return b, data
+
+def _enum():
+    e = pycstruct.EnumDef('little', size = 4, signed = True)
+    for i in range(256):
+        e.add('constant_{0}'.format(i), i - 128)
+    return e, 'constant_200'
+
+def _enum_array():
+    e, _ = _enum()
+    m = pycstruct.StructDef('little')
+    m.add(e, 'constants', length = 64)
+    return m, {'constants' : ['constant_{0}'.format(i * 3) for i in range(64)]}
+
+def _strings():
+    m = pycstruct.StructDef('little')
+    m.add('utf-8', 'name', length = 32)
+    m.add('utf-8', 'description', length = 256)
+    m.add('utf-8', 'nonascii', length = 64)
+    m.add('utf-8', 'empty', length = 16)
+    data = {'name' : 'pycstruct', 'description' : 'A string ' * 20,
+            'nonascii' : 'ÅÄÖü' * 5, 'empty' : ''}
+    return m, data
+
+def _payload():
+    m = pycstruct.StructDef('little', 4)
+    m.add('uint32', 'length')
+    m.add('bytes', 'payload', length = 4096)
+    return m, {'length' : 4000, 'payload' : bytes(range(256)) * 15 + bytes(160)}
+
+def _synthetic():
+    ''' Large struct with many members of mixed types '''
+    bitfield, bitfield_data = _bitfield()
+    enum, enum_data = _enum()
+    sub, sub_data = _union()
+
+    m = pycstruct.StructDef('little', 8)
+    data = {}
+    for i in range(32):
+        m.add('uint8', 'u8_{0}'.format(i))
+        m.add('int32', 'i32_{0}'.format(i))
+        m.add('float64', 'f64_{0}'.format(i))
+        m.add('uint16', 'be16_{0}'.format(i), byteorder = 'big')
+        m.add('utf-8', 'str_{0}'.format(i), length = 12)
+        m.add(bitfield, 'bits_{0}'.format(i))
+        m.add(enum, 'enum_{0}'.format(i))
+        m.add(sub, 'sub_{0}'.format(i))
+        data['u8_{0}'.format(i)] = i
+        data['i32_{0}'.format(i)] = -i * 1000
+        data['f64_{0}'.format(i)] = i / 3.0
+        data['be16_{0}'.format(i)] = i * 100
+        data['str_{0}'.format(i)] = 'member {0}'.format(i)
+        data['bits_{0}'.format(i)] = bitfield_data
+        data['enum_{0}'.format(i)] = enum_data
+        data['sub_{0}'.format(i)] = sub_data
+    return m, data
+
+_CASES = collections.OrderedDict([
+    ('flat', _flat),
+    ('nested', _nested),
+    ('same_level', _same_level),
+    ('large_array', _large_array),
+    ('union', _union),
+    ('bitfield', _bitfield),
+    ('enum', _enum),
+    ('enum_array', _enum_array),
+    ('strings', _strings),
+    ('payload', _payload),
+    ('synthetic', _synthetic)
+])
+
+
+###############################################################################
+# Synthetic source code
+#
+# Each group of the synthetic source code contains an enum, a bitfield, a
+# union, an anonymous struct, a struct using all of them (including an
+# embedded bitfield and a pointer to the previous struct) and typedef
+# chains. The layout is the one of gcc and clang on 64 bit platforms.
+
+_GROUP_HEADER = '''\
+enum e{0} {{ {1} }};
+typedef enum e{0} e{0}_t;
+
+struct bf{0} {{
+    unsigned int a : 3;
+    unsigned int b : 5;
+    int c : 8;
+}};
+
+union u{0} {{
+    int i;
+    float f;
+    unsigned char bytes[4];
+}};
+typedef union u{0} u{0}_t;
+typedef u{0}_t u{0}_t2;
+
+typedef struct {{
+    int x;
+    int y;
+}} p{0}_t;
+
+struct s{0} {{
+    int id;
+    char name[16];
+    double values[4];
+    e{0}_t kind;
+    struct bf{0} flags;
+    u{0}_t2 value;
+    unsigned int inline_a : 4;
+    unsigned int inline_b : 12;
+    {2} *prev;
+    p{0}_t pos;
+}};
+typedef struct s{0} s{0}_t;
+typedef s{0}_t s{0}_t2;
+
+'''
+
+_ENUM_CONSTANTS = 8
+
+class _XmlWriter():
+    ''' Writes XML in the format of castxml (gccxml compatible output) '''
+
+    def __init__(self):
+        self._lines = []
+        self._count = 1 # _1 is the global namespace
+        self._fundamental = {}
+
+    def new_id(self):
+        self._count += 1
+        return '_{0}'.format(self._count)
+
+    def elem(self, tag, attribs, children = []):
+        id = self.new_id()
+        attrib_str = ''.join([' {0}="{1}"'.format(name, value) for name, value in attribs])
+        if children:
+            self._lines.append('  <{0} id="{1}"{2}>'.format(tag, id, attrib_str))
+            for child_tag, child_attribs in children:
+                self._lines.append('    <{0}{1}/>'.format(child_tag, ''.join(
+                    [' {0}="{1}"'.format(name, value) for name, value in child_attribs])))
+            self._lines.append('  </{0}>'.format(tag))
+        else:
+            self._lines.append('  <{0} id="{1}"{2}/>'.format(tag, id, attrib_str))
+        return id
+
+    def fundamental(self, name, size):
+        if name not in self._fundamental:
+            self._fundamental[name] = self.elem('FundamentalType',
+                [('name', name), ('size', size), ('align', max(size, 8))])
+        return self._fundamental[name]
+
+    def fields(self, context, fields):
+        ''' Add Field elements, fields is a list of name, type, offset and
+            number of bits (None if not a bitfield member) '''
+        ids = []
+        for name, type, offset, bits in fields:
+            attribs = [('name', name), ('type', type)]
+            if bits is not None:
+                attribs.append(('bits', bits))
+            attribs += [('context', context), ('access', 'public'), ('file', 'f1'),
+                        ('offset', offset)]
+            ids.append(self.elem('Field', attribs))
+        return ' '.join(ids)
+
+    def compound(self, tag, name, size, align, create_fields):
+        ''' Add Struct or Union element. The id is known before the fields
+            are created, since they refer to it. '''
+        index = len(self._lines)
+        id = self.new_id()
+        members = create_fields(id)
+        self._lines.insert(index, '  <{0} id="{1}" name="{2}" context="_1" file="f1" members="{3}" size="{4}" align="{5}"/>'.format(
+            tag, id, name, members, size, align))
+        return id
+
+    def get(self, header_name):
+        lines = ['<?xml version="1.0"?>', '<GCC_XML version="0.9.0" cvs_revision="1.140">']
+        lines.append('  <Namespace id="_1" name="::"/>')
+        lines += self._lines
+        lines.append('  <File id="f0" name="&lt;builtin&gt;"/>')
+        lines.append('  <File id="f1" name={0}/>'.format(xml.sax.saxutils.quoteattr(header_name)))
+        lines.append('</GCC_XML>')
+        return '\n'.join(lines) + '\n'
+
+def generate_header(nbr_of_groups):
+    """Generate C source code with many types, for benchmarking the 
+       parsing of source code. Each group contains two structs, an enum,
+       a bitfield, a union and five typedefs.
+
+       :param nbr_of_groups: Number of groups of types
+       :type nbr_of_groups: int
+       :return: C source code
+       :rtype: str
+       """
+    source = []
+    for i in range(nbr_of_groups):
+        constants = ', '.join(['e{0}_{1} = {2}'.format(i, j, j * 3 - 6) for j in range(_ENUM_CONSTANTS)])
+        prev = 'void'
+        if i > 0:
+            prev = 'struct s{0}'.format(i - 1)
+        source.append(_GROUP_HEADER.format(i, constants, prev))
+    return ''.join(source)
+
+def generate_xml(nbr_of_groups, header_name = 'synthetic.h'):
+    """Generate castxml output of the source code generated by
+       :func:`generate_header`, without running castxml. 
+
+       :param nbr_of_groups: Number of groups of types
+       :type nbr_of_groups: int
+       :param header_name: Name of the source file in the output
+       :type header_name: str, optional
+       :return: XML as written by castxml
+       :rtype: str
+       """
+    w = _XmlWriter()
+    int_id = w.fundamental('int', 32)
+    uint_id = w.fundamental('unsigned int', 32)
+    uchar_id = w.fundamental('unsigned char', 8)
+    char_id = w.fundamental('char', 8)
+    float_id = w.fundamental('float', 32)
+    double_id = w.fundamental('double', 64)
+    void_id = w.fundamental('void', 0)
+    uchar4_id = w.elem('ArrayType', [('min', 0), ('max', 3), ('type', uchar_id)])
+    char16_id = w.elem('ArrayType', [('min', 0), ('max', 15), ('type', char_id)])
+    double4_id = w.elem('ArrayType', [('min', 0), ('max', 3), ('type', double_id)])
+
+    prev_id = w.elem('PointerType', [('size', 64), ('align', 64), ('type', void_id)])
+    for i in range(nbr_of_groups):
+        constants = [('EnumValue', [('name', 'e{0}_{1}'.format(i, j)), ('init', j * 3 - 6)])
+                     for j in range(_ENUM_CONSTANTS)]
+        enum_id = w.elem('Enumeration', [('name', 'e{0}'.format(i)), ('context', '_1'), ('file', 'f1'),
+                                         ('size', 32), ('align', 32)], constants)
+        enum_elab_id = w.elem('ElaboratedType', [('keyword', 'enum'), ('type', enum_id)])
+        enum_t_id = w.elem('Typedef', [('name', 'e{0}_t'.format(i)), ('type', enum_elab_id),
+                                       ('context', '_1'), ('file', 'f1')])
+
+        bf_id = w.compound('Struct', 'bf{0}'.format(i), 32, 32, lambda id: w.fields(id, [
+            ('a', uint_id, 0, 3), ('b', uint_id, 3, 5), ('c', int_id, 8, 8)]))
+        bf_elab_id = w.elem('ElaboratedType', [('keyword', 'struct'), ('type', bf_id)])
+
+        union_id = w.compound('Union', 'u{0}'.format(i), 32, 32, lambda id: w.fields(id, [
+            ('i', int_id, 0, None), ('f', float_id, 0, None), ('bytes', uchar4_id, 0, None)]))
+        union_elab_id = w.elem('ElaboratedType', [('keyword', 'union'), ('type', union_id)])
+        union_t_id = w.elem('Typedef', [('name', 'u{0}_t'.format(i)), ('type', union_elab_id),
+                                        ('context', '_1'), ('file', 'f1')])
+        union_t2_id = w.elem('Typedef', [('name', 'u{0}_t2'.format(i)), ('type', union_t_id),
+                                         ('context', '_1'), ('file', 'f1')])
+
+        point_id = w.compound('Struct', '', 64, 32, lambda id: w.fields(id, [
+            ('x', int_id, 0, None), ('y', int_id, 32, None)]))
+        point_t_id = w.elem('Typedef', [('name', 'p{0}_t'.format(i)), ('type', point_id),
+                                        ('context', '_1'), ('file', 'f1')])
+
+        struct_id = w.compound('Struct', 's{0}'.format(i), 704, 64, lambda id: w.fields(id, [
+            ('id', int_id, 0, None), ('name', char16_id, 32, None), ('values', double4_id, 192, None),
+            ('kind', enum_t_id, 448, None), ('flags', bf_elab_id, 480, None),
+            ('value', union_t2_id, 512, None), ('inline_a', uint_id, 544, 4),
+            ('inline_b', uint_id, 548, 12), ('prev', prev_id, 576, None),
+            ('pos', point_t_id, 640, None)]))
+        struct_elab_id = w.elem('ElaboratedType', [('keyword', 'struct'), ('type', struct_id)])
+        struct_t_id = w.elem('Typedef', [('name', 's{0}_t'.format(i)), ('type', struct_elab_id),
+                                         ('context', '_1'), ('file', 'f1')])
+        w.elem('Typedef', [('name', 's{0}_t2'.format(i)), ('type', struct_t_id),
+                           ('context', '_1'), ('file', 'f1')])
+        prev_id = w.elem('PointerType', [('size', 64), ('align', 64), ('type', struct_elab_id)])
+    return w.get(header_name)
+
+
+###############################################################################
+# Internal functions
+
+def _time_calls(function, number):
+    ''' Time number of calls of function with the garbage collector
+        disabled (as timeit) '''
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        return time.perf_counter() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+def _time_per_call(function, min_time):
+    ''' Best time in seconds of one call. The number of calls in each
+        measurement is increased until it takes at least min_time. '''
+    number = 1
+    while True:
+        elapsed = _time_calls(function, number)
+        if elapsed >= min_time:
+            break
+        number *= 2
+    for _ in range(_REPEAT - 1):
+        elapsed = min(elapsed, _time_calls(function, number))
+    return elapsed / number
+
+def _allocations(function, count):
+    ''' Number of memory blocks retained by the results, and the peak
+        number of bytes allocated, per call '''
+    gc.collect()
+    results = [None] * count
+    blocks = sys.getallocatedblocks()
+    for i in range(count):
+        results[i] = function()
+    blocks = sys.getallocatedblocks() - blocks
+    del results
+
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        function()
+        peak = tracemalloc.get_traced_memory()[1] - start
+    finally:
+        tracemalloc.stop()
+    return blocks / count, peak
+
+def _operations(definition, data, codegen):
+    ''' Get operations as tuples of name, function and number of records
+        per call '''
+    buffer = bytes(definition.serialize(data))
+    if definition.deserialize(buffer) is None:
+        raise Exception('Unable to deserialize sample data')
+
+    operations = [('deserialize', lambda: definition.deserialize(buffer), 1),
+                  ('serialize', lambda: definition.serialize(data), 1)]
+    if isinstance(definition, pycstruct.StructDef):
+        records = [data] * _MANY_RECORDS
+        operations.append(('serialize_many', lambda: definition.serialize_many(records),
+                           _MANY_RECORDS))
+    if codegen:
+        codec = pycstruct.codegen.generate_codec(definition)
+        operations.append(('codegen_deserialize', lambda: codec.deserialize(buffer), 1))
+        operations.append(('codegen_serialize', lambda: codec.serialize(data), 1))
+    return operations
+
+def _get_version():
+    try:
+        import importlib.metadata
+        return importlib.metadata.version('pycstruct')
+    except Exception:
+        return None # Not installed
+
+
+def _time_best(function, repeat, setup = None):
+    ''' Best time in seconds of calling function once, with the result of
+        setup (not timed) as argument. Returns the time and the result
+        of the last call. '''
+    if repeat < 1:
+        raise Exception('Invalid repeat: {0}. Shall be at least 1.'.format(repeat))
+    best = None
+    for _ in range(repeat):
+        args = []
+        if setup is not None:
+            args.append(setup())
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+def _environment():
+    return [('format_version', _FORMAT_VERSION),
+            ('pycstruct_version', _get_version()),
+            ('python_version', platform.python_version()),
+            ('python_implementation', platform.python_implementation()),
+            ('platform', platform.platform())]
+
+def _cparser_phases(xml_filename, source_files, byteorder, repeat, cache_path):
+    ''' Time each phase of parsing castxml output. Returns a list of
+        tuples of phase name and time, and the type metadata and the
+        instances created. '''
+    phases = []
+
+    seconds, _ = _time_best(lambda: ET.parse(xml_filename), repeat)
+    phases.append(('et_parse', seconds))
+
+    seconds, type_meta = _time_best(
+        lambda: pycstruct.cparser._CastXmlParser(xml_filename).parse(), repeat)
+    phases.append(('castxml_parser', seconds))
+
+    seconds, _ = _time_best(
+        lambda: pycstruct.cparser._CastXmlParser(xml_filename, streaming = True).parse(), repeat)
+    phases.append(('castxml_parser_streaming', seconds))
+
+    # The metadata is updated by the parser, thus a copy is parsed
+    seconds, instances = _time_best(
+        lambda meta: pycstruct.cparser._TypeMetaParser(meta, byteorder).parse(), repeat,
+        lambda: copy.deepcopy(type_meta))
+    phases.append(('type_meta_parser', seconds))
+
+    meta_path = os.path.join(cache_path, 'type_meta.json')
+    seconds, _ = _time_best(
+        lambda: pycstruct.cparser._save_type_meta(meta_path, type_meta, source_files), repeat)
+    phases.append(('save_type_meta', seconds))
+
+    seconds, _ = _time_best(lambda: pycstruct.cparser._load_type_meta(meta_path), repeat)
+    phases.append(('load_type_meta', seconds))
+
+    return phases, type_meta, instances
+
+def _format_cparser_table(results):
+    lines = ['XML: {0} ({1} bytes), {2} types, {3} instances'.format(
+        results['xml_source'], results['xml_size'], results['nbr_of_types'],
+        results['nbr_of_instances'])]
+    lines.append('{:<28}{:>12}{:>14}'.format('Phase', 'Seconds', 'Types/s'))
+    for result in results['results']:
+        lines.append('{:<28}{:>12.4f}{:>14.0f}'.format(
+            result['operation'], result['seconds'], result['records_per_second']))
+    return '\n'.join(lines)
+
+def _format_table(results):
+    lines = ['{:<14}{:<22}{:>10}{:>14}{:>14}{:>10}{:>12}'.format(
+        'Case', 'Operation', 'Size', 'Records/s', 'MB/s', 'Blocks', 'Peak bytes')]
+    for result in results['results']:
+        lines.append('{:<14}{:<22}{:>10}{:>14.0f}{:>14.2f}{:>10.1f}{:>12}'.format(
+            result['case'], result['operation'], result['record_size'],
+            result['records_per_second'], result['bytes_per_second'] / 1e6,
+            result['blocks_per_record'], result['peak_bytes_per_call']))
+    return '\n'.join(lines)
+
+
+###############################################################################
+# Public functions
+
+def run(cases = None, min_time = 0.2, codegen = False):
+    """Run benchmarks of serializing and deserializing. Each case is a
+       definition with sample data:
+
+       - flat - basic types and strings (layout of struct_little.dat in
+         the tests)
+       - nested - embedded structs, unions, bitfields and enums (layout of
+         embedded_struct.dat in the tests)
+       - same_level - embedded struct and bitfield added with same_level
+       - large_array - large arrays of basic types
+       - union - union of structs
+       - bitfield - bitfield of 8 bytes
+       - enum - enum with 256 constants
+       - enum_array - array of enums
+       - strings - strings of different lengths
+       - payload - bytes payload of 4 KB
+       - synthetic - struct with 256 members of mixed types
+
+       For each case and operation the result contains:
+
+       - record_size - size of a record in bytes
+       - records_per_second and bytes_per_second
+       - blocks_per_record - memory blocks retained by the result of
+         one record
+       - peak_bytes_per_call - peak memory allocated during one call
+
+       :param cases: Names of the cases to run. If not provided all cases
+                     are run.
+       :type cases: list, optional
+       :param min_time: Minimum time in seconds of each measurement. The
+                        best of three measurements is used. Default is 0.2.
+       :type min_time: float, optional
+       :param codegen: If True the codecs generated by
+                       :func:`pycstruct.codegen.generate_codec` are measured
+                       as well. Default is False.
+       :type codegen: bool, optional
+       :return: A dictionary, that can be saved as JSON, with information
+                of the environment and a list of results
+       :rtype: dict
+       """
+    if cases is None:
+        cases = list(_CASES.keys())
+    for case in cases:
+        if case not in _CASES:
+            raise Exception('Invalid case: {0}. Valid cases are: {1}'.format(
+                case, ', '.join(_CASES.keys())))
+
+    results = []
+    for case in cases:
+        definition, data = _CASES[case]()
+        size = definition.size()
+        for operation, function, records in _operations(definition, data, codegen):
+            seconds = _time_per_call(function, min_time) / records
+            blocks, peak = _allocations(function, max(1, _ALLOCATION_RECORDS // records))
+            results.append(collections.OrderedDict([
+                ('case', case),
+                ('operation', operation),
+                ('record_size', size),
+                ('records_per_second', 1.0 / seconds),
+                ('bytes_per_second', size / seconds),
+                ('blocks_per_record', blocks / records),
+                ('peak_bytes_per_call', peak)
+            ]))
+
+    return collections.OrderedDict(_environment() + [
+        ('min_time', min_time),
+        ('results', results)
+    ])
+
+def run_cparser(nbr_of_groups = 1000, xml_filename = '', byteorder = 'native',
+                castxml_cmd = 'castxml', castxml_extra_args = [], repeat = 3,
+                save_path = ''):
+    """Run benchmarks of each phase of parsing source code:
+
+       - run_castxml - running castxml (only when castxml is installed
+         and xml_filename is not provided)
+       - et_parse - reading the castxml output with ElementTree
+       - castxml_parser - creating type metadata from castxml output 
+         (including reading the output)
+       - castxml_parser_streaming - as castxml_parser but streaming
+       - type_meta_parser - creating instances from type metadata
+       - save_type_meta and load_type_meta - writing and reading cached
+         type metadata
+
+       The source code is generated by :func:`generate_header`. If castxml
+       is not installed the castxml output is generated by 
+       :func:`generate_xml` instead. Alternatively, saved castxml output is
+       replayed.
+
+       :param nbr_of_groups: Number of groups of types in the generated
+                             source code. See :func:`generate_header`.
+                             Default is 1000.
+       :type nbr_of_groups: int, optional
+       :param xml_filename: Saved castxml output to replay instead of 
+                            generating source code.
+       :type xml_filename: str, optional
+       :param byteorder: Byteorder of the created instances. Default is
+                         'native'.
+       :type byteorder: str, optional
+       :param castxml_cmd: Path to the castxml binary.
+       :type castxml_cmd: str, optional
+       :param castxml_extra_args: Extra arguments to provide to castxml.
+       :type castxml_extra_args: list, optional
+       :param repeat: Number of times each phase is run. The best time is
+                      used. Default is 3.
+       :type repeat: int, optional
+       :param save_path: Path where the generated files are written. If
+                         not provided they are written to a temporary
+                         directory that is removed afterwards.
+       :type save_path: str, optional
+       :return: A dictionary, that can be saved as JSON, with information
+                of the environment, the castxml output and a list of 
+                results (one per phase)
+       :rtype: dict
+       """
+    if repeat < 1:
+        raise Exception('Invalid repeat: {0}. Shall be at least 1.'.format(repeat))
+    work_path = save_path
+    if work_path == '':
+        work_path = tempfile.mkdtemp()
+    try:
+        phases = []
+        if xml_filename != '':
+            xml_source = 'replay'
+            source_files = [xml_filename]
+        else:
+            header = os.path.join(work_path, 'synthetic.h')
+            with open(header, 'w') as file:
+                file.write(generate_header(nbr_of_groups))
+            source_files = [header]
+            xml_filename = os.path.join(work_path, 'synthetic.xml')
+            if shutil.which(castxml_cmd) is not None:
+                xml_source = 'castxml'
+                seconds, _ = _time_best(lambda: pycstruct.cparser._run_castxml(
+                    [header], xml_filename, castxml_cmd, castxml_extra_args), repeat)
+                phases.append(('run_castxml', seconds))
+            else:
+                xml_source = 'synthetic'
+                with open(xml_filename, 'w') as file:
+                    file.write(generate_xml(nbr_of_groups, header))
+
+        more_phases, type_meta, instances = _cparser_phases(
+            xml_filename, source_files, byteorder, repeat, work_path)
+        phases += more_phases
+        xml_size = os.path.getsize(xml_filename)
+    finally:
+        if save_path == '':
+            shutil.rmtree(work_path, ignore_errors = True)
+
+    results = []
+    for phase, seconds in phases:
+        results.append(collections.OrderedDict([
+            ('case', 'cparser'),
+            ('operation', phase),
+            ('seconds', seconds),
+            ('records', len(type_meta)),
+            ('records_per_second', len(type_meta) / seconds)
+        ]))
+
+    return collections.OrderedDict(_environment() + [
+        ('xml_source', xml_source),
+        ('xml_size', xml_size),
+        ('nbr_of_types', len(type_meta)),
+        ('nbr_of_instances', len(instances)),
+        ('results', results)
+    ])
+
+def compare(results, baseline, threshold = 0.1):
+    """Compare results of :func:`run` with a baseline, such as results
+       of a previous release.
+
+       :param results: Results of :func:`run`
+       :type results: dict
+       :param baseline: Results of :func:`run` to compare with
+       :type baseline: dict
+       :param threshold: Maximum allowed relative decrease of records per
+                         second. Default is 0.1 (10%).
+       :type threshold: float, optional
+       :return: A list of tuples of case, operation and the ratio of
+                records per second compared to the baseline, for all
+                results that are slower than allowed
+       :rtype: list
+       """
+    baseline_results = {}
+    for result in baseline['results']:
+        baseline_results[(result['case'], result['operation'])] = result
+
+    regressions = []
+    for result in results['results']:
+        key = (result['case'], result['operation'])
+        if key in baseline_results:
+            ratio = result['records_per_second'] / baseline_results[key]['records_per_second']
+            if ratio < 1.0 - threshold:
+                regressions.append((result['case'], result['operation'], ratio))
+    return regressions
+
+def main(args = None):
+    """Command line interface, python -m pycstruct.bench. Run with --help
+       for the available options. Exits with status 1 if a regression is
+       found when comparing with a baseline.
+
+       :param args: Command line arguments. If not provided sys.argv is used.
+       :type args: list, optional
+       """
+    parser = argparse.ArgumentParser(prog = 'python -m pycstruct.bench',
+        description = 'Benchmark serializing and deserializing, or parsing source code '
+                      '(--cparser), with pycstruct.')
+    parser.add_argument('cases', nargs = '*', help = 'Cases to run: {0}. Default is all.'.format(
+        ', '.join(_CASES.keys())))
+    parser.add_argument('--min-time', type = float, default = 0.2,
+        help = 'Minimum time in seconds of each measurement. Default is 0.2.')
+    parser.add_argument('--codegen', action = 'store_true', help = 'Also measure generated codecs')
+    parser.add_argument('--json', default = '', help = 'Write results as JSON to this file (- for stdout)')
+    parser.add_argument('--compare', default = '', help = 'JSON results to compare with')
+    parser.add_argument('--threshold', type = float, default = 0.1,
+        help = 'Maximum allowed relative decrease of records/s when comparing. Default is 0.1.')
+    cparser_group = parser.add_argument_group('parsing source code')
+    cparser_group.add_argument('--cparser', action = 'store_true',
+        help = 'Benchmark the phases of parsing source code instead')
+    cparser_group.add_argument('--groups', type = int, default = 1000,
+        help = 'Number of groups of types in the generated source code. Default is 1000.')
+    cparser_group.add_argument('--xml', default = '', help = 'Saved castxml output to replay')
+    cparser_group.add_argument('--castxml-cmd', default = 'castxml', help = 'Path to the castxml binary')
+    cparser_group.add_argument('--castxml-arg', action = 'append', default = [],
+        help = 'Extra argument to castxml. May be repeated.')
+    cparser_group.add_argument('--repeat', type = int, default = 3,
+        help = 'Number of times each phase is run. Default is 3.')
+    cparser_group.add_argument('--save-path', default = '',
+        help = 'Path where the generated source code and castxml output are saved')
+    args = parser.parse_args(args)
+    if args.repeat < 1:
+        parser.error('--repeat shall be at least 1')
+
+    if args.cparser:
+        results = run_cparser(args.groups, args.xml, castxml_cmd = args.castxml_cmd,
+                              castxml_extra_args = args.castxml_arg, repeat = args.repeat,
+                              save_path = args.save_path)
+        table = _format_cparser_table(results)
+    else:
+        results = run(args.cases or None, args.min_time, args.codegen)
+        table = _format_table(results)
+
+    if args.json == '-':
+        json.dump(results, sys.stdout, indent = 2)
+        sys.stdout.write('\n')
+    else:
+        print(table)
+        if args.json != '':
+            with open(args.json, 'w') as file:
+                json.dump(results, file, indent = 2)
+
+    if args.compare != '':
+        with open(args.compare, 'r') as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold)
+        for case, operation, ratio in regressions:
+            sys.stderr.write('Regression: {0} {1} is at {2:.0%} of baseline\n'.format(
+                case, operation, ratio))
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
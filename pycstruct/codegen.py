@@ -0,0 +1,817 @@
+# Copyright 2020 by Joel Midstjärna.
+# All rights reserved.
+# This file is part of the pycstruct python library and is
+# released under the "MIT License Agreement". Please see the LICENSE
+# file that should have been included as part of this package.
+
+import sys, types, linecache, keyword, argparse, pycstruct
+
+
+###############################################################################
+# Global constants
+
+_INT_FORMAT = {1 : 'b', 2 : 'h', 4 : 'i', 8 : 'q'}
+
+_BYTEORDER_FORMAT = {'little' : '<', 'big' : '>'}
+
+# Helpers included in all generated sources
+_PRELUDE = '''\
+# Generated by pycstruct.codegen
+
+import struct, collections.abc
+
+def _check_buffer(buffer, offset, size):
+    if offset < 0 or len(buffer) - offset < size:
+        raise Exception("Invalid buffer size: {0}. Expected at least {1} bytes from offset {2}".format(
+            len(buffer), size, offset))
+
+def _from_bytes(buffer, offset, size, byteorder, signed):
+    return int.from_bytes(memoryview(buffer)[offset:offset + size], byteorder, signed=signed)
+
+def _to_bytes(buffer, offset, value, size, byteorder, signed):
+    buffer[offset:offset + size] = value.to_bytes(size, byteorder, signed=signed)
+
+def _decode(value, encoding='utf-8', errors='strict'):
+    return value.split(b'\\x00', 1)[0].decode(encoding, errors)
+
+def _decode_raw(value):
+    return value.split(b'\\x00', 1)[0]
+
+def _encode(value, length, encoding='utf-8', errors='strict'):
+    if isinstance(value, str):
+        value = value.encode(encoding, errors)
+    elif not isinstance(value, (bytes, bytearray)):
+        raise Exception('Not a valid string: {0}'.format(value))
+    if len(value) > length:
+        raise Exception('String overflow. Produced size {0} but max is {1}'.format(
+            len(value), length))
+    return value
+
+def _buffer(value, length):
+    if not isinstance(value, (bytes, bytearray)):
+        try:
+            value = memoryview(value).tobytes()
+        except TypeError:
+            raise Exception('Not a valid buffer: {0}'.format(value))
+    if len(value) > length:
+        raise Exception('Buffer overflow. Size is {0} but max is {1}'.format(
+            len(value), length))
+    return value
+
+def _items(data, name, length):
+    if name not in data:
+        return []
+    value = data[name]
+    if not isinstance(value, collections.abc.Iterable):
+        raise Exception('Key: {0} shall be a list'.format(name))
+    if len(value) > length:
+        raise Exception('List in key: {0} is larger than {1}'.format(name, length))
+    return value
+
+def _list(data, name, length):
+    value = list(_items(data, name, length))
+    return value + [0] * (length - len(value))
+
+def _unknown(value):
+    return '__VALUE__{}'.format(value)
+
+def _check_bits(value, nbr_of_bits, min, max):
+    signed_str = 'Signed' if min < 0 else 'Unsigned'
+    if value > max:
+        raise Exception('{0} value {1} is too large to fit in {2} bits. Max value is {3}.'.format(
+            signed_str, value, nbr_of_bits, max))
+    raise Exception('{0} value {1} is too small to fit in {2} bits. Min value is {3}.'.format(
+        signed_str, value, nbr_of_bits, min))
+'''
+
+###############################################################################
+# Internal functions
+
+def _effective_byteorder(byteorder):
+    ''' Byteorder little or big, i.e. native is resolved '''
+    if byteorder == 'native':
+        return sys.byteorder
+    return byteorder
+
+def _byteorder_of(datatype):
+    ''' Get the byteorder of basic types, bitfields and enums '''
+    if isinstance(datatype, pycstruct.pycstruct.BasicTypeDef):
+        return _effective_byteorder(datatype.byteorder)
+    if isinstance(datatype, (pycstruct.BitfieldDef, pycstruct.EnumDef)):
+        return datatype._get_byteorder()
+    return None
+
+def _is_signed(datatype):
+    return isinstance(datatype, pycstruct.EnumDef) and datatype._is_signed()
+
+def _int_format(datatype):
+    ''' Get struct format character of a bitfield or enum. None if the size
+        is not supported by the struct module. '''
+    size = datatype.size()
+    if size not in _INT_FORMAT:
+        return None
+    if _is_signed(datatype):
+        return _INT_FORMAT[size]
+    return _INT_FORMAT[size].upper()
+
+def _string_args(datatype):
+    ''' Get the non default StringDef arguments, following the length '''
+    args = ''
+    if datatype.encoding != 'utf-8':
+        args += ', encoding={0!r}'.format(datatype.encoding)
+    if datatype.errors != 'strict':
+        args += ', errors={0!r}'.format(datatype.errors)
+    if datatype.raw:
+        args += ', raw=True'
+    return args
+
+def _decode_expr(datatype, value):
+    ''' Expression decoding the packed bytes value of a string '''
+    if datatype.raw:
+        return '_decode_raw({0})'.format(value)
+    return '_decode({0}{1})'.format(value, _string_args(datatype))
+
+def _encode_expr(datatype, value):
+    ''' Expression encoding the string value into bytes '''
+    return '_encode({0}, {1}{2})'.format(value, datatype.size(),
+                                         _string_args(datatype).replace(', raw=True', ''))
+
+def _position(base, offset):
+    if offset == 0:
+        return base
+    return '{0} + {1}'.format(base, offset)
+
+
+###############################################################################
+# _CodeGenerator class (internal)
+
+class _CodeGenerator():
+    ''' Generates Python source code with specialized functions for
+        serializing and deserializing a definition, including all
+        definitions embedded in it.
+    '''
+
+    def __init__(self):
+        self._constants = []
+        self._functions = []
+        self._structs = {}
+        self._ids = {}
+
+    def generate(self, definition):
+        if not isinstance(definition, (pycstruct.StructDef, pycstruct.BitfieldDef, pycstruct.EnumDef)):
+            raise Exception('Only StructDef, BitfieldDef and EnumDef are supported. Got {0}.'.format(
+                type(definition).__name__))
+
+        top = []
+        top.append('SIZE = {0}'.format(definition.size()))
+        top.append('')
+        top.append('def deserialize_from(buffer, offset=0):')
+        top.append('    _check_buffer(buffer, offset, SIZE)')
+        top.append('    return {0}'.format(self._read_expr(definition, 'offset')))
+        top.append('')
+        top.append('def deserialize(buffer):')
+        top.append('    if len(buffer) != SIZE:')
+        top.append('        raise Exception("Invalid buffer size: {0}. Expected: {1}".format(len(buffer), SIZE))')
+        top.append('    return deserialize_from(buffer, 0)')
+        top.append('')
+        top.append('def serialize_into(buffer, offset, data):')
+        top.append('    _check_buffer(buffer, offset, SIZE)')
+        top.append('    {0}'.format(self._write_stmt(definition, 'offset', 'data')))
+        top.append('')
+        top.append('def serialize(data):')
+        top.append('    buffer = bytearray(SIZE)')
+        top.append('    serialize_into(buffer, 0, data)')
+        top.append('    return buffer')
+
+        lines = [_PRELUDE]
+        lines += self._constants
+        lines.append('')
+        for function in self._functions:
+            lines += function
+            lines.append('')
+        lines += top
+        return '\n'.join(lines) + '\n'
+
+    ###########################################################################
+    # Module level names
+
+    def _struct(self, fmt):
+        ''' Get name of a struct.Struct constant with format fmt '''
+        if fmt not in self._structs:
+            name = '_s{0}'.format(len(self._structs))
+            self._structs[fmt] = name
+            self._constants.append('{0} = struct.Struct({1!r})'.format(name, fmt))
+        return self._structs[fmt]
+
+    def _id(self, definition):
+        ''' Get id of a definition. Functions for the definition are
+            generated the first time. '''
+        key = id(definition)
+        if key not in self._ids:
+            self._ids[key] = len(self._ids)
+            if isinstance(definition, pycstruct.StructDef):
+                self._generate_struct(definition, self._ids[key])
+            elif isinstance(definition, pycstruct.BitfieldDef):
+                self._generate_bitfield(definition, self._ids[key])
+            else:
+                self._generate_enum(definition, self._ids[key])
+        return self._ids[key]
+
+    ###########################################################################
+    # Integers (bitfields and enums)
+
+    def _int_read(self, datatype, pos):
+        ''' Expression reading the integer value of a bitfield or enum '''
+        fmt = _int_format(datatype)
+        byteorder = _byteorder_of(datatype)
+        if fmt is None:
+            return '_from_bytes(buffer, {0}, {1}, {2!r}, {3})'.format(
+                pos, datatype.size(), byteorder, _is_signed(datatype))
+        fmt = _BYTEORDER_FORMAT[byteorder] + fmt
+        return '{0}.unpack_from(buffer, {1})[0]'.format(self._struct(fmt), pos)
+
+    def _int_write(self, datatype, pos, value):
+        ''' Statement writing the integer value of a bitfield or enum '''
+        fmt = _int_format(datatype)
+        byteorder = _byteorder_of(datatype)
+        if fmt is None:
+            return '_to_bytes(buffer, {0}, {1}, {2}, {3!r}, {4})'.format(
+                pos, value, datatype.size(), byteorder, _is_signed(datatype))
+        fmt = _BYTEORDER_FORMAT[byteorder] + fmt
+        return '{0}.pack_into(buffer, {1}, {2})'.format(self._struct(fmt), pos, value)
+
+    ###########################################################################
+    # Single elements
+
+    def _read_expr(self, datatype, pos):
+        ''' Expression deserializing one element at position pos '''
+        if isinstance(datatype, pycstruct.pycstruct.BasicTypeDef):
+            fmt = _BYTEORDER_FORMAT[_byteorder_of(datatype)] + datatype.format
+            expr = '{0}.unpack_from(buffer, {1})[0]'.format(self._struct(fmt), pos)
+            if datatype.is_bool:
+                expr = '({0} != 0)'.format(expr)
+            return expr
+        if isinstance(datatype, pycstruct.pycstruct.StringDef):
+            fmt = '{0}s'.format(datatype.size())
+            return _decode_expr(datatype, '{0}.unpack_from(buffer, {1})[0]'.format(
+                self._struct(fmt), pos))
+        if isinstance(datatype, pycstruct.BytesDef):
+            fmt = '{0}s'.format(datatype.size())
+            return '{0}.unpack_from(buffer, {1})[0]'.format(self._struct(fmt), pos)
+        if isinstance(datatype, pycstruct.StructDef):
+            return '_unpack_{0}(buffer, {1})'.format(self._id(datatype), pos)
+        if isinstance(datatype, (pycstruct.BitfieldDef, pycstruct.EnumDef)):
+            return '_unpack_{0}({1})'.format(self._id(datatype), self._int_read(datatype, pos))
+        raise Exception('Type {0} is not supported by codegen'.format(datatype._type_name()))
+
+    def _write_stmt(self, datatype, pos, value):
+        ''' Statement serializing one element at position pos '''
+        if isinstance(datatype, pycstruct.pycstruct.BasicTypeDef):
+            fmt = _BYTEORDER_FORMAT[_byteorder_of(datatype)] + datatype.format
+            return '{0}.pack_into(buffer, {1}, {2})'.format(self._struct(fmt), pos, value)
+        if isinstance(datatype, pycstruct.pycstruct.StringDef):
+            fmt = '{0}s'.format(datatype.size())
+            return '{0}.pack_into(buffer, {1}, {2})'.format(
+                self._struct(fmt), pos, _encode_expr(datatype, value))
+        if isinstance(datatype, pycstruct.BytesDef):
+            fmt = '{0}s'.format(datatype.size())
+            return '{0}.pack_into(buffer, {1}, _buffer({2}, {3}))'.format(
+                self._struct(fmt), pos, value, datatype.size())
+        if isinstance(datatype, pycstruct.StructDef):
+            return '_pack_{0}(buffer, {1}, {2})'.format(self._id(datatype), pos, value)
+        if isinstance(datatype, (pycstruct.BitfieldDef, pycstruct.EnumDef)):
+            return self._int_write(datatype, pos,
+                                   '_pack_{0}({1})'.format(self._id(datatype), value))
+        raise Exception('Type {0} is not supported by codegen'.format(datatype._type_name()))
+
+    def _bitfield_entries(self, bitfield, var):
+        ''' Dictionary entries of all bitfield elements from the integer var '''
+        entries = []
+        for name, start_bit, nbr_of_bits, signed in bitfield._get_layout():
+            expr = var
+            if start_bit > 0:
+                expr = '{0} >> {1}'.format(expr, start_bit)
+            expr = '{0} & {1}'.format(expr, (1 << nbr_of_bits) - 1)
+            if signed:
+                sign_bit = 1 << (nbr_of_bits - 1)
+                expr = '(({0}) ^ {1}) - {1}'.format(expr, sign_bit)
+            entries.append((name, expr))
+        return entries
+
+    ###########################################################################
+    # Definitions
+
+    def _generate_bitfield(self, bitfield, k):
+        entries = self._bitfield_entries(bitfield, 'value')
+        unpack = ['def _unpack_{0}(value):'.format(k)]
+        unpack.append('    return {{{0}}}'.format(
+            ', '.join(['{0!r}: {1}'.format(name, expr) for name, expr in entries])))
+
+        pack = ['def _pack_{0}(data):'.format(k), '    value = 0']
+        for name, start_bit, nbr_of_bits, signed in bitfield._get_layout():
+            mask = (1 << nbr_of_bits) - 1
+            min_value, max_value = 0, mask
+            if signed:
+                min_value, max_value = -(1 << (nbr_of_bits - 1)), (1 << (nbr_of_bits - 1)) - 1
+            pack.append('    if {0!r} in data:'.format(name))
+            pack.append('        x = data[{0!r}]'.format(name))
+            pack.append('        if x < {0} or x > {1}:'.format(min_value, max_value))
+            pack.append('            _check_bits(x, {0}, {1}, {2})'.format(nbr_of_bits, min_value, max_value))
+            if signed:
+                pack.append('        value |= (x & {0}) << {1}'.format(mask, start_bit) if start_bit > 0 else
+                            '        value |= x & {0}'.format(mask))
+            else:
+                pack.append('        value |= x << {0}'.format(start_bit) if start_bit > 0 else '        value |= x')
+        pack.append('    return value')
+        self._functions += [unpack, pack]
+
+    def _generate_enum(self, enum, k):
+        names = {}
+        for name, value in enum._get_constants().items():
+            if value not in names:
+                names[value] = name # First name of value
+        self._constants.append('_names_{0} = {1!r}'.format(k, names))
+        self._constants.append('_values_{0} = {1!r}'.format(k, dict(enum._get_constants())))
+
+        unpack = ['def _unpack_{0}(value):'.format(k)]
+        unpack.append('    return _names_{0}.get(value) or _unknown(value)'.format(k))
+
+        pack = ['def _pack_{0}(name):'.format(k)]
+        pack.append('    if name not in _values_{0}:'.format(k))
+        pack.append('        raise Exception("{0} is not a valid name in this enum".format(name))')
+        pack.append('    return _values_{0}[name]'.format(k))
+        self._functions += [unpack, pack]
+
+    def _is_packed(self, datatype, length, same_level, byteorder):
+        ''' Check if an element can be part of the struct.Struct of the
+            parent struct '''
+        if isinstance(datatype, pycstruct.pycstruct.BasicTypeDef):
+            return _byteorder_of(datatype) == byteorder
+        if isinstance(datatype, (pycstruct.pycstruct.StringDef, pycstruct.BytesDef)):
+            return length == 1
+        if isinstance(datatype, (pycstruct.BitfieldDef, pycstruct.EnumDef)):
+            return length == 1 and _int_format(datatype) is not None and \
+                   _byteorder_of(datatype) == byteorder
+        return False
+
+    def _generate_struct(self, structdef, k):
+        layout = structdef._get_layout()
+        is_union = structdef._type_name() == 'union'
+
+        # All elements that can be part of one struct.Struct format with
+        # the byteorder of the first element (not possible for unions)
+        byteorder = sys.byteorder
+        for name, datatype, length, offset, same_level in layout:
+            if _byteorder_of(datatype) is not None:
+                byteorder = _byteorder_of(datatype)
+                break
+        packed = []
+        if not is_union:
+            packed = [elem for elem in layout if self._is_packed(elem[1], elem[2], elem[4], byteorder)]
+
+        fmt = [_BYTEORDER_FORMAT[byteorder]]
+        position = 0
+        index = 0
+        indexes = {}
+        for name, datatype, length, offset, same_level in packed:
+            if offset > position:
+                fmt.append('{0}x'.format(offset - position))
+            if isinstance(datatype, pycstruct.pycstruct.BasicTypeDef):
+                fmt.append('{0}{1}'.format(length, datatype.format))
+                indexes[name] = index
+                index += length
+            elif isinstance(datatype, (pycstruct.pycstruct.StringDef, pycstruct.BytesDef)):
+                fmt.append('{0}s'.format(datatype.size()))
+                indexes[name] = index
+                index += 1
+            else:
+                fmt.append(_int_format(datatype))
+                indexes[name] = index
+                index += 1
+            position = offset + datatype.size() * length
+        if structdef.size() > position:
+            fmt.append('{0}x'.format(structdef.size() - position))
+        main_struct = self._struct(''.join(fmt))
+
+        self._functions.append(self._struct_unpack(structdef, k, layout, indexes, main_struct, is_union))
+        self._functions.append(self._struct_pack(structdef, k, layout, indexes, main_struct, is_union))
+
+    def _struct_unpack(self, structdef, k, layout, indexes, main_struct, is_union):
+        lines = ['def _unpack_{0}(buffer, offset):'.format(k)]
+        if len(indexes) > 0:
+            lines.append('    v = {0}.unpack_from(buffer, offset)'.format(main_struct))
+
+        # Result is created from dictionary literals (chunks) and updates
+        # from same_level structs
+        chunks = []
+        entries = []
+        nbr_vars = 0
+        for name, datatype, length, offset, same_level in layout:
+            pos = _position('offset', offset)
+            is_bitfield = isinstance(datatype, pycstruct.BitfieldDef)
+            if name in indexes and isinstance(datatype, pycstruct.pycstruct.BasicTypeDef):
+                i = indexes[name]
+                if length == 1:
+                    expr = 'v[{0}]'.format(i)
+                    if datatype.is_bool:
+                        expr = '(v[{0}] != 0)'.format(i)
+                elif datatype.is_bool:
+                    expr = '[x != 0 for x in v[{0}:{1}]]'.format(i, i + length)
+                else:
+                    expr = 'list(v[{0}:{1}])'.format(i, i + length)
+            elif name in indexes and isinstance(datatype, pycstruct.pycstruct.StringDef):
+                expr = _decode_expr(datatype, 'v[{0}]'.format(indexes[name]))
+            elif name in indexes and isinstance(datatype, pycstruct.BytesDef):
+                expr = 'v[{0}]'.format(indexes[name])
+            elif name in indexes and isinstance(datatype, pycstruct.EnumDef):
+                var = 'v[{0}]'.format(indexes[name])
+                expr = '(_names_{0}.get({1}) or _unknown({1}))'.format(self._id(datatype), var)
+            elif is_bitfield and length == 1:
+                # Inline all bitfield elements
+                if name in indexes:
+                    var = 'v[{0}]'.format(indexes[name])
+                else:
+                    var = 'b{0}'.format(nbr_vars)
+                    nbr_vars += 1
+                    lines.append('    {0} = {1}'.format(var, self._int_read(datatype, pos)))
+                bitfield_entries = self._bitfield_entries(datatype, var)
+                if same_level:
+                    entries += bitfield_entries
+                    continue
+                expr = '{{{0}}}'.format(', '.join(
+                    ['{0!r}: {1}'.format(n, e) for n, e in bitfield_entries]))
+            elif length == 1:
+                expr = self._read_expr(datatype, pos)
+            elif isinstance(datatype, pycstruct.pycstruct.BasicTypeDef):
+                fmt = '{0}{1}{2}'.format(_BYTEORDER_FORMAT[_byteorder_of(datatype)], length, datatype.format)
+                expr = 'list({0}.unpack_from(buffer, {1}))'.format(self._struct(fmt), pos)
+                if datatype.is_bool:
+                    expr = '[x != 0 for x in {0}.unpack_from(buffer, {1})]'.format(self._struct(fmt), pos)
+            else:
+                elem_pos = '{0} + i * {1}'.format(pos, datatype.size())
+                expr = '[{0} for i in range({1})]'.format(self._read_expr(datatype, elem_pos), length)
+
+            if same_level:
+                # Embedded struct with same_level
+                chunks.append(entries)
+                chunks.append(expr)
+                entries = []
+            else:
+                entries.append((name, expr))
+        chunks.append(entries)
+
+        first = True
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                lines.append('    result.update({0})'.format(chunk))
+                continue
+            literal = '{{{0}}}'.format(', '.join(['{0!r}: {1}'.format(n, e) for n, e in chunk]))
+            if first:
+                if len(chunks) == 1:
+                    lines.append('    return {0}'.format(literal))
+                    return lines
+                lines.append('    result = {0}'.format(literal))
+                first = False
+            elif len(chunk) > 0:
+                lines.append('    result.update({0})'.format(literal))
+        lines.append('    return result')
+        return lines
+
+    def _struct_pack(self, structdef, k, layout, indexes, main_struct, is_union):
+        lines = ['def _pack_{0}(buffer, offset, data):'.format(k)]
+
+        # Set all bytes of the struct, including padding, in one call
+        values = []
+        for name, datatype, length, offset, same_level in layout:
+            if name not in indexes:
+                continue
+            if isinstance(datatype, pycstruct.pycstruct.BasicTypeDef):
+                if length == 1:
+                    values.append('data.get({0!r}, 0)'.format(name))
+                else:
+                    values.append('*_list(data, {0!r}, {1})'.format(name, length))
+            elif isinstance(datatype, pycstruct.pycstruct.StringDef):
+                values.append('{0} if {1!r} in data else b\'\''.format(
+                    _encode_expr(datatype, 'data[{0!r}]'.format(name)), name))
+            elif isinstance(datatype, pycstruct.BytesDef):
+                values.append('_buffer(data[{0!r}], {1}) if {0!r} in data else b\'\''.format(
+                    name, datatype.size()))
+            elif same_level:
+                values.append('_pack_{0}(data)'.format(self._id(datatype)))
+            else:
+                values.append('_pack_{0}(data[{1!r}]) if {1!r} in data else 0'.format(
+                    self._id(datatype), name))
+        if is_union:
+            # Only zero fill
+            values = []
+        lines.append('    {0}.pack_into(buffer, {1})'.format(
+            main_struct, ', '.join(['offset'] + values)))
+
+        # Remaining elements
+        for name, datatype, length, offset, same_level in layout:
+            if name in indexes:
+                continue
+            pos = _position('offset', offset)
+            if same_level:
+                lines.append('    {0}'.format(self._write_stmt(datatype, pos, 'data')))
+            elif length == 1:
+                lines.append('    if {0!r} in data:'.format(name))
+                lines.append('        {0}'.format(self._write_stmt(datatype, pos, 'data[{0!r}]'.format(name))))
+            elif isinstance(datatype, pycstruct.pycstruct.BasicTypeDef):
+                fmt = '{0}{1}{2}'.format(_BYTEORDER_FORMAT[_byteorder_of(datatype)], length, datatype.format)
+                lines.append('    if {0!r} in data:'.format(name))
+                lines.append('        {0}.pack_into(buffer, {1}, *_list(data, {2!r}, {3}))'.format(
+                    self._struct(fmt), pos, name, length))
+            else:
+                elem_pos = '{0} + i * {1}'.format(pos, datatype.size())
+                lines.append('    for i, x in enumerate(_items(data, {0!r}, {1})):'.format(name, length))
+                lines.append('        {0}'.format(self._write_stmt(datatype, elem_pos, 'x')))
+        return lines
+
+
+###############################################################################
+# _DefinitionGenerator class (internal)
+
+class _DefinitionGenerator():
+    ''' Generates Python source code of a module constructing a dictionary
+        of definitions, including all definitions embedded in them.
+    '''
+
+    def __init__(self):
+        self._lines = []
+        self._variables = {}
+
+    def generate(self, definitions, codecs):
+        lines = ['# Generated by pycstruct.codegen', '']
+        if codecs:
+            lines.append('import pycstruct, pycstruct.codegen')
+        else:
+            lines.append('import pycstruct')
+        lines.append('')
+
+        assignments = []
+        for name, definition in definitions.items():
+            assignments.append('definitions[{0!r}] = {1}'.format(name, self._variable(definition)))
+        lines += self._lines
+        lines.append('')
+        lines.append('definitions = {}')
+        lines += assignments
+
+        # Module attributes for all names that are valid and not hiding
+        # anything else in the module
+        attributes = []
+        for name in definitions:
+            if (name.isidentifier() and not keyword.iskeyword(name) and
+                    not name.startswith('_') and
+                    name not in ('pycstruct', 'definitions', 'get_codec')):
+                attributes.append('{0} = definitions[{0!r}]'.format(name))
+        if attributes:
+            lines.append('')
+            lines += attributes
+
+        if codecs:
+            lines.append('')
+            lines.append('_CODEC_SOURCES = {')
+            for name, definition in definitions.items():
+                lines.append('    {0!r}: {1!r},'.format(name, generate_source(definition)))
+            lines.append('}')
+            lines.append('')
+            lines.append('_codecs = {}')
+            lines.append('')
+            lines.append('def get_codec(name):')
+            lines.append('    if name not in _codecs:')
+            lines.append('        _codecs[name] = pycstruct.codegen.load_source(_CODEC_SOURCES[name],')
+            lines.append('            "<pycstruct codegen {0}>".format(name))')
+            lines.append('    return _codecs[name]')
+        return '\n'.join(lines) + '\n'
+
+    def _variable(self, definition):
+        ''' Get name of the variable holding a definition. The definition
+            is constructed the first time. '''
+        key = id(definition)
+        if key not in self._variables:
+            if isinstance(definition, pycstruct.StructDef):
+                lines = self._struct(definition)
+            elif isinstance(definition, pycstruct.BitfieldDef):
+                lines = self._bitfield(definition)
+            elif isinstance(definition, pycstruct.EnumDef):
+                lines = self._enum(definition)
+            else:
+                raise Exception('Only StructDef, BitfieldDef and EnumDef are supported. Got {0}.'.format(
+                    type(definition).__name__))
+            self._variables[key] = '_d{0}'.format(len(self._variables))
+            self._lines.append('')
+            self._lines.append('{0} = {1}'.format(self._variables[key], lines[0]))
+            for line in lines[1:]:
+                self._lines.append('{0}.{1}'.format(self._variables[key], line))
+        return self._variables[key]
+
+    def _struct(self, structdef):
+        default_byteorder = structdef._get_byteorder()
+        lines = ['pycstruct.StructDef({0!r}, {1}, union={2})'.format(
+            default_byteorder, structdef._get_alignment(), structdef._is_union())]
+        for name, datatype, length, _, same_level in structdef._get_layout():
+            args = []
+            if isinstance(datatype, pycstruct.pycstruct.BasicTypeDef):
+                args.append(repr(datatype.type))
+                if datatype.byteorder != default_byteorder:
+                    args.append('byteorder={0!r}'.format(datatype.byteorder))
+            elif isinstance(datatype, pycstruct.pycstruct.StringDef) and length == 1 and \
+                 _string_args(datatype) == '':
+                args.append(repr('utf-8'))
+                length = datatype.length
+            elif isinstance(datatype, pycstruct.pycstruct.StringDef):
+                args.append('pycstruct.StringDef({0}{1})'.format(
+                    datatype.length, _string_args(datatype)))
+            elif isinstance(datatype, pycstruct.BytesDef) and length == 1:
+                args.append(repr('bytes'))
+                length = datatype.length
+            elif isinstance(datatype, pycstruct.BytesDef):
+                args.append('pycstruct.BytesDef({0})'.format(datatype.length))
+            else:
+                args.append(self._variable(datatype))
+            args.insert(1, repr(name))
+            if length != 1:
+                args.insert(2, 'length={0}'.format(length))
+            if same_level:
+                args.append('same_level=True')
+            lines.append('add({0})'.format(', '.join(args)))
+        return lines
+
+    def _bitfield(self, bitfield):
+        lines = ['pycstruct.BitfieldDef({0!r}, {1})'.format(
+            bitfield._get_declared_byteorder(), bitfield.size())]
+        for name, _, nbr_of_bits, signed in bitfield._get_layout():
+            lines.append('add({0!r}, {1}, signed={2})'.format(name, nbr_of_bits, signed))
+        return lines
+
+    def _enum(self, enum):
+        lines = ['pycstruct.EnumDef({0!r}, {1}, signed={2})'.format(
+            enum._get_declared_byteorder(), enum.size(), enum._is_signed())]
+        for name, value in enum._get_constants().items():
+            lines.append('add({0!r}, {1})'.format(name, value))
+        return lines
+
+
+###############################################################################
+# Public functions
+
+def generate_source(definition):
+    """Generate Python source code of a module with functions specialized
+       for serializing and deserializing a definition (including all
+       definitions embedded in it). The generated module has no dependency
+       to pycstruct and contains:
+
+       - SIZE - the size of the definition in bytes
+       - deserialize(buffer)
+       - deserialize_from(buffer, offset=0)
+       - serialize(data)
+       - serialize_into(buffer, offset, data)
+
+       The functions behave as the corresponding methods of the definition,
+       but error messages are less detailed.
+
+       :param definition: The definition
+       :type definition: StructDef, BitfieldDef or EnumDef
+       :return: Python source code
+       :rtype: str
+       """
+    return _CodeGenerator().generate(definition)
+
+def load_source(source, filename = '<pycstruct codegen>'):
+    """Compile source code generated by :func:`generate_source` into a
+       module.
+
+       :param source: Python source code
+       :type source: str
+       :param filename: File name used in tracebacks.
+       :type filename: str, optional
+       :return: The module. The source code is available as the attribute
+                source.
+       :rtype: module
+       """
+    if filename.startswith('<'):
+        # Make the source available in tracebacks
+        linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+    module = types.ModuleType('pycstruct_codec')
+    module.__file__ = filename
+    exec(compile(source, filename, 'exec'), module.__dict__)
+    module.source = source
+    return module
+
+def generate_codec(definition, filename = ''):
+    """Generate specialized serialize and deserialize functions of a
+       definition. This is faster than using the methods of the definition
+       since there is no per element dispatching. See
+       :func:`generate_source` for the functions available.
+
+       Example::
+
+         codec = pycstruct.codegen.generate_codec(myStruct)
+         myDict = codec.deserialize(inbytes)
+         print(codec.source)
+
+       :param definition: The definition
+       :type definition: StructDef, BitfieldDef or EnumDef
+       :param filename: If provided the generated source is written to this
+                        file, so that it can be inspected and later loaded
+                        with :func:`load_codec` (or imported).
+       :type filename: str, optional
+       :return: A module with the generated functions
+       :rtype: module
+       """
+    source = generate_source(definition)
+    if filename == '':
+        return load_source(source)
+    with open(filename, 'w') as file:
+        file.write(source)
+    return load_source(source, filename)
+
+def load_codec(filename):
+    """Load functions previously generated with :func:`generate_codec`.
+
+       :param filename: File with the generated source
+       :type filename: str
+       :return: A module with the generated functions
+       :rtype: module
+       """
+    with open(filename, 'r') as file:
+        source = file.read()
+    return load_source(source, filename)
+
+def generate_definitions_source(definitions, codecs = False):
+    """Generate Python source code of a module constructing definitions,
+       for example the result of :func:`pycstruct.parse_file`. Importing
+       the generated module is fast and castxml is not required, i.e. the
+       source files only have to be parsed once. The module contains:
+
+       - definitions - a dictionary with the same keys as the provided
+         definitions
+       - One attribute per definition, for the keys that are valid Python
+         identifiers not starting with underscore
+       - get_codec(name) - only if codecs is True. Returns the module of
+         :func:`generate_codec` for the definition with name. The codecs
+         are compiled the first time they are requested.
+
+       Example::
+
+         definitions = pycstruct.parse_file('myheader.h')
+         with open('mydefs.py', 'w') as f:
+           f.write(pycstruct.codegen.generate_definitions_source(definitions))
+
+       The same is achieved from the command line with::
+
+         python -m pycstruct.codegen myheader.h -o mydefs.py
+
+       :param definitions: Dictionary of definitions
+       :type definitions: dict
+       :param codecs: If True the module also includes the codecs of
+                      all definitions. Default is False.
+       :type codecs: bool, optional
+       :return: Python source code
+       :rtype: str
+       """
+    return _DefinitionGenerator().generate(definitions, codecs)
+
+def main(args = None):
+    """Command line interface. Parse C source files and write a Python
+       module constructing the definitions. See
+       :func:`generate_definitions_source`. Run with --help for the
+       available options.
+
+       :param args: Command line arguments. If not provided sys.argv is used.
+       :type args: list, optional
+       """
+    parser = argparse.ArgumentParser(prog = 'python -m pycstruct.codegen',
+        description = 'Parse C source files and generate a Python module '
+                      'constructing the pycstruct definitions.')
+    parser.add_argument('input_files', nargs = '+', help = 'C source files to parse')
+    parser.add_argument('-o', '--output', default = '',
+        help = 'Output Python file. Default is stdout.')
+    parser.add_argument('--byteorder', default = 'native', choices = ['native', 'little', 'big'],
+        help = 'Byteorder of all elements. Default is native.')
+    parser.add_argument('--castxml-cmd', default = 'castxml', help = 'Path to the castxml binary')
+    parser.add_argument('--castxml-arg', action = 'append', default = [],
+        help = 'Extra argument to castxml. May be repeated.')
+    parser.add_argument('--cache-path', default = '', help = 'Path where to store temporary files')
+    parser.add_argument('--use-cached', action = 'store_true', help = 'Use cached castxml output')
+    parser.add_argument('--type', action = 'append', dest = 'types',
+        help = 'Only include this type and the types it depends on. May be repeated.')
+    parser.add_argument('--bytes-arrays', action = 'store_true',
+        help = 'Use the bytes type for unsigned char arrays')
+    parser.add_argument('--codecs', action = 'store_true',
+        help = 'Include generated codecs of all definitions')
+    args = parser.parse_args(args)
+
+    definitions = pycstruct.parse_file(args.input_files, args.byteorder, args.castxml_cmd,
+        args.castxml_arg, args.cache_path, args.use_cached, types = args.types,
+        bytes_arrays = args.bytes_arrays)
+    source = generate_definitions_source(definitions, args.codecs)
+    if args.output == '':
+        sys.stdout.write(source)
+    else:
+        with open(args.output, 'w') as file:
+            file.write(source)
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,8 @@
 # file that should have been included as part of this package.
 
 import xml.etree.ElementTree as ET
-import os, logging, pycstruct, subprocess, shutil, hashlib, tempfile, math
+import os, logging, pycstruct, subprocess, shutil, hashlib, tempfile, math, json
+import concurrent.futures, asyncio
 
 
 ###############################################################################
@@ -13,11 +14,20 @@ import os, logging, pycstruct, subprocess, shutil, hashlib, tempfile, math
 
 logger = logging.getLogger('pycstruct')
 
+# Top level castxml elements used by the parser. Other elements are
+# discarded when streaming.
+_STREAMING_TAGS = ['File', 'Struct', 'Union', 'Enumeration', 'Field',
+                   'Typedef', 'ElaboratedType', 'ArrayType', 'FundamentalType',
+                   'PointerType', 'CvQualifiedType']
+
+# Increase when the format of the type metadata is changed, to invalidate
+# cached metadata
+_TYPE_META_VERSION = 2
+
 ###############################################################################
 # Internal functions
 
-def _run_castxml(input_files, xml_filename, castxml_cmd = 'castxml', 
-                 castxml_extra_args = []):
+def _get_castxml_args(input_files, xml_filename, castxml_cmd, castxml_extra_args):
     if shutil.which(castxml_cmd) == None:
         raise Exception('Executable "{}" not found.\n'.format(castxml_cmd) +
                         'External software castxml is not installed.\n' +
@@ -28,20 +38,44 @@ def _run_castxml(input_files, xml_filename, castxml_cmd = 'castxml',
     args.append('--castxml-gccxml')
     args.append('-o')
     args.append(xml_filename)
+    return args
 
-    try:
-        output = subprocess.check_output(args, stderr=subprocess.STDOUT)
-    except subprocess.CalledProcessError as e:
+def _check_castxml_result(args, xml_filename, returncode, output):
+    if returncode != 0:
         raise Exception('Unable to run:\n' +
                         '{}\n\n'.format(' '.join(args)) +
                         'Output:\n' +
-                        e.output.decode())
+                        output.decode())
 
     if not os.path.isfile(xml_filename):
         raise Exception('castxml did not report any error but ' + 
                         '{} was never produced.\n\n'.format(xml_filename) +
                         'castxml output was:\n{}'.format(output.decode()))
 
+def _run_castxml(input_files, xml_filename, castxml_cmd = 'castxml', 
+                 castxml_extra_args = []):
+    args = _get_castxml_args(input_files, xml_filename, castxml_cmd, castxml_extra_args)
+    try:
+        output = subprocess.check_output(args, stderr=subprocess.STDOUT)
+    except subprocess.CalledProcessError as e:
+        _check_castxml_result(args, xml_filename, e.returncode, e.output)
+    _check_castxml_result(args, xml_filename, 0, output)
+
+async def _run_castxml_async(input_files, xml_filename, castxml_cmd = 'castxml', 
+                             castxml_extra_args = []):
+    ''' Same as _run_castxml but castxml is run without blocking the event
+        loop. castxml is killed if the task is cancelled. '''
+    args = _get_castxml_args(input_files, xml_filename, castxml_cmd, castxml_extra_args)
+    process = await asyncio.create_subprocess_exec(*args, stdout=subprocess.PIPE,
+                                                   stderr=subprocess.STDOUT)
+    try:
+        output, _ = await process.communicate()
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+    _check_castxml_result(args, xml_filename, process.returncode, output)
+
 def _get_hash(list_of_strings):
     ''' Get a reproducible short name of a list of strings '''
     long_string = ''.join(list_of_strings)
@@ -49,6 +83,157 @@ def _get_hash(list_of_strings):
     hexdigest = sha256.hexdigest()
     return hexdigest[:10]
 
+def _get_file_hash(filename):
+    ''' Get the hash of the content of a file '''
+    sha256 = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(65536), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def _get_type_meta_filename(input_files, castxml_cmd, castxml_extra_args):
+    ''' Get the file name of cached type metadata '''
+    input_files = [os.path.abspath(f) for f in input_files]
+    key = [repr(input_files), castxml_cmd, repr(castxml_extra_args), str(_TYPE_META_VERSION)]
+    return _get_hash(key) + '.json'
+
+def _save_type_meta(meta_path, type_meta, source_files):
+    ''' Save type metadata together with the content hash of all source 
+        files (including all included files) it was produced from. 
+        Returns the absolute paths of the existing source files. '''
+    files = {}
+    for filename in source_files:
+        filename = os.path.abspath(filename)
+        if os.path.isfile(filename):
+            files[filename] = _get_file_hash(filename)
+    cache = {'version' : _TYPE_META_VERSION, 'files' : files, 'type_meta' : type_meta}
+
+    # Write to a temporary file first, since other processes might read
+    # the file simultaneously
+    tmp_path = '{0}.{1}.tmp'.format(meta_path, os.getpid())
+    with open(tmp_path, 'w') as file:
+        json.dump(cache, file)
+    os.replace(tmp_path, meta_path)
+    return list(files.keys())
+
+def _load_type_meta(meta_path):
+    ''' Load cached type metadata and the source files it was produced
+        from. Returns None as metadata if the cache does not exist or if any
+        of the source files has changed. '''
+    try:
+        with open(meta_path, 'r') as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        return None, []
+    if cache.get('version') != _TYPE_META_VERSION:
+        return None, []
+    for filename, file_hash in cache['files'].items():
+        try:
+            if _get_file_hash(filename) != file_hash:
+                return None, []
+        except OSError:
+            return None, []
+    return cache['type_meta'], list(cache['files'].keys())
+
+def _get_cache_paths(input_files, castxml_cmd, castxml_extra_args, cache_path):
+    ''' Get paths of the castxml output and the cached type metadata '''
+    if cache_path == '':
+        # Use temporary path to store xml
+        cache_path = tempfile.gettempdir()
+    
+    xml_path = os.path.join(cache_path, _get_hash(input_files) + '.xml')
+    meta_path = os.path.join(cache_path, _get_type_meta_filename(
+        input_files, castxml_cmd, castxml_extra_args))
+    return xml_path, meta_path
+
+def _castxml_required(xml_path, meta_path, use_cached):
+    ''' Check if castxml needs to be run when the cached type metadata
+        could not be used. Also when the cached metadata is outdated, since
+        the XML is then outdated as well '''
+    return use_cached == False or os.path.isfile(xml_path) == False or \
+           os.path.isfile(meta_path)
+
+def _parse_xml(input_files, xml_path, meta_path, streaming):
+    ''' Parse castxml output into type metadata and cache it. Returns the
+        metadata and the source files. '''
+    castxml_parser = _CastXmlParser(xml_path, streaming)
+    type_meta = castxml_parser.parse() 
+    source_files = _save_type_meta(meta_path, type_meta, 
+                                   castxml_parser.source_files + input_files)
+    return type_meta, source_files
+
+def _get_type_meta(input_files, castxml_cmd, castxml_extra_args, 
+                   cache_path, use_cached, streaming):
+    ''' Run castxml (unless cached) and parse the output into type 
+        metadata. Returns the metadata and the source files, including 
+        included files, it was produced from. '''
+    input_files = _listify(input_files)
+    xml_path, meta_path = _get_cache_paths(input_files, castxml_cmd, 
+                                           castxml_extra_args, cache_path)
+
+    type_meta = None
+    if use_cached:
+        type_meta, source_files = _load_type_meta(meta_path)
+
+    if type_meta == None:
+        if _castxml_required(xml_path, meta_path, use_cached):
+            _run_castxml(input_files, xml_path, castxml_cmd, castxml_extra_args)
+        type_meta, source_files = _parse_xml(input_files, xml_path, meta_path, streaming)
+
+    return type_meta, source_files
+
+def _is_same_type(type, other_type):
+    ''' Check if the metadata of two types are equal, ignoring the source
+        file where the type is defined '''
+    return dict(type, file = '') == dict(other_type, file = '')
+
+def _merge_type_meta(type_metas):
+    ''' Merge type metadata from several parsed source files. Identical
+        types are only included once. Types with the same name but 
+        different definitions are renamed (name1, name2 etc.), in the
+        order of type_metas, and references to them updated. '''
+    merged = {}
+    for type_meta in type_metas:
+        # Find types that need to be renamed. A type also needs to be 
+        # renamed if it refers to a renamed type.
+        renamed = set()
+        changed = True
+        while changed:
+            changed = False
+            for name, type in type_meta.items():
+                if name in renamed or name not in merged:
+                    continue
+                references = [m['reference'] for m in type['members'] if 'reference' in m]
+                if not _is_same_type(merged[name], type) or \
+                   len(renamed.intersection(references)) > 0:
+                    renamed.add(name)
+                    changed = True
+
+        new_names = {}
+        for name in type_meta:
+            if name not in renamed:
+                continue
+            for i in range(1, 1000):
+                new_name = name + str(i)
+                if new_name not in merged and new_name not in type_meta and \
+                   new_name not in new_names.values():
+                    break
+            logger.warning('{0} is defined differently in several source files. Renamed to {1}.'.format(
+                name, new_name))
+            new_names[name] = new_name
+
+        for name, type in type_meta.items():
+            if name in merged and name not in renamed:
+                continue # Identical
+            type = dict(type)
+            type['members'] = [dict(m) for m in type['members']]
+            for member in type['members']:
+                if member.get('reference') in new_names:
+                    member['reference'] = new_names[member['reference']]
+            type['name'] = new_names.get(name, name)
+            merged[type['name']] = type
+    return merged
+
 def _listify(list_or_str):
     ''' If list_or_str is a string it will be put in a list '''
     if isinstance(list_or_str, str):
@@ -66,32 +251,53 @@ class _CastXmlParser():
         such as members etc.
     '''
 
-    def __init__(self, xml_filename):
+    def __init__(self, xml_filename, streaming = False):
         self._xml_filename = xml_filename
+        self._streaming = streaming
         self._anonymous_count = 0
         self._embedded_bf_count = 0
         self._embedded_bf = []
 
     def parse(self):
 
-        self.root = ET.parse(self._xml_filename).getroot()
+        if self._streaming:
+            elems = self._iterparse()
+        else:
+            elems = ET.parse(self._xml_filename).getroot()
+
+        # Index elements to avoid searching the whole tree for each lookup
+        self._elems_by_tag = {}
+        self._elems_by_id = {}
+        self._elems_by_type = {}
+        for elem in elems:
+            self._elems_by_tag.setdefault(elem.tag, []).append(elem)
+            if 'id' in elem.attrib:
+                self._elems_by_id.setdefault(elem.attrib['id'], elem)
+            if elem.tag in ('Typedef', 'ElaboratedType') and 'type' in elem.attrib:
+                self._elems_by_type.setdefault((elem.tag, elem.attrib['type']), elem)
+
+        # All source files, including included files
+        self._file_names = {}
+        for xml_file in self._get_elems_with_tag('File'):
+            self._file_names[xml_file.attrib['id']] = xml_file.attrib['name']
+        self.source_files = list(self._file_names.values())
 
         supported_types = {}
 
         # Parse enums
-        xml_enums = self.root.findall('Enumeration')
+        xml_enums = self._get_elems_with_tag('Enumeration')
         for xml_enum in xml_enums:
             id = xml_enum.attrib['id']
             supported_types[id] = self._parse_enum(xml_enum)
 
         # Parse unions
-        xml_unions = self.root.findall('Union')
+        xml_unions = self._get_elems_with_tag('Union')
         for xml_union in xml_unions:
             id = xml_union.attrib['id']
             supported_types[id] = self._parse_union(xml_union)
         
         # Parse structs and bitfields:
-        xml_structs_and_bitfields = self.root.findall('Struct')
+        xml_structs_and_bitfields = self._get_elems_with_tag('Struct')
         for xml_struct_or_bitfield in xml_structs_and_bitfields:
             id = xml_struct_or_bitfield.attrib['id']
             if self._is_bitfield(xml_struct_or_bitfield):
@@ -127,6 +333,28 @@ class _CastXmlParser():
 
         return type_meta
 
+    def _iterparse(self):
+        ''' Iterate over the top level elements of the XML file without
+            loading the whole file. Only elements used by the parser are
+            kept, all other elements are discarded directly. '''
+        root = None
+        depth = 0
+        for event, elem in ET.iterparse(self._xml_filename, events = ('start', 'end')):
+            if event == 'start':
+                if depth == 0:
+                    root = elem
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1:
+                # Complete top level element (including children)
+                root.remove(elem)
+                if elem.tag in _STREAMING_TAGS:
+                    yield elem
+
+    def _get_elems_with_tag(self, tag):
+        return self._elems_by_tag.get(tag, [])
+
     def _is_bitfield(self, xml_struct_or_bitfield):
         ''' Returns true if this is a "true" bitfield, i.e. the
             struct only contains bitfield members '''
@@ -139,9 +367,9 @@ class _CastXmlParser():
     def _get_fields(self, xml_item):
         fields = []
         for member_id in self._get_attrib(xml_item, 'members', '').split():
-            xml_member = self._get_elem_with_id(member_id)
-            if xml_member.tag != 'Field':
-                continue # Probably just a struct/union definition
+            xml_member = self._elems_by_id.get(member_id)
+            if xml_member == None or xml_member.tag != 'Field':
+                continue # Probably just a struct/union definition (or discarded)
             fields.append(xml_member)
         return fields      
 
@@ -218,6 +446,7 @@ class _CastXmlParser():
         dict_output['size'] = int(int(self._get_attrib(xml_input, 'size', '0'))/8)
         dict_output['align'] = int(int(self._get_attrib(xml_input, 'align', '8'))/8)
         dict_output['supported'] = True  
+        dict_output['file'] = self._file_names.get(self._get_attrib(xml_input, 'file', ''), '')
 
     def _set_struct_union_members(self, xml_input, dict_output):
         ''' Set members - common for struct and unions '''
@@ -247,6 +476,7 @@ class _CastXmlParser():
                 bitfield['size'] = int(math.ceil(nbr_bits/8.0))
                 bitfield['align'] = dict_output['align'] # Same as parent
                 bitfield['supported'] = True 
+                bitfield['file'] = dict_output['file'] # Same as parent
                 bitfield['members'] = self._parse_bitfield_members(bf_fields)
                 self._embedded_bf.append(bitfield)
                 
@@ -277,15 +507,16 @@ class _CastXmlParser():
             return default     
 
     def _get_elem_with_id(self, id):
-        elem = self.root.find("*[@id='{0}']".format(id))
+        elem = self._elems_by_id.get(id)
         if elem == None:
-            raise Exception('No XML element with id attribute {2} identified'.format(id))
+            raise Exception('No XML element with id attribute {0} identified'.format(id))
         return elem
 
-    def _get_elem_with_attrib(self, tag, attrib, value):
-        elem = self.root.find("{0}[@{1}='{2}']".format(tag, attrib, value))
+    def _get_elem_with_type(self, tag, type_id):
+        ''' Get the first Typedef or ElaboratedType element of a type '''
+        elem = self._elems_by_type.get((tag, type_id))
         if elem == None:
-            raise Exception('No {0} XML element with {1} attribute {2} identified'.format(tag, attrib, value))
+            raise Exception('No {0} XML element with type attribute {1} identified'.format(tag, type_id))
         return elem
 
     def _get_typedef_name(self, type_id):
@@ -293,14 +524,14 @@ class _CastXmlParser():
 
         # First check if there is a connected ElaboratedType element
         try:
-            type_id = self._get_elem_with_attrib('ElaboratedType', 'type', type_id).attrib['id']
+            type_id = self._get_elem_with_type('ElaboratedType', type_id).attrib['id']
         except:
             pass
 
         # Now find the TypeDef element connected to the type or ElaboratedType element
         name = ''
         try:
-            name = self._get_elem_with_attrib('Typedef', 'type', type_id).attrib['name']
+            name = self._get_elem_with_type('Typedef', type_id).attrib['name']
         except:
             name = 'anonymous_{}'.format(self._anonymous_count)
             self._anonymous_count += 1
@@ -380,13 +611,27 @@ class _TypeMetaParser():
         generate pycstruct instances.
     '''
 
-    def __init__(self, type_meta, byteorder):
+    def __init__(self, type_meta, byteorder, types = None, instances = None,
+                 bytes_arrays = False):
         self._type_meta = type_meta
         self._instances = {}
+        if instances != None:
+            # Previously created instances to reuse
+            self._instances = dict(instances)
         self._byteorder = byteorder
+        self._types = types
+        self._bytes_arrays = bytes_arrays
 
     def parse(self):
-        for name, type in self._type_meta.items():
+        names = self._type_meta.keys()
+        if self._types != None:
+            # Only requested types and the types they depend on
+            names = _listify(self._types)
+            for name in names:
+                if name not in self._type_meta:
+                    raise Exception('Type {0} not found.'.format(name))
+        for name in names:
+            type = self._type_meta[name]
             if type['supported']:
                 try:
                     self._to_instance(name)
@@ -427,6 +672,8 @@ class _TypeMetaParser():
                         same_level = True
                     instance.add(other_instance, member['name'], 
                                  member['length'], same_level = same_level)
+                elif self._bytes_arrays and member['type'] == 'uint8' and member['length'] > 1:
+                    instance.add('bytes', member['name'], member['length'])
                 else: 
                     instance.add(member['type'],member['name'], member['length'])
         
@@ -463,7 +710,8 @@ class _TypeMetaParser():
 
 def parse_file(input_files, byteorder = 'native',  
             castxml_cmd = 'castxml', castxml_extra_args = [],
-            cache_path = '', use_cached = False):
+            cache_path = '', use_cached = False, streaming = False,
+            types = None, bytes_arrays = False):
     """Parse one or more C source files (C or C++) and generate pycstruct 
        instances as a result.
 
@@ -484,6 +732,8 @@ def parse_file(input_files, byteorder = 'native',
        - 'unsigned char []' = uint8 array
        - 'signed char []' = int8 array
        - 'char []' = utf-8 data (string) 
+
+       Set bytes_arrays to use the 'bytes' type for 'unsigned char []'.
        
        :param input_files: Source file name or a list of file names.
        :type input_files: str or list
@@ -506,39 +756,45 @@ def parse_file(input_files, byteorder = 'native',
        :param use_cached: If this is True, use previously cached
                           output from castxml to avoid re-running
                           castxml (since it could be time consuming).
-                          Default is False.
+                          The parsed type information is cached as well 
+                          and used as long as the content of the source
+                          files, including all included files, is 
+                          unchanged. Default is False.
        :type use_cached: boolean, optional
+       :param streaming: If this is True, the castxml output is read
+                         incrementally and only the parts required to
+                         create the definitions are kept in memory. Use
+                         this for large source files, such as source 
+                         files including system headers. Default is False.
+       :type streaming: boolean, optional
+       :param types: Names of the types to create instances of. Instances
+                     are also created for all types they depend on. If not
+                     provided instances of all types are created.
+       :type types: list, optional
+       :param bytes_arrays: If this is True, 'unsigned char []' arrays
+                            are added as 'bytes' elements, i.e. they are
+                            deserialized into a single bytes object
+                            instead of a list of integers. Default is
+                            False.
+       :type bytes_arrays: boolean, optional
        :return: A dictionary keyed on names of the structs, unions 
                 etc. The values are the actual pycstruct instances.
        :rtype: dict      
        """
 
-    input_files = _listify(input_files)
-    xml_filename = _get_hash(input_files) + '.xml'
-
-    if cache_path == '':
-        # Use temporary path to store xml
-        cache_path = tempfile.gettempdir()
-    
-    xml_path = os.path.join(cache_path, xml_filename)
-
-    # Generate XML
-    if use_cached == False or os.path.isfile(xml_path) == False:
-        _run_castxml(input_files, xml_path, castxml_cmd, castxml_extra_args)
-
-    # Parse XML
-    castxml_parser = _CastXmlParser(xml_path)
-    type_meta = castxml_parser.parse() 
+    type_meta, _ = _get_type_meta(input_files, castxml_cmd, castxml_extra_args, 
+                                  cache_path, use_cached, streaming)
 
     # Generate pycstruct instances
-    type_meta_parser = _TypeMetaParser(type_meta, byteorder)
+    type_meta_parser = _TypeMetaParser(type_meta, byteorder, types, bytes_arrays = bytes_arrays)
     pycstruct_instances = type_meta_parser.parse() 
 
     return pycstruct_instances
 
 def parse_str(str, byteorder = 'native',  
             castxml_cmd = 'castxml', castxml_extra_args = [],
-            cache_path = '', use_cached = False):
+            cache_path = '', use_cached = False, streaming = False,
+            types = None, bytes_arrays = False):
     """Parse a string containing C source code, such as struct or
        union defintions. Any valid C code is supported.
 
@@ -559,6 +815,8 @@ def parse_str(str, byteorder = 'native',
        - 'unsigned char []' = uint8 array
        - 'signed char []' = int8 array
        - 'char []' = utf-8 data (string) 
+
+       Set bytes_arrays to use the 'bytes' type for 'unsigned char []'.
        
        :param str: A string of C source code.
        :type str: str
@@ -583,6 +841,18 @@ def parse_str(str, byteorder = 'native',
                           castxml (since it could be time consuming).
                           Default is False.
        :type use_cached: boolean, optional
+       :param streaming: If this is True, the castxml output is read
+                         incrementally and only the parts required to
+                         create the definitions are kept in memory. Use
+                         this for large source files, such as source 
+                         files including system headers. Default is False.
+       :type streaming: boolean, optional
+       :param types: Names of the types to create instances of. Instances
+                     are also created for all types they depend on. If not
+                     provided instances of all types are created.
+       :type types: list, optional
+       :param bytes_arrays: See :func:`parse_file`.
+       :type bytes_arrays: boolean, optional
        :return: A dictionary keyed on names of the structs, unions 
                 etc. The values are the actual pycstruct instances.
        :rtype: dict      
@@ -598,11 +868,265 @@ def parse_str(str, byteorder = 'native',
         file.write(str)
     
     return parse_file(c_path, byteorder, castxml_cmd, 
-                      castxml_extra_args, cache_path, use_cached)
+                      castxml_extra_args, cache_path, use_cached, streaming, types,
+                      bytes_arrays)
 
+def parse_files_parallel(input_files, workers = None, byteorder = 'native',
+            castxml_cmd = 'castxml', castxml_extra_args = [],
+            cache_path = '', use_cached = False, streaming = False,
+            types = None, bytes_arrays = False):
+    """Parse many C source files in parallel and generate pycstruct 
+       instances as a result.
 
-        
+       Contrary to :func:`parse_file`, castxml is run separately for each
+       source file (or group of source files) and the output is parsed in
+       a pool of processes. The results are merged:
+
+       - Types defined identically in several source files, e.g. types
+         from a header included by many source files, are only included
+         once.
+       - Types with the same name but different definitions are renamed
+         by adding a number (name1, name2 etc.). The first source file
+         in input_files keeps the original name. A warning is logged.
+
+       :param input_files: A list of source file names. Each entry may
+                           also be a list of file names, which are parsed
+                           together as one unit.
+       :type input_files: list
+       :param workers: Maximum number of processes. If not provided the
+                       number of processors is used.
+       :type workers: int, optional
+       :param byteorder: See :func:`parse_file`.
+       :type byteorder: str, optional
+       :param castxml_cmd: See :func:`parse_file`.
+       :type castxml_cmd: str, optional
+       :param castxml_extra_args: See :func:`parse_file`. Used for all
+                                  source files.
+       :type castxml_extra_args: list, optional
+       :param cache_path: See :func:`parse_file`.
+       :type cache_path: str, optional
+       :param use_cached: See :func:`parse_file`.
+       :type use_cached: boolean, optional
+       :param streaming: See :func:`parse_file`.
+       :type streaming: boolean, optional
+       :param types: See :func:`parse_file`.
+       :type types: list, optional
+       :param bytes_arrays: See :func:`parse_file`.
+       :type bytes_arrays: boolean, optional
+       :return: A dictionary keyed on names of the structs, unions 
+                etc. The values are the actual pycstruct instances.
+       :rtype: dict      
+       """
+    input_files = [_listify(f) for f in _listify(input_files)]
+    n = len(input_files)
 
+    with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as executor:
+        type_metas = list(executor.map(_get_type_meta, input_files,
+                                       [castxml_cmd] * n, [castxml_extra_args] * n,
+                                       [cache_path] * n, [use_cached] * n, 
+                                       [streaming] * n))
 
+    # Generate pycstruct instances
+    type_meta = _merge_type_meta([type_meta for type_meta, _ in type_metas])
+    type_meta_parser = _TypeMetaParser(type_meta, byteorder, types, bytes_arrays = bytes_arrays)
+    return type_meta_parser.parse()
+
+class IncrementalParser():
+    """Parses C source files and keeps track of which source files, 
+       including included files, each parsed input file depends on. When
+       some source files have changed, :meth:`reparse` only runs castxml
+       for the affected input files and only creates new pycstruct 
+       instances for the types that have changed and the types depending
+       on them. All other instances are reused.
+
+       Example::
+
+         parser = pycstruct.IncrementalParser(['a.h', 'b.h'])
+         definitions = parser.parse()
+         # ... common.h, included by b.h, is changed
+         definitions = parser.reparse(['common.h'])
+
+       :param input_files: A list of source file names. castxml is run
+                           separately for each entry. Each entry may also
+                           be a list of file names, which are parsed 
+                           together as one unit. Types from different
+                           entries are merged as described for 
+                           :func:`parse_files_parallel`.
+       :type input_files: list
+       :param byteorder: See :func:`parse_file`.
+       :type byteorder: str, optional
+       :param castxml_cmd: See :func:`parse_file`.
+       :type castxml_cmd: str, optional
+       :param castxml_extra_args: See :func:`parse_file`.
+       :type castxml_extra_args: list, optional
+       :param cache_path: See :func:`parse_file`.
+       :type cache_path: str, optional
+       :param use_cached: See :func:`parse_file`. Only used by :meth:`parse`.
+       :type use_cached: boolean, optional
+       :param streaming: See :func:`parse_file`.
+       :type streaming: boolean, optional
+       :param types: See :func:`parse_file`.
+       :type types: list, optional
+       :param bytes_arrays: See :func:`parse_file`.
+       :type bytes_arrays: boolean, optional
+       """
+
+    def __init__(self, input_files, byteorder = 'native',  
+                 castxml_cmd = 'castxml', castxml_extra_args = [],
+                 cache_path = '', use_cached = False, streaming = False,
+                 types = None, bytes_arrays = False):
+        self._input_files = [_listify(f) for f in _listify(input_files)]
+        self._byteorder = byteorder
+        self._castxml_cmd = castxml_cmd
+        self._castxml_extra_args = castxml_extra_args
+        self._cache_path = cache_path
+        self._use_cached = use_cached
+        self._streaming = streaming
+        self._types = types
+        self._bytes_arrays = bytes_arrays
+        self._type_metas = [{} for _ in self._input_files]
+        self._source_files = [set() for _ in self._input_files]
+        self._type_meta = {}
+        self._instances = {}
+
+    def parse(self):
+        """Parse all source files.
+
+        :return: A dictionary keyed on names of the structs, unions 
+                 etc. The values are the actual pycstruct instances.
+        :rtype: dict      
+        """
+        for index in range(len(self._input_files)):
+            self._parse_input(index, self._use_cached)
+        return self._update()
+
+    def reparse(self, changed_files):
+        """Parse the input files that depend on any of the changed files
+        again.
+
+        :param changed_files: File name or list of file names of changed 
+                              source files, including included files.
+        :type changed_files: str or list
+        :return: A dictionary keyed on names of the structs, unions 
+                 etc. The values are the actual pycstruct instances.
+                 Instances of types that have not changed are the same
+                 as before.
+        :rtype: dict      
+        """
+        changed_files = set([os.path.abspath(f) for f in _listify(changed_files)])
+        for index, source_files in enumerate(self._source_files):
+            if len(changed_files.intersection(source_files)) > 0:
+                # The cached metadata is only used if the content of the 
+                # files did not actually change
+                self._parse_input(index, True)
+        return self._update()
+
+    def get_source_files(self):
+        """Get all source files, including included files, that the 
+        definitions depend on.
+
+        :return: Absolute paths of the source files
+        :rtype: list
+        """
+        source_files = set()
+        for files in self._source_files:
+            source_files.update(files)
+        return sorted(source_files)
+
+    def _parse_input(self, index, use_cached):
+        input_files = self._input_files[index]
+        type_meta, source_files = _get_type_meta(
+            input_files, self._castxml_cmd, self._castxml_extra_args,
+            self._cache_path, use_cached, self._streaming)
+        self._type_metas[index] = type_meta
+        self._source_files[index] = set(source_files + [os.path.abspath(f) for f in input_files])
+
+    def _update(self):
+        """ Create instances of new and changed types, and types that 
+        depend on them """
+        type_meta = _merge_type_meta(self._type_metas)
+
+        changed = set([name for name in self._type_meta if name not in type_meta])
+        for name, type in type_meta.items():
+            if name not in self._type_meta or not _is_same_type(self._type_meta[name], type):
+                changed.add(name)
+
+        dependents = {}
+        for name, type in type_meta.items():
+            for member in type['members']:
+                if 'reference' in member:
+                    dependents.setdefault(member['reference'], []).append(name)
+        names = list(changed)
+        while len(names) > 0:
+            for dependent in dependents.get(names.pop(), []):
+                if dependent not in changed:
+                    changed.add(dependent)
+                    names.append(dependent)
+
+        instances = {}
+        for name, instance in self._instances.items():
+            if name not in changed:
+                instances[name] = instance
+
+        self._type_meta = type_meta
+        type_meta_parser = _TypeMetaParser(type_meta, self._byteorder, self._types, instances,
+                                           self._bytes_arrays)
+        self._instances = type_meta_parser.parse()
+        return dict(self._instances)
+
+async def parse_file_async(input_files, byteorder = 'native',  
+            castxml_cmd = 'castxml', castxml_extra_args = [],
+            cache_path = '', use_cached = False, streaming = False,
+            types = None, bytes_arrays = False):
+    """Same as :func:`parse_file` but for asyncio applications. castxml is
+       run as an asyncio subprocess and the parsing is done in the default
+       executor of the event loop, i.e. the event loop is never blocked.
 
-        
\ No newline at end of file
+       If the task is cancelled while castxml is running, castxml is
+       killed.
+
+       Example::
+
+         definitions = await pycstruct.parse_file_async('myHeader.h')
+
+       See :func:`parse_file` for parameters and return value.
+       """
+    loop = asyncio.get_running_loop()
+    input_files = _listify(input_files)
+    xml_path, meta_path = _get_cache_paths(input_files, castxml_cmd, 
+                                           castxml_extra_args, cache_path)
+
+    type_meta = None
+    if use_cached:
+        type_meta, _ = await loop.run_in_executor(None, _load_type_meta, meta_path)
+
+    if type_meta == None:
+        if _castxml_required(xml_path, meta_path, use_cached):
+            await _run_castxml_async(input_files, xml_path, castxml_cmd, castxml_extra_args)
+        type_meta, _ = await loop.run_in_executor(None, _parse_xml, input_files, 
+                                                  xml_path, meta_path, streaming)
+
+    # Generate pycstruct instances
+    type_meta_parser = _TypeMetaParser(type_meta, byteorder, types, bytes_arrays = bytes_arrays)
+    return await loop.run_in_executor(None, type_meta_parser.parse)
+
+async def parse_str_async(str, byteorder = 'native',  
+            castxml_cmd = 'castxml', castxml_extra_args = [],
+            cache_path = '', use_cached = False, streaming = False,
+            types = None, bytes_arrays = False):
+    """Same as :func:`parse_str` but for asyncio applications. See 
+       :func:`parse_file_async`.
+       """
+    if cache_path == '':
+        # Use temporary path to store xml
+        cache_path = tempfile.gettempdir()
+
+    c_filename = _get_hash([str]) + '.c'
+    c_path = os.path.join(cache_path, c_filename)
+
+    with open(c_path, 'w') as file:
+        file.write(str)
+    
+    return await parse_file_async(c_path, byteorder, castxml_cmd, 
+                                  castxml_extra_args, cache_path, use_cached, 
+                                  streaming, types, bytes_arrays)
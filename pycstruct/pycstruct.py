@@ -4,28 +4,28 @@
 # released under the "MIT License Agreement". Please see the LICENSE
 # file that should have been included as part of this package.
 
-import struct, collections, math, sys
+import struct, collections, codecs, math, sys, os, mmap, weakref
 
 ###############################################################################
 # Global constants
 
 # Basic Types
 _TYPE = {
-  'int8'    : {'format' : 'b', 'bytes' : 1},
-  'uint8'   : {'format' : 'B', 'bytes' : 1},
-  'bool8'   : {'format' : 'B', 'bytes' : 1},
-  'int16'   : {'format' : 'h', 'bytes' : 2},
-  'uint16'  : {'format' : 'H', 'bytes' : 2},
-  'bool16'  : {'format' : 'H', 'bytes' : 2},
-  'float16' : {'format' : 'e', 'bytes' : 2},
-  'int32'   : {'format' : 'i', 'bytes' : 4},
-  'uint32'  : {'format' : 'I', 'bytes' : 4},
-  'bool32'  : {'format' : 'I', 'bytes' : 4},
-  'float32' : {'format' : 'f', 'bytes' : 4},
-  'int64'   : {'format' : 'q', 'bytes' : 8},
-  'uint64'  : {'format' : 'Q', 'bytes' : 8},
-  'bool64'  : {'format' : 'Q', 'bytes' : 8},
-  'float64' : {'format' : 'd', 'bytes' : 8}
+  'int8'    : {'format' : 'b', 'bytes' : 1, 'dtype' : 'i1'},
+  'uint8'   : {'format' : 'B', 'bytes' : 1, 'dtype' : 'u1'},
+  'bool8'   : {'format' : 'B', 'bytes' : 1, 'dtype' : 'u1'},
+  'int16'   : {'format' : 'h', 'bytes' : 2, 'dtype' : 'i2'},
+  'uint16'  : {'format' : 'H', 'bytes' : 2, 'dtype' : 'u2'},
+  'bool16'  : {'format' : 'H', 'bytes' : 2, 'dtype' : 'u2'},
+  'float16' : {'format' : 'e', 'bytes' : 2, 'dtype' : 'f2'},
+  'int32'   : {'format' : 'i', 'bytes' : 4, 'dtype' : 'i4'},
+  'uint32'  : {'format' : 'I', 'bytes' : 4, 'dtype' : 'u4'},
+  'bool32'  : {'format' : 'I', 'bytes' : 4, 'dtype' : 'u4'},
+  'float32' : {'format' : 'f', 'bytes' : 4, 'dtype' : 'f4'},
+  'int64'   : {'format' : 'q', 'bytes' : 8, 'dtype' : 'i8'},
+  'uint64'  : {'format' : 'Q', 'bytes' : 8, 'dtype' : 'u8'},
+  'bool64'  : {'format' : 'Q', 'bytes' : 8, 'dtype' : 'u8'},
+  'float64' : {'format' : 'd', 'bytes' : 8, 'dtype' : 'f8'}
 }
 
 _BYTEORDER = {
@@ -35,6 +35,15 @@ _BYTEORDER = {
 }
 
 
+# Integers of the sizes supported by the struct module
+_INT_STRUCT = {
+  (byteorder, size, signed) : struct.Struct(prefix + (fmt if signed else fmt.upper()))
+  for byteorder, prefix in [('little', '<'), ('big', '>')]
+  for size, fmt in [(1, 'b'), (2, 'h'), (4, 'i'), (8, 'q')]
+  for signed in [True, False]
+}
+
+
 ###############################################################################
 # Internal functions
 
@@ -51,6 +60,66 @@ def _get_padding(alignment, current_size, next_element_size):
     return 0
   return elem_size - remainder
 
+def _check_buffer(buffer, offset, size):
+  """Check that size bytes are available in buffer from offset"""
+  if offset < 0 or len(buffer) - offset < size:
+    raise Exception("Invalid buffer size: {0}. Expected at least {1} bytes from offset {2}".format(
+      len(buffer), size, offset))
+
+def _pack_int_into(buffer, offset, value, size, byteorder, signed):
+  """Write an integer into buffer at offset. Sizes supported by the struct
+     module are written directly without any intermediate bytes object.
+  """
+  codec = _INT_STRUCT.get((byteorder, size, signed))
+  if codec is None:
+    buffer[offset:offset + size] = value.to_bytes(size, byteorder, signed = signed)
+  else:
+    codec.pack_into(buffer, offset, value)
+
+def _read_into(stream, view):
+  """Read from stream until view is filled or end of stream is reached.
+     Short reads, which are common for pipes and sockets, are retried.
+
+     :return: Number of bytes read
+     :rtype: int
+  """
+  filled = 0
+  while filled < len(view):
+    if hasattr(stream, 'readinto'):
+      nbr_read = stream.readinto(view[filled:])
+    else:
+      data = stream.read(len(view) - filled)
+      nbr_read = len(data)
+      view[filled:filled + nbr_read] = data
+    if not nbr_read:
+      break # End of stream
+    filled += nbr_read
+  return filled
+
+def _get_numpy():
+  """Import numpy, which is an optional dependency only required for
+     the dtype and array methods
+  """
+  try:
+    import numpy
+  except ImportError:
+    raise Exception('Python package numpy not found.\n' +
+                    'It is required for dtype and array support.\n' +
+                    'You need to install it, e.g. pip install numpy.')
+  return numpy
+
+def _int_dtype(byteorder, size, signed):
+  """Get numpy dtype of an integer of size bytes. Sizes not supported by
+     numpy are represented as raw bytes.
+  """
+  numpy = _get_numpy()
+  if size not in [1, 2, 4, 8]:
+    return numpy.dtype((numpy.void, size))
+  kind = 'u'
+  if signed:
+    kind = 'i'
+  return numpy.dtype('{0}{1}{2}'.format(_BYTEORDER[byteorder]['format'], kind, size))
+
 def _round_pow_2(value):
   """Round value to next power of 2 value - max 16"""
   if value > 8:
@@ -67,6 +136,8 @@ def _round_pow_2(value):
 
 class BaseDef:
   """This is an abstract base class for definitions"""
+  _parents = None # StructDefs embedding this definition
+
   def size(self):
     raise NotImplementedError
 
@@ -76,12 +147,57 @@ class BaseDef:
   def deserialize(self, buffer):
     raise NotImplementedError
 
+  def serialize_into(self, buffer, offset, data):
+    """Serialize data into an existing buffer at offset. Subclasses 
+    should override this to avoid the intermediate buffer.
+    """
+    size = self.size()
+    _check_buffer(buffer, offset, size)
+    buffer[offset:offset + size] = self.serialize(data)
+
+  def deserialize_from(self, buffer, offset = 0):
+    """Deserialize data at offset in buffer. Subclasses should override
+    this to avoid copying the data.
+    """
+    size = self.size()
+    _check_buffer(buffer, offset, size)
+    return self.deserialize(buffer[offset:offset + size])
+
+  def dtype(self):
+    raise NotImplementedError
+
   def _largest_member(self):
     raise NotImplementedError
 
   def _type_name(self):
     raise NotImplementedError
 
+  def __getstate__(self):
+    """ State used by pickle and copy. Subclasses remove compiled objects,
+    which can not be pickled, and rebuild them in __setstate__.
+    """
+    state = self.__dict__.copy()
+    # Parents register themselves again when they are restored
+    state.pop('_parents', None)
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+
+  def _add_parent(self, parent):
+    """ Register a StructDef embedding this definition. It is notified
+    when the layout of this definition changes.
+    """
+    if self._parents is None:
+      self._parents = weakref.WeakSet()
+    self._parents.add(parent)
+
+  def _changed(self):
+    """ Notify the parents that the layout (size etc.) has changed """
+    if self._parents is not None:
+      for parent in list(self._parents):
+        parent._update_layout()
+
 
 ###############################################################################
 # BasicTypeDef Class
@@ -94,21 +210,41 @@ class BasicTypeDef(BaseDef):
     self.byteorder = byteorder
     self.size_bytes = _TYPE[type]['bytes']
     self.format = _TYPE[type]['format']
+    self.is_bool = type.startswith('bool')
+    self._compile()
+
+  def _compile(self):
+    ''' Create the struct.Struct objects, which can not be pickled '''
+    self.struct = struct.Struct(_BYTEORDER[self.byteorder]['format'] + self.format)
+    self.__array_structs = {} # Length to struct.Struct of arrays
+
+  def __getstate__(self):
+    state = BaseDef.__getstate__(self)
+    del state['struct']
+    del state['_BasicTypeDef__array_structs']
+    return state
+
+  def __setstate__(self, state):
+    BaseDef.__setstate__(self, state)
+    self._compile()
 
   def serialize(self, data):
     ''' Data needs to be an integer, floating point or boolean value '''
-    buffer = bytearray(self.size())
-    format = _BYTEORDER[self.byteorder]['format'] + self.format
-    struct.pack_into(format, buffer, 0, data)
+    return bytearray(self.struct.pack(data))
 
-    return buffer
+  def serialize_into(self, buffer, offset, data):
+    ''' Data needs to be an integer, floating point or boolean value '''
+    self.struct.pack_into(buffer, offset, data)
 
   def deserialize(self, buffer):
     ''' Result is an integer, floating point or boolean value '''
-    format = _BYTEORDER[self.byteorder]['format'] + self.format
-    value = struct.unpack_from(format, buffer, 0)[0]
+    return self.deserialize_from(buffer, 0)
+
+  def deserialize_from(self, buffer, offset = 0):
+    ''' Result is an integer, floating point or boolean value '''
+    value = self.struct.unpack_from(buffer, offset)[0]
 
-    if self.type.startswith("bool"):
+    if self.is_bool:
       if value == 0:
         value = False
       else:
@@ -116,6 +252,34 @@ class BasicTypeDef(BaseDef):
 
     return value
 
+  def _get_array_struct(self, length):
+    ''' Get a struct.Struct of an array with length elements '''
+    array_struct = self.__array_structs.get(length)
+    if array_struct is None:
+      array_struct = struct.Struct('{0}{1}{2}'.format(
+        _BYTEORDER[self.byteorder]['format'], length, self.format))
+      self.__array_structs[length] = array_struct
+    return array_struct
+
+  def _deserialize_array_from(self, buffer, offset, length):
+    ''' Result is a list of length values, unpacked with one call '''
+    values = self._get_array_struct(length).unpack_from(buffer, offset)
+    if self.is_bool:
+      return [value != 0 for value in values]
+    return list(values)
+
+  def _serialize_array_into(self, buffer, offset, values, length):
+    ''' Values is a list of at most length values, packed with one call.
+    Missing values are set to 0. '''
+    values = list(values)
+    values.extend([0] * (length - len(values)))
+    self._get_array_struct(length).pack_into(buffer, offset, *values)
+
+  def dtype(self):
+    ''' Result is a numpy dtype. Bools of all sizes are unsigned integers '''
+    numpy = _get_numpy()
+    return numpy.dtype(_BYTEORDER[self.byteorder]['format'] + _TYPE[self.type]['dtype'])
+
   def size(self):
     return self.size_bytes
 
@@ -130,44 +294,182 @@ class BasicTypeDef(BaseDef):
 # StringDef Class
   
 class StringDef(BaseDef):
-  """This class represents UTF-8 strings
+  """This class represents null terminated strings, by default UTF-8 encoded.
+
+  A StringDef is normally created by adding an element of type 'utf-8' to a
+  :meth:`StructDef`. Create it explicitly and add it as type to use another
+  encoding, another error handling or to keep the data as bytes.
+
+  :param length: Size of the string in bytes, including null termination.
+  :type length: int
+  :param encoding: Encoding of the string, for example 'utf-8', 'ascii' or
+                   'latin-1'. Default is 'utf-8'.
+  :type encoding: str, optional
+  :param errors: Error handling when encoding or decoding, see
+                 :meth:`str.encode`. Default is 'strict'.
+  :type errors: str, optional
+  :param raw: If True the string is deserialized into bytes (up to the null
+              termination) instead of being decoded. Default is False.
+  :type raw: bool, optional
   """
-  def __init__(self, length):
+  def __init__(self, length, encoding = 'utf-8', errors = 'strict', raw = False):
+    try:
+      codecs.lookup(encoding)
+    except LookupError:
+      raise Exception('Invalid encoding: {0}.'.format(encoding))
     self.length = length
+    self.__struct = struct.Struct('{0}s'.format(length)) # Pads with 0
+    self.encoding = encoding
+    self.errors = errors
+    self.raw = raw
+
+  def __getstate__(self):
+    state = BaseDef.__getstate__(self)
+    del state['_StringDef__struct']
+    return state
+
+  def __setstate__(self, state):
+    BaseDef.__setstate__(self, state)
+    self.__struct = struct.Struct('{0}s'.format(self.length))
 
   def serialize(self, data):
-    ''' Data needs to be a string '''
+    ''' Data needs to be a string or bytes '''
     buffer = bytearray(self.size())
+    self.serialize_into(buffer, 0, data)
+    return buffer
 
-    if not isinstance(data, str):
+  def serialize_into(self, buffer, offset, data):
+    ''' Data needs to be a string or bytes. Unused bytes are set to 0. '''
+    encoded = self._encode(data)
+    _check_buffer(buffer, offset, self.length)
+    self.__struct.pack_into(buffer, offset, encoded)
+
+  def _encode(self, data):
+    ''' Get the encoded bytes of a string, without null termination '''
+    if isinstance(data, str):
+      encoded = data.encode(self.encoding, self.errors)
+    elif isinstance(data, (bytes, bytearray)):
+      encoded = data
+    else:
       raise Exception('Not a valid string: {0}'.format(data))
 
-    utf8_bytes = data.encode('utf-8')
-    if len(utf8_bytes) > self.length:
+    if len(encoded) > self.length:
       raise Exception('String overflow. Produced size {0} but max is {1}'.format(
-        len(utf8_bytes), self.length))
+        len(encoded), self.length))
+    return encoded
 
-    for i in range(0, len(utf8_bytes)):
-      buffer[i] = utf8_bytes[i]
+  def deserialize(self, buffer):
+    ''' Result is a string, or bytes if raw is set '''
+    if not isinstance(buffer, (bytes, bytearray)):
+      buffer = bytes(buffer)
+    data = buffer.split(b'\x00', 1)[0]
+    if self.raw:
+      return bytes(data)
+    return data.decode(self.encoding, self.errors)
+
+  def deserialize_from(self, buffer, offset = 0):
+    ''' Result is a string, or bytes if raw is set '''
+    _check_buffer(buffer, offset, self.length)
+    end = offset + self.length
+    if isinstance(buffer, (bytes, bytearray)):
+      # Only copy the bytes up to the null termination
+      index = buffer.find(0, offset, end)
+      if index >= 0:
+        end = index
+      data = buffer[offset:end]
+      if self.raw:
+        return bytes(data)
+      return data.decode(self.encoding, self.errors)
+    return self.deserialize(memoryview(buffer)[offset:end])
+
+  def dtype(self):
+    ''' Result is a numpy bytes dtype (not decoded) '''
+    numpy = _get_numpy()
+    return numpy.dtype('S{0}'.format(self.length))
+
+  def size(self):
+    return self.length # Each element 1 byte
+
+  def _largest_member(self):
+    return 1 # 1 byte
+
+  def _type_name(self):
+    return self.encoding
+
+
+###############################################################################
+# BytesDef Class
+
+class BytesDef(BaseDef):
+  """This class represents opaque binary data, for example a payload.
+
+  A BytesDef is normally created by adding an element of type 'bytes' to a
+  :meth:`StructDef`. The data is deserialized into a single bytes object
+  instead of a list of integers.
+
+  :param length: Size of the data in bytes.
+  :type length: int
+  """
+  def __init__(self, length):
+    self.length = length
+    self.__struct = struct.Struct('{0}s'.format(length)) # Pads with 0
+
+  def __getstate__(self):
+    state = BaseDef.__getstate__(self)
+    del state['_BytesDef__struct']
+    return state
+
+  def __setstate__(self, state):
+    BaseDef.__setstate__(self, state)
+    self.__struct = struct.Struct('{0}s'.format(self.length))
+
+  def serialize(self, data):
+    ''' Data needs to be bytes or any other buffer '''
+    buffer = bytearray(self.size())
+    self.serialize_into(buffer, 0, data)
     return buffer
 
+  def serialize_into(self, buffer, offset, data):
+    ''' Data needs to be bytes or any other buffer. Unused bytes are set to 0. '''
+    data = self._encode(data)
+    _check_buffer(buffer, offset, self.length)
+    self.__struct.pack_into(buffer, offset, data)
+
+  def _encode(self, data):
+    ''' Get data as bytes or bytearray '''
+    if not isinstance(data, (bytes, bytearray)):
+      try:
+        data = memoryview(data).tobytes()
+      except TypeError:
+        raise Exception('Not a valid buffer: {0}'.format(data))
+
+    if len(data) > self.length:
+      raise Exception('Buffer overflow. Size is {0} but max is {1}'.format(
+        len(data), self.length))
+    return data
+
   def deserialize(self, buffer):
-    ''' Result is a string '''
-    # Find null termination
-    index = buffer.find(0)
-    if index >= 0:
-      buffer = buffer[:index]
+    ''' Result is bytes '''
+    return bytes(buffer)
 
-    return buffer.decode('utf-8') 
+  def deserialize_from(self, buffer, offset = 0):
+    ''' Result is bytes '''
+    _check_buffer(buffer, offset, self.length)
+    return bytes(memoryview(buffer)[offset:offset + self.length])
+
+  def dtype(self):
+    ''' Result is a numpy void dtype '''
+    numpy = _get_numpy()
+    return numpy.dtype('V{0}'.format(self.length))
 
   def size(self):
-    return self.length # Each element 1 byte
+    return self.length
 
   def _largest_member(self):
     return 1 # 1 byte
 
   def _type_name(self):
-    return 'utf-8'
+    return 'bytes'
 
 
 ###############################################################################
@@ -200,6 +502,12 @@ class StructDef(BaseDef):
     self.__union = union
     self.__pad_count = 0
     self.__fields = collections.OrderedDict()
+    self._reset_compiled()
+
+    # Layout cache, kept up to date by add and remove
+    self.__elem_size_sum = 0 # All elements excluding end padding
+    self.__largest_elem_size = 0 # Largest element excluding padding
+    self.__largest = 0 # Largest member
 
     # Add end padding of 0 size
     self.__pad_byte = BasicTypeDef('uint8', default_byteorder)
@@ -250,6 +558,10 @@ class StructDef(BaseDef):
           |            |               | parameter to set the length of the   |
           |            |               | string including null termination    |
           +------------+---------------+--------------------------------------+
+          | bytes      | 1             | Opaque data as a single bytes        |
+          |            |               | object. Use length parameter to set  |
+          |            |               | the size in bytes                    |
+          +------------+---------------+--------------------------------------+
           | struct     | struct size   | Embedded struct. The actual          |
           |            |               | StructDef object shall be set as     |
           |            |               | type and not 'struct' string.        |
@@ -264,6 +576,9 @@ class StructDef(BaseDef):
           |            |               | 'enum' string.                       |
           +------------+---------------+--------------------------------------+
        
+       Embedded structs, bitfields and enums shall be completely defined before
+       they are added, since the size of the element is stored when it is added.
+
        :param type: Element data type. See above.
        :type type: str
        :param name: Name of element. Needs to be unique.
@@ -301,10 +616,18 @@ class StructDef(BaseDef):
       type = StringDef(length)
       # String length is handled inside the definition
       length = 1
+    elif type == 'bytes':
+      type = BytesDef(length)
+      # Size is handled inside the definition
+      length = 1
     elif type in _TYPE:
       type = BasicTypeDef(type, byteorder)
     elif not isinstance(type, BaseDef):
       raise Exception('Invalid type: {0}.'.format(type))
+    type._add_parent(self)
+
+    # Layout will change, compiled codec must be rebuilt
+    self._reset_compiled()
 
     # Remove end padding if it exists
     self.__fields.pop('__pad_end','')
@@ -313,13 +636,13 @@ class StructDef(BaseDef):
     if not self.__union:
       padding = _get_padding(self.__alignment, self.size(), type._largest_member())
       if padding > 0:
-        self.__fields['__pad_{0}'.format(self.__pad_count)] = \
-          {'type' : self.__pad_byte, 'length' : padding, 'same_level' : False }
+        self._add_field('__pad_{0}'.format(self.__pad_count),
+          {'type' : self.__pad_byte, 'length' : padding, 'same_level' : False })
         self.__pad_count += 1
 
     # Add the element
-    self.__fields[name] = { 'type' : type, 'length' : length, 
-                            'same_level' : same_level }
+    self._add_field(name, { 'type' : type, 'length' : length, 
+                            'same_level' : same_level })
 
     # Check if end padding is required
     padding = _get_padding(self.__alignment, self.size(), self._largest_member())
@@ -327,6 +650,57 @@ class StructDef(BaseDef):
       self.__pad_end['length'] = padding
       self.__fields['__pad_end'] = self.__pad_end
 
+    self._changed()
+
+  def _add_field(self, name, field):
+    """ Add field last and update the layout cache """
+    self.__fields[name] = field
+    elem_size = field['length'] * field['type'].size()
+    self.__elem_size_sum += elem_size
+    if not name.startswith('__pad') and elem_size > self.__largest_elem_size:
+      self.__largest_elem_size = elem_size
+    self.__largest = max(self.__largest, field['type']._largest_member())
+
+  def _reset_compiled(self):
+    """ Remove everything compiled from the layout. It will be compiled
+    again when used.
+    """
+    self.__codec = None
+    self.__dtype = None
+    self.__members = None
+    self.__zero_fill = None
+
+  def __getstate__(self):
+    state = BaseDef.__getstate__(self)
+    # Compiled again when used
+    for name in ['__codec', '__dtype', '__members', '__zero_fill']:
+      del state['_StructDef' + name]
+    return state
+
+  def __setstate__(self, state):
+    BaseDef.__setstate__(self, state)
+    self._reset_compiled()
+    for field in self.__fields.values():
+      field['type']._add_parent(self)
+
+  def _update_layout(self):
+    """ Rebuild the layout cache from all fields. Called when fields are
+    removed and when an embedded definition has changed.
+    """
+    self._reset_compiled()
+    self.__elem_size_sum = 0
+    self.__largest_elem_size = 0
+    self.__largest = 0
+    fields = self.__fields
+    self.__fields = collections.OrderedDict()
+    for name, field in fields.items():
+      if name == '__pad_end':
+        self.__fields[name] = field
+        self.__largest = max(self.__largest, field['type']._largest_member())
+      else:
+        self._add_field(name, field)
+    self._changed()
+
   def size(self):
     """ Get size of structure or union.
 
@@ -334,16 +708,11 @@ class StructDef(BaseDef):
              of the elements (including end padding) if this is a union.
     :rtype: int
     """
-    all_elem_size = 0
-    largest_size = 0
-    for name, field in self.__fields.items():
-      elem_size = field['length'] * field['type'].size()
-      if  not name.startswith('__pad') and elem_size > largest_size:
-        largest_size = elem_size
-      all_elem_size += elem_size
     if self.__union:
-      return largest_size +  self.__pad_end['length'] # Union
-    return all_elem_size # Struct
+      return self.__largest_elem_size + self.__pad_end['length'] # Union
+    if '__pad_end' in self.__fields:
+      return self.__elem_size_sum + self.__pad_end['length'] # Struct
+    return self.__elem_size_sum # Struct
 
   def _largest_member(self):
     """ Used for struct/union padding
@@ -351,13 +720,7 @@ class StructDef(BaseDef):
     :return: Largest member
     :rtype: int
     """
-    largest = 0
-    for field in self.__fields.values():
-      l = field['type']._largest_member()
-      if l > largest:
-        largest = l
-    
-    return largest
+    return self.__largest
 
   def deserialize(self, buffer):
     """ Deserialize buffer into dictionary
@@ -367,10 +730,71 @@ class StructDef(BaseDef):
     :return: A dictionary keyed with the element names
     :rtype: dict
     """
-    result = {}
     if len(buffer) != self.size():
       raise Exception("Invalid buffer size: {0}. Expected: {1}".format(len(buffer),self.size()))
-    offset = 0
+    return self.deserialize_from(buffer, 0)
+
+  def deserialize_from(self, buffer, offset = 0):
+    """ Deserialize data at offset in buffer into dictionary. The buffer
+    is not copied.
+
+    :param buffer: Buffer that contains the data to deserialize
+    :type buffer: bytes, bytearray, memoryview, mmap or any other buffer
+    :param offset: Start position of the data in the buffer. Default is 0.
+    :type offset: int, optional
+    :return: A dictionary keyed with the element names
+    :rtype: dict
+    """
+    _check_buffer(buffer, offset, self.size())
+    if self.__union:
+      return self._deserialize_union(buffer, offset)
+
+    codec, steps = self._get_codec()
+    values = codec.unpack_from(buffer, offset)
+
+    result = {}
+    for name, kind, datatype, length, elem_offset, same_level, index in steps:
+      if kind == 'basic':
+        if length == 1:
+          value = values[index]
+          if datatype.is_bool:
+            value = value != 0
+        else:
+          value = list(values[index:index + length])
+          if datatype.is_bool:
+            value = [v != 0 for v in value]
+        result[name] = value
+        continue
+      if kind == 'bytes':
+        result[name] = values[index]
+        continue
+
+      try:
+        if kind == 'string':
+          value = datatype.deserialize(values[index])
+        elif kind == 'array':
+          value = datatype._deserialize_array_from(buffer, offset + elem_offset, length)
+        else:
+          datatype_size = datatype.size()
+          value = []
+          for i in range(0, length):
+            next_offset = offset + elem_offset + i*datatype_size
+            value.append(datatype.deserialize_from(buffer, next_offset))
+          if length == 1:
+            value = value[0]
+      except Exception as e:
+        raise Exception('Unable to deserialize {} {}. Reason:\n{}'.format(
+          datatype._type_name(), name, e.args[0]))
+
+      if same_level and isinstance(value, dict):
+        result.update(value)
+      else:
+        result[name] = value
+
+    return result
+
+  def _deserialize_union(self, buffer, offset):
+    result = {}
     for name, field in self.__fields.items():
       datatype = field['type']
       length = field['length']
@@ -378,13 +802,15 @@ class StructDef(BaseDef):
       datatype_size = datatype.size()
 
       if not name.startswith('__pad'):
-        values = []
+        if length > 1 and isinstance(datatype, BasicTypeDef):
+          result[name] = datatype._deserialize_array_from(buffer, offset, length)
+          continue
 
+        values = []
         for i in range(0, length):
           next_offset = offset + i*datatype_size
-          buffer_subset = buffer[next_offset:next_offset + datatype_size]
           try:
-            value = datatype.deserialize(buffer_subset)
+            value = datatype.deserialize_from(buffer, next_offset)
           except Exception as e:
             raise Exception('Unable to deserialize {} {}. Reason:\n{}'.format(
             datatype._type_name(), name, e.args[0]))
@@ -398,9 +824,6 @@ class StructDef(BaseDef):
         else:
           result[name] = values
 
-      if not self.__union:
-        offset += datatype_size * length
-
     return result
 
   def serialize(self, data):
@@ -419,7 +842,144 @@ class StructDef(BaseDef):
     :rtype: bytearray
     """
     buffer = bytearray(self.size())
-    offset = 0
+    self.serialize_into(buffer, 0, data)
+    return buffer
+
+  def serialize_into(self, buffer, offset, data):
+    """ Serialize dictionary into an existing buffer at offset. All bytes
+    of the struct in the buffer are written, i.e. elements omitted from the
+    dictionary and padding are set to 0. See :meth:`serialize`.
+
+    :param buffer: A writable buffer, such as bytearray, memoryview or mmap
+    :type buffer: bytearray
+    :param offset: Start position in the buffer
+    :type offset: int
+    :param data: A dictionary keyed with element names. Elements can be omitted from the dictionary (defaults to value 0).
+    :type data: dict
+    """
+    _check_buffer(buffer, offset, self.size())
+    if self.__union:
+      self._serialize_union(buffer, offset, data)
+    else:
+      self._serialize_struct(buffer, offset, data)
+
+  def serialize_many(self, records):
+    """ Serialize many dictionaries into one buffer with the structs
+    back-to-back. The buffer is allocated once and each struct is 
+    serialized directly into it. See :meth:`serialize`.
+
+    :param records: Dictionaries keyed with element names
+    :type records: list or any other iterable
+    :return: A buffer that contains data of all records
+    :rtype: bytearray
+    """
+    if not isinstance(records, collections.abc.Sized):
+      records = list(records)
+    buffer = bytearray(self.size() * len(records))
+    self.serialize_many_into(buffer, 0, records)
+    return buffer
+
+  def serialize_many_into(self, buffer, offset, records):
+    """ Serialize many dictionaries back-to-back into an existing buffer 
+    starting at offset. See :meth:`serialize_into`.
+
+    Example::
+
+      buffer = bytearray(myStruct.size() * len(records))
+      myStruct.serialize_many_into(buffer, 0, records)
+
+    :param buffer: A writable buffer, such as bytearray, memoryview or mmap
+    :type buffer: bytearray
+    :param offset: Start position in the buffer
+    :type offset: int
+    :param records: Dictionaries keyed with element names
+    :type records: list or any other iterable
+    :return: Number of serialized records
+    :rtype: int
+    """
+    size = self.size()
+    sized = isinstance(records, collections.abc.Sized)
+    if sized:
+      _check_buffer(buffer, offset, size * len(records))
+    if self.__union:
+      serialize = self._serialize_union
+    else:
+      serialize = self._serialize_struct
+
+    count = 0
+    for data in records:
+      if not sized:
+        _check_buffer(buffer, offset, size)
+      try:
+        serialize(buffer, offset, data)
+      except Exception as e:
+        raise Exception('Unable to serialize record {0}. Reason:\n{1}'.format(
+          count, e.args[0]))
+      offset += size
+      count += 1
+    return count
+
+  def _serialize_struct(self, buffer, offset, data):
+    codec, steps = self._get_codec()
+
+    values = []
+    nested = []
+    for name, kind, datatype, length, elem_offset, same_level, index in steps:
+      if same_level:
+        nested.append((name, kind, datatype, length, elem_offset, [data]))
+      elif name not in data:
+        if kind == 'basic':
+          values.extend([0] * length)
+        elif kind == 'string' or kind == 'bytes':
+          values.append(b'')
+      elif kind == 'nested' or length > 1:
+        value_list = self._get_value_list(name, data[name], length)
+        if kind == 'basic':
+          values.extend(value_list)
+          values.extend([0] * (length - len(value_list)))
+        else:
+          nested.append((name, kind, datatype, length, elem_offset, value_list))
+      elif kind == 'string' or kind == 'bytes':
+        try:
+          values.append(datatype._encode(data[name]))
+        except Exception as e:
+          raise Exception('Unable to serialize {} {}. Reason:\n{}'.format(
+            datatype._type_name(), name, e.args[0]))
+      else:
+        values.append(data[name])
+
+    try:
+      # Note that this also sets padding and nested elements to 0
+      codec.pack_into(buffer, offset, *values)
+    except struct.error:
+      # Pack each basic member on its own to find out which one failed
+      for name, kind, datatype, length, elem_offset, same_level, index in steps:
+        if kind == 'basic':
+          for value in values[index:index + length]:
+            try:
+              datatype.serialize(value)
+            except Exception as e:
+              raise Exception('Unable to serialize {} {}. Reason:\n{}'.format(
+                datatype._type_name(), name, e.args[0]))
+      raise
+
+    for name, kind, datatype, length, elem_offset, value_list in nested:
+      datatype_size = datatype.size()
+      try:
+        if kind == 'array':
+          datatype._serialize_array_into(buffer, offset + elem_offset, value_list, length)
+          continue
+        for i in range(0, len(value_list)):
+          next_offset = offset + elem_offset + i*datatype_size
+          datatype.serialize_into(buffer, next_offset, value_list[i])
+      except Exception as e:
+        raise Exception('Unable to serialize {} {}. Reason:\n{}'.format(
+          datatype._type_name(), name, e.args[0]))
+
+  def _serialize_union(self, buffer, offset, data):
+    if self.__zero_fill is None:
+      self.__zero_fill = struct.Struct('{0}x'.format(self.size()))
+    self.__zero_fill.pack_into(buffer, offset)
     for name, field in self.__fields.items():
       datatype = field['type']
       length = field['length']
@@ -431,25 +991,327 @@ class StructDef(BaseDef):
         if same_level:
           value_list.append(data) # Add all data for embedded object
         elif length > 1:
-          if not isinstance(data[name], collections.abc.Iterable):
-            raise Exception('Key: {0} shall be a list'.format(name))
-          if len(data[name]) > length:
-            raise Exception('List in key: {0} is larger than {1}'.format(name, length))
-          value_list = data[name]
+          value_list = self._get_value_list(name, data[name], length)
         else:
           value_list.append(data[name]) # Make list of single value
 
+        if length > 1 and isinstance(datatype, BasicTypeDef):
+          try:
+            datatype._serialize_array_into(buffer, offset, value_list, length)
+          except Exception as e:
+            raise Exception('Unable to serialize {} {}. Reason:\n{}'.format(
+              datatype._type_name(), name, e.args[0]))
+          continue
+
         for i in range(0, len(value_list)):
           next_offset = offset + i*datatype_size
           try:
-            buffer[next_offset:next_offset + datatype_size] = datatype.serialize(value_list[i])
+            datatype.serialize_into(buffer, next_offset, value_list[i])
           except Exception as e:
             raise Exception('Unable to serialize {} {}. Reason:\n{}'.format(
               datatype._type_name(), name, e.args[0]))
 
+  def _get_value_list(self, name, value, length):
+    """ Validate the value of an array element
+
+    :return: The value as a list
+    :rtype: list
+    """
+    if length == 1:
+      return [value]
+    if not isinstance(value, collections.abc.Iterable):
+      raise Exception('Key: {0} shall be a list'.format(name))
+    if len(value) > length:
+      raise Exception('List in key: {0} is larger than {1}'.format(name, length))
+    return value
+
+  def _get_codec(self):
+    """ Get the compiled layout of the struct. It is compiled on first use
+    and rebuilt if the definition has changed.
+
+    :return: A struct.Struct covering the whole struct and a list of steps
+             describing how to map the unpacked values to elements
+    :rtype: tuple
+    """
+    if self.__codec is None:
+      self.__codec = self._compile()
+    return self.__codec
+
+  def _compile(self):
+    """ Compile the struct layout into one struct.Struct format. Basic types
+    in the default byteorder are unpacked directly (arrays as repeat counts)
+    and strings and bytes as raw bytes. Padding and all other elements, such as
+    embedded structs, bitfields, enums and arrays in another byteorder, are
+    skipped in the format and handled by their own definition.
+    """
+    fmt = [_BYTEORDER[self.__default_byteorder]['format']]
+    steps = []
+    offset = 0
+    index = 0
+    for name, field in self.__fields.items():
+      datatype = field['type']
+      length = field['length']
+      elem_size = datatype.size() * length
+
+      if name.startswith('__pad'):
+        fmt.append('{0}x'.format(elem_size))
+      elif isinstance(datatype, BasicTypeDef) and \
+           datatype.byteorder == self.__default_byteorder:
+        fmt.append('{0}{1}'.format(length, datatype.format))
+        steps.append((name, 'basic', datatype, length, offset, False, index))
+        index += length
+      elif isinstance(datatype, StringDef) and length == 1:
+        fmt.append('{0}s'.format(elem_size))
+        steps.append((name, 'string', datatype, length, offset, False, index))
+        index += 1
+      elif isinstance(datatype, BytesDef) and length == 1:
+        fmt.append('{0}s'.format(elem_size))
+        steps.append((name, 'bytes', datatype, length, offset, False, index))
+        index += 1
+      elif isinstance(datatype, BasicTypeDef) and length > 1:
+        # Array in another byteorder, unpacked with one call of its own
+        fmt.append('{0}x'.format(elem_size))
+        steps.append((name, 'array', datatype, length, offset, False, index))
+      else:
+        fmt.append('{0}x'.format(elem_size))
+        steps.append((name, 'nested', datatype, length, offset,
+                      field['same_level'], index))
+
+      offset += elem_size
+
+    return struct.Struct(''.join(fmt)), steps
+
+  def dtype(self):
+    """ Get a numpy structured dtype with the same layout as the struct
+    or union, i.e. with the same offsets, byteorder and size (including
+    padding). Requires numpy.
+
+    Strings are represented as bytes (no decoding), bitfields as
+    unsigned integers and enums as integers. Bools of all sizes (bool8 to
+    bool64) are unsigned integers of the same size, since numpy only has
+    1 byte bools and non-zero values other than 1 are valid. Use
+    ``myArray['myBool'] != 0`` to get numpy bools. Elements of embedded
+    structs added with same_level are put on the same level as the
+    parent.
+
+    :return: A numpy dtype
+    :rtype: numpy.dtype
+    """
+    if self.__dtype is not None:
+      return self.__dtype
+
+    numpy = _get_numpy()
+    names = []
+    formats = []
+    offsets = []
+    for name, datatype, length, offset, same_level in self._get_layout():
+      datatype_dtype = datatype.dtype()
+      if same_level and datatype_dtype.names is not None:
+        for subname in datatype_dtype.names:
+          subdtype, suboffset = datatype_dtype.fields[subname][:2]
+          names.append(subname)
+          formats.append(subdtype)
+          offsets.append(offset + suboffset)
+      else:
+        if length > 1:
+          datatype_dtype = numpy.dtype((datatype_dtype, (length,)))
+        names.append(name)
+        formats.append(datatype_dtype)
+        offsets.append(offset)
+
+    self.__dtype = numpy.dtype({'names' : names, 'formats' : formats,
+                                'offsets' : offsets, 'itemsize' : self.size()})
+    return self.__dtype
+
+  def iter_unpack(self, stream, chunk_size = 65536):
+    """ Iterate over back-to-back structs in a file or stream and
+    deserialize them one at the time. The data is read in chunks of
+    (approximately) chunk_size bytes, thus the whole file is never loaded
+    into memory.
+
+    Example::
+
+      for record in myStruct.iter_unpack('myRecording.dat'):
+        print(record['myUnsignedInteger'])
+
+    :param stream: Path to a file or a binary file-like object with a read
+                   or readinto method, such as an open file, a socket file
+                   or a pipe.
+    :type stream: str or file-like object
+    :param chunk_size: Number of bytes to read at the time. Rounded down to
+                       a multiple of the struct size (at least one struct).
+    :type chunk_size: int, optional
+    :return: A generator of dictionaries keyed with the element names
+    :rtype: generator
+    """
+    if not hasattr(stream, 'read'):
+      with open(stream, 'rb') as f:
+        for result in self.iter_unpack(f, chunk_size):
+          yield result
+      return
+
+    size = self.size()
+    if size == 0:
+      raise Exception('Unable to unpack struct of size 0')
+
+    chunk = bytearray(max(1, chunk_size // size) * size)
+    view = memoryview(chunk)
+    while True:
+      filled = _read_into(stream, view)
+      for offset in range(0, filled - filled % size, size):
+        yield self.deserialize_from(chunk, offset)
+      if filled < len(chunk):
+        if filled % size != 0:
+          raise Exception('Incomplete struct at end of stream. {0} bytes of {1} read'.format(
+            filled % size, size))
+        break
+
+  def deserialize_array(self, buffer, count = -1, offset = 0):
+    """ Deserialize a buffer of back-to-back structs into a numpy
+    structured array. The buffer is not copied, i.e. the array is a view
+    of the buffer. Requires numpy.
+
+    :param buffer: Buffer that contains the data to deserialize
+    :type buffer: bytes, bytearray, memoryview or any other buffer
+    :param count: Number of structs to deserialize. If not provided
+                  all structs in the buffer are deserialized.
+    :type count: int, optional
+    :param offset: Start position in the buffer in bytes. Default is 0.
+    :type offset: int, optional
+    :return: A numpy array with the dtype returned by :meth:`dtype`. Note
+             that bools are unsigned integers, contrary to
+             :meth:`deserialize` which returns True or False.
+    :rtype: numpy.ndarray
+    """
+    numpy = _get_numpy()
+    dtype = self.dtype()
+    if count < 0 and (len(buffer) - offset) % dtype.itemsize != 0:
+      raise Exception("Invalid buffer size: {0}. Expected a multiple of {1}".format(
+        len(buffer) - offset, dtype.itemsize))
+    return numpy.frombuffer(buffer, dtype = dtype, count = count, offset = offset)
+
+  def view(self, buffer, offset = 0):
+    """ Create a lazy view of the struct in a buffer. Contrary to 
+    :meth:`deserialize` nothing is deserialized when the view is created.
+    Instead each element is deserialized from the buffer when it is 
+    accessed, as an attribute or an item:
+
+    .. code-block:: python
+
+      myView = myStruct.view(buffer)
+      myView.mySmallInteger
+      myView['myUnsignedInteger']
+
+    Embedded structs and unions are returned as views. Assigning an element
+    serializes the value directly into the buffer, which must then be
+    writable (bytearray, memoryview, mmap etc.).
+
+    :param buffer: Buffer that contains the data
+    :type buffer: bytes, bytearray, memoryview, mmap or any other buffer
+    :param offset: Start position of the data in the buffer. Default is 0.
+    :type offset: int, optional
+    :return: A view of the struct
+    :rtype: StructView
+    """
+    _check_buffer(buffer, offset, self.size())
+    return StructView(self, buffer, offset)
+
+  def _get_layout(self):
+    """ Get all elements, excluding padding, with their offsets
+
+    :return: A list of tuples of name, datatype, length, offset and
+             same_level for each element
+    :rtype: list
+    """
+    layout = []
+    offset = 0
+    for name, field in self.__fields.items():
+      datatype = field['type']
+      length = field['length']
+      if not name.startswith('__pad'):
+        layout.append((name, datatype, length, offset, field['same_level']))
       if not self.__union:
-        offset += datatype_size * length
-    return buffer
+        offset += datatype.size() * length
+    return layout
+
+  def _get_byteorder(self):
+    return self.__default_byteorder
+
+  def _get_alignment(self):
+    return self.__alignment
+
+  def _is_union(self):
+    return self.__union
+
+  def _get_members(self):
+    """ Get the elements of the struct, where elements added with 
+    same_level are replaced with their own elements.
+
+    :return: A dictionary keyed with the element names. The values are
+             tuples of datatype, length, offset and name within the
+             bitfield (None if not a same_level bitfield element).
+    :rtype: dict
+    """
+    if self.__members is not None:
+      return self.__members
+
+    members = collections.OrderedDict()
+    for name, datatype, length, offset, same_level in self._get_layout():
+      if same_level and isinstance(datatype, StructDef):
+        for subname, member in datatype._get_members().items():
+          subtype, sublength, suboffset, subfield = member
+          members[subname] = (subtype, sublength, offset + suboffset, subfield)
+      elif same_level:
+        for subname in datatype._get_field_names():
+          members[subname] = (datatype, 1, offset, subname)
+      else:
+        members[name] = (datatype, length, offset, None)
+
+    self.__members = members
+    return members
+
+  def _get_member(self, buffer, offset, name):
+    """ Deserialize a single element of the struct at offset in buffer """
+    datatype, length, elem_offset, subfield = self._get_members()[name]
+    offset += elem_offset
+    if subfield is not None:
+      return datatype.deserialize_from(buffer, offset)[subfield]
+
+    if length > 1 and isinstance(datatype, BasicTypeDef):
+      return datatype._deserialize_array_from(buffer, offset, length)
+
+    datatype_size = datatype.size()
+    values = []
+    for i in range(0, length):
+      next_offset = offset + i*datatype_size
+      if isinstance(datatype, StructDef):
+        values.append(StructView(datatype, buffer, next_offset))
+      else:
+        values.append(datatype.deserialize_from(buffer, next_offset))
+    if length == 1:
+      return values[0]
+    return values
+
+  def _set_member(self, buffer, offset, name, value):
+    """ Serialize a single element of the struct into buffer at offset """
+    datatype, length, elem_offset, subfield = self._get_members()[name]
+    offset += elem_offset
+    if subfield is not None:
+      bitfield_data = datatype.deserialize_from(buffer, offset)
+      bitfield_data[subfield] = value
+      datatype.serialize_into(buffer, offset, bitfield_data)
+      return
+
+    datatype_size = datatype.size()
+    value_list = self._get_value_list(name, value, length)
+    if length > 1 and isinstance(datatype, BasicTypeDef):
+      datatype._serialize_array_into(buffer, offset, value_list, length)
+      return
+    for i in range(0, len(value_list)):
+      datatype.serialize_into(buffer, offset + i*datatype_size, value_list[i])
+    # Elements not in the list are set to 0
+    buffer[offset + len(value_list)*datatype_size:offset + length*datatype_size] = \
+      bytes((length - len(value_list))*datatype_size)
 
   def create_empty_data(self):
     """ Create an empty dictionary with all keys
@@ -514,6 +1376,78 @@ class StructDef(BaseDef):
       if key == name:
         break # Done
 
+    self._update_layout()
+
+###############################################################################
+# StructView Class
+
+class StructView:
+  """This class represents a lazy view of a struct or union in a buffer.
+  Instances are created with :meth:`StructDef.view`.
+
+  Elements are accessed as attributes or items. Each access deserializes
+  the element from the buffer, and each assignment serializes the value
+  into the buffer. Elements with names that are not valid Python 
+  identifiers can only be accessed as items.
+  """
+  __slots__ = ('_structdef', '_buffer', '_offset')
+
+  def __init__(self, structdef, buffer, offset = 0):
+    object.__setattr__(self, '_structdef', structdef)
+    object.__setattr__(self, '_buffer', buffer)
+    object.__setattr__(self, '_offset', offset)
+
+  def __getitem__(self, name):
+    if name not in self._structdef._get_members():
+      raise KeyError(name)
+    return self._structdef._get_member(self._buffer, self._offset, name)
+
+  def __setitem__(self, name, value):
+    if name not in self._structdef._get_members():
+      raise KeyError(name)
+    self._structdef._set_member(self._buffer, self._offset, name, value)
+
+  def __getattr__(self, name):
+    if name in StructView.__slots__:
+      raise AttributeError(name) # Not initialized yet, e.g. when copied
+    if name not in self._structdef._get_members():
+      raise AttributeError(name)
+    return self._structdef._get_member(self._buffer, self._offset, name)
+
+  def __setattr__(self, name, value):
+    if name not in self._structdef._get_members():
+      raise AttributeError(name)
+    self._structdef._set_member(self._buffer, self._offset, name, value)
+
+  def __contains__(self, name):
+    return name in self._structdef._get_members()
+
+  def __iter__(self):
+    return iter(self._structdef._get_members())
+
+  def __dir__(self):
+    return list(self._structdef._get_members())
+
+  def keys(self):
+    """ Get the element names
+
+    :return: The element names
+    :rtype: list
+    """
+    return list(self._structdef._get_members())
+
+  def to_dict(self):
+    """ Deserialize all elements. Same as :meth:`StructDef.deserialize`.
+
+    :return: A dictionary keyed with the element names
+    :rtype: dict
+    """
+    return self._structdef.deserialize_from(self._buffer, self._offset)
+
+  def __repr__(self):
+    return 'StructView({0})'.format(self.to_dict())
+
+
 ###############################################################################
 # BitfieldDef Class
 
@@ -536,11 +1470,16 @@ class BitfieldDef(BaseDef):
   def __init__(self, byteorder = 'native', size = -1):
     if byteorder not in _BYTEORDER:
       raise Exception('Invalid byteorder: {0}.'.format(byteorder))
+    self.__declared_byteorder = byteorder # Possibly native
     if byteorder == 'native':
       byteorder = sys.byteorder
     self.__byteorder = byteorder
     self.__size = size
     self.__fields = collections.OrderedDict()
+    # Precomputed name, start bit, mask, sign bit, min and max value
+    # of each element
+    self.__table = []
+    self.__assigned_bits = 0
 
   def add(self, name, nbr_of_bits = 1, signed = False):
       """Add a new element in the bitfield definition. The element will be added 
@@ -567,6 +1506,18 @@ class BitfieldDef(BaseDef):
 
       self.__fields[name] = {'nbr_of_bits' : nbr_of_bits, 'signed' : signed}
 
+      mask = (1 << nbr_of_bits) - 1
+      sign_bit = 0
+      min = 0
+      max = mask
+      if signed:
+        sign_bit = 1 << (nbr_of_bits - 1)
+        min = -sign_bit
+        max = sign_bit - 1
+      self.__table.append((name, self.__assigned_bits, mask, sign_bit, min, max))
+      self.__assigned_bits = total_nbr_of_bits
+      self._changed()
+
   def deserialize(self, buffer):
     """ Deserialize buffer into dictionary
 
@@ -575,16 +1526,32 @@ class BitfieldDef(BaseDef):
     :return: A dictionary keyed with the element names
     :rtype: dict
     """
-    result = {}
     if len(buffer) != self.size():
       raise Exception("Invalid buffer size: {0}. Expected: {1}".format(len(buffer),self.size()))
+    return self.deserialize_from(buffer, 0)
 
-    value = int.from_bytes(buffer, self.__byteorder, signed=False)
+  def deserialize_from(self, buffer, offset = 0):
+    """ Deserialize data at offset in buffer into dictionary. The buffer
+    is not copied.
 
-    start_bit = 0
-    for name, field in self.__fields.items():
-      result[name] = self._get_subvalue(value, field['nbr_of_bits'], start_bit, field['signed'])
-      start_bit += field['nbr_of_bits']
+    :param buffer: Buffer that contains the data to deserialize
+    :type buffer: bytes, bytearray, memoryview, mmap or any other buffer
+    :param offset: Start position of the data in the buffer. Default is 0.
+    :type offset: int, optional
+    :return: A dictionary keyed with the element names
+    :rtype: dict
+    """
+    size = self.size()
+    _check_buffer(buffer, offset, size)
+    value = int.from_bytes(memoryview(buffer)[offset:offset + size], self.__byteorder, signed=False)
+
+    result = {}
+    for name, start_bit, mask, sign_bit, _, _ in self.__table:
+      subvalue = (value >> start_bit) & mask
+      if subvalue & sign_bit:
+        # Convert to negative value using Two's complement
+        subvalue -= mask + 1
+      result[name] = subvalue
 
     return result
 
@@ -597,16 +1564,152 @@ class BitfieldDef(BaseDef):
     :return: A buffer that contains data
     :rtype: bytearray
     """
+    return self._get_value(data).to_bytes(self.size(), self.__byteorder, signed=False)
+
+  def serialize_into(self, buffer, offset, data):
+    """ Serialize dictionary into an existing buffer at offset
+
+    :param buffer: A writable buffer, such as bytearray, memoryview or mmap
+    :type buffer: bytearray
+    :param offset: Start position in the buffer
+    :type offset: int
+    :param data: A dictionary keyed with element names. Elements can be omitted from the dictionary (defaults to value 0).
+    :type data: dict
+    """
+    size = self.size()
+    _check_buffer(buffer, offset, size)
+    _pack_int_into(buffer, offset, self._get_value(data), size, self.__byteorder, False)
+
+  def _get_value(self, data):
+    """ Get the integer value of the bitfield from a dictionary
+    :return: The value
+    :rtype: int
+    """
     value = 0
-    start_bit = 0
-    for name, field in self.__fields.items():
-      subvalue = 0
+    for name, start_bit, mask, sign_bit, min, max in self.__table:
       if name in data:
         subvalue = data[name]
-      value = self._set_subvalue(value, subvalue, field['nbr_of_bits'], start_bit, field['signed'])
-      start_bit += field['nbr_of_bits']
+        if subvalue > max or subvalue < min:
+          # Raises an exception describing the error
+          field = self.__fields[name]
+          self._set_subvalue(0, subvalue, field['nbr_of_bits'], 0, field['signed'])
+        value |= (subvalue & mask) << start_bit
+    return value
+
+  def dtype(self):
+    """ Get a numpy dtype of the bitfield, which is an unsigned integer
+    of the same size (or raw bytes if the size is 3, 5, 6 or 7 bytes).
+    Requires numpy.
+
+    :return: A numpy dtype
+    :rtype: numpy.dtype
+    """
+    return _int_dtype(self.__byteorder, self.size(), signed = False)
+
+  def unpack_array(self, array):
+    """ Extract all elements from an array of bitfield values at once.
+    Typically the array is a column of an array returned by
+    :meth:`StructDef.deserialize_array`:
+
+    .. code-block:: python
 
-    return value.to_bytes(self.size(), self.__byteorder, signed=False)
+      myArray = myStruct.deserialize_array(inbytes)
+      myStatus = myBitfield.unpack_array(myArray['myBitfield'])
+      print(myStatus['myElement'].sum())
+
+    Requires numpy.
+
+    :param array: Integers or raw bytes with the dtype returned by :meth:`dtype`
+    :type array: numpy.ndarray
+    :return: A dictionary keyed with the element names. The values are
+             arrays of the smallest integer type that can hold the element.
+    :rtype: dict
+    """
+    numpy = _get_numpy()
+    values = self._to_uint64(numpy, numpy.asarray(array))
+
+    result = {}
+    for name, start_bit, mask, sign_bit, _, _ in self.__table:
+      subvalues = (values >> numpy.uint64(start_bit)) & numpy.uint64(mask)
+      nbr_of_bytes = _round_pow_2(max(1, int(math.ceil(mask.bit_length() / 8.0))))
+      if sign_bit:
+        # Convert to negative values using Two's complement (with
+        # wraparound of the 64 bit unsigned values)
+        sign_bit = numpy.uint64(sign_bit)
+        subvalues = ((subvalues ^ sign_bit) - sign_bit).view(numpy.int64)
+        result[name] = subvalues.astype('i{0}'.format(nbr_of_bytes))
+      else:
+        result[name] = subvalues.astype('u{0}'.format(nbr_of_bytes))
+    return result
+
+  def pack_array(self, data):
+    """ Create an array of bitfield values from arrays of element values.
+    This is the reverse of :meth:`unpack_array`. Requires numpy.
+
+    :param data: A dictionary keyed with element names. The values are
+                 arrays (or scalars) with the same shape. Elements can be
+                 omitted from the dictionary (defaults to value 0).
+    :type data: dict
+    :return: An array with the dtype returned by :meth:`dtype`
+    :rtype: numpy.ndarray
+    """
+    numpy = _get_numpy()
+    subarrays = {}
+    for name in self.__fields:
+      if name in data:
+        subarrays[name] = numpy.asarray(data[name])
+    shape = numpy.broadcast_shapes(*[a.shape for a in subarrays.values()])
+
+    values = numpy.zeros(shape, dtype = numpy.uint64)
+    for name, start_bit, mask, sign_bit, min, max in self.__table:
+      if name not in subarrays:
+        continue
+      subvalues = subarrays[name]
+      if subvalues.size > 0 and (subvalues.min() < min or subvalues.max() > max):
+        # Raises an exception describing the error of the first invalid value
+        invalid = subvalues[(subvalues < min) | (subvalues > max)].flat[0]
+        field = self.__fields[name]
+        self._set_subvalue(0, int(invalid), field['nbr_of_bits'], 0, field['signed'])
+      values |= (subvalues.astype(numpy.uint64) & numpy.uint64(mask)) << numpy.uint64(start_bit)
+    return self._from_uint64(numpy, values)
+
+  def _to_uint64(self, numpy, array):
+    """ Convert an array with the dtype of the bitfield to uint64 values """
+    size = self.size()
+    if size > 8:
+      raise Exception('Arrays of bitfields larger than 8 bytes are not supported.')
+    if array.dtype.kind in 'ui':
+      return array.astype(numpy.uint64)
+    if array.dtype.itemsize != size:
+      raise Exception('Invalid dtype: {0}. Expected: {1}'.format(array.dtype, self.dtype()))
+
+    # Raw bytes
+    raw = numpy.ascontiguousarray(array).view(numpy.uint8).reshape(array.shape + (size,))
+    values = numpy.zeros(array.shape, dtype = numpy.uint64)
+    for i in range(size):
+      shift = 8 * i
+      if self.__byteorder == 'big':
+        shift = 8 * (size - 1 - i)
+      values |= raw[..., i].astype(numpy.uint64) << numpy.uint64(shift)
+    return values
+
+  def _from_uint64(self, numpy, values):
+    """ Convert an array of uint64 values to the dtype of the bitfield """
+    size = self.size()
+    if size > 8:
+      raise Exception('Arrays of bitfields larger than 8 bytes are not supported.')
+    dtype = self.dtype()
+    if dtype.kind == 'u':
+      return values.astype(dtype)
+
+    # Raw bytes
+    raw = numpy.empty(values.shape + (size,), dtype = numpy.uint8)
+    for i in range(size):
+      shift = 8 * i
+      if self.__byteorder == 'big':
+        shift = 8 * (size - 1 - i)
+      raw[..., i] = (values >> numpy.uint64(shift)) & numpy.uint64(0xFF)
+    return raw.view(dtype).reshape(values.shape)
 
   def assigned_bits(self):
     """ Get size of bitfield in bits excluding padding bits
@@ -614,11 +1717,7 @@ class BitfieldDef(BaseDef):
     :return: Number of bits this bitfield represents excluding padding bits
     :rtype: int
     """
-    total_nbr_of_bits = 0
-    for _, field in self.__fields.items():
-      total_nbr_of_bits += field['nbr_of_bits']
-
-    return total_nbr_of_bits
+    return self.__assigned_bits
 
   def size(self):
     """ Get size of bitfield in bytes
@@ -644,24 +1743,6 @@ class BitfieldDef(BaseDef):
     """
     return _round_pow_2(self.size())
   
-  def _get_subvalue(self, value, nbr_of_bits, start_bit, signed):
-    """ Get subvalue of value
-    :return: The subvalue
-    :rtype: int
-    """
-    shifted_value = value >> start_bit
-    mask = 0xFFFFFFFFFFFFFFFF >> (64 - nbr_of_bits)
-    non_signed_value = shifted_value & mask
-    if (signed == False):
-      return non_signed_value
-    sign_bit = 0x1 << (nbr_of_bits - 1)
-    if non_signed_value & sign_bit == 0:
-      # Value is positive
-      return non_signed_value
-    # Convert to negative value using Two's complement
-    signed_value = -1 * ((~non_signed_value & mask) + 1) 
-    return signed_value
-  
   def _set_subvalue(self, value, subvalue, nbr_of_bits, start_bit, signed):
     """ Set subvalue of value
     :return: New value where subvalue is included
@@ -704,6 +1785,28 @@ class BitfieldDef(BaseDef):
     buffer = bytearray(self.size())
     return self.deserialize(buffer)
 
+  def _get_field_names(self):
+    return list(self.__fields)
+
+  def _get_layout(self):
+    """ Get all elements with the position of their first bit
+
+    :return: A list of tuples of name, start bit, number of bits and 
+             signed for each element
+    :rtype: list
+    """
+    layout = []
+    for name, start_bit, _, _, _, _ in self.__table:
+      field = self.__fields[name]
+      layout.append((name, start_bit, field['nbr_of_bits'], field['signed']))
+    return layout
+
+  def _get_byteorder(self):
+    return self.__byteorder
+
+  def _get_declared_byteorder(self):
+    return self.__declared_byteorder
+
   def _type_name(self):
     return 'bitfield'
 
@@ -749,12 +1852,16 @@ class EnumDef(BaseDef):
   def __init__(self, byteorder = 'native', size = -1, signed = False):
     if byteorder not in _BYTEORDER:
       raise Exception('Invalid byteorder: {0}.'.format(byteorder))
+    self.__declared_byteorder = byteorder # Possibly native
     if byteorder == 'native':
       byteorder = sys.byteorder
     self.__byteorder = byteorder
     self.__size = size
     self.__signed = signed
     self.__constants = collections.OrderedDict()
+    self.__names = {} # Value to first name with the value
+    self.__next_value = 0 # Lowest unused non negative value
+    self.__max_bit_length = 1 # To avoid 0 size
 
   def add(self, name, value=None):
       """Add a new constant in the enum definition. Multiple constant might
@@ -773,13 +1880,8 @@ class EnumDef(BaseDef):
         raise Exception('Constant with name {0} already exists.'.format(name))
 
       # Automatically assigned to next available value
-      index = 0
-      while value == None:
-        try: 
-          self.get_name(index)
-          index += 1
-        except:
-          value = index  
+      if value == None:
+        value = self.__next_value
 
       # Secure that no negative number are added to signed enum
       if not self.__signed and value < 0:
@@ -791,6 +1893,12 @@ class EnumDef(BaseDef):
           self._max_bits(), self._bit_length(value)))
 
       self.__constants[name] = value
+      if value not in self.__names:
+        self.__names[value] = name
+      while self.__next_value in self.__names:
+        self.__next_value += 1
+      self.__max_bit_length = max(self.__max_bit_length, self._bit_length(value))
+      self._changed()
 
   def deserialize(self, buffer):
     """ Deserialize buffer into a string (constant name)
@@ -808,13 +1916,25 @@ class EnumDef(BaseDef):
     """
     if len(buffer) != self.size():
       raise Exception("Invalid buffer size: {0}. Expected: {1}".format(len(buffer),self.size()))
+    return self.deserialize_from(buffer, 0)
 
-    value = int.from_bytes(buffer, self.__byteorder, signed = self.__signed)
+  def deserialize_from(self, buffer, offset = 0):
+    """ Deserialize data at offset in buffer into a string (constant
+    name). The buffer is not copied. See :meth:`deserialize`.
 
-    name = ''
-    try: 
-      name = self.get_name(value)
-    except:
+    :param buffer: Buffer that contains the data to deserialize
+    :type buffer: bytes, bytearray, memoryview, mmap or any other buffer
+    :param offset: Start position of the data in the buffer. Default is 0.
+    :type offset: int, optional
+    :return: The constant name (string) 
+    :rtype: str
+    """
+    size = self.size()
+    _check_buffer(buffer, offset, size)
+    value = int.from_bytes(memoryview(buffer)[offset:offset + size], self.__byteorder, signed = self.__signed)
+
+    name = self.__names.get(value)
+    if name is None:
       # No constant name exist, generate a new
       name = '__VALUE__{}'.format(value)
     return name
@@ -831,6 +1951,29 @@ class EnumDef(BaseDef):
 
     return value.to_bytes(self.size(), self.__byteorder, signed = self.__signed)
 
+  def serialize_into(self, buffer, offset, data):
+    """ Serialize string (constant name) into an existing buffer at offset
+
+    :param buffer: A writable buffer, such as bytearray, memoryview or mmap
+    :type buffer: bytearray
+    :param offset: Start position in the buffer
+    :type offset: int
+    :param data: A string representing the constant name.
+    :type data: str
+    """
+    size = self.size()
+    _check_buffer(buffer, offset, size)
+    _pack_int_into(buffer, offset, self.get_value(data), size, self.__byteorder, self.__signed)
+
+  def dtype(self):
+    """ Get a numpy dtype of the enum, which is an integer of the same
+    size (or raw bytes if the size is 3, 5, 6 or 7 bytes). Requires numpy.
+
+    :return: A numpy dtype
+    :rtype: numpy.dtype
+    """
+    return _int_dtype(self.__byteorder, self.size(), self.__signed)
+
   def size(self):
     """ Get size of enum in bytes
 
@@ -840,13 +1983,7 @@ class EnumDef(BaseDef):
     if self.__size >= 0:
       return self.__size # Force size
 
-    max_length = 1 # To avoid 0 size
-    for _, value in self.__constants.items():
-      bit_length = self._bit_length(value)
-      if bit_length > max_length:
-        max_length = bit_length
-
-    return int(math.ceil( max_length / 8.0 ))
+    return int(math.ceil( self.__max_bit_length / 8.0 ))
 
   def _max_bits(self):
     if self.__size >= 0:
@@ -867,9 +2004,8 @@ class EnumDef(BaseDef):
     :return: The constant name
     :rtype: str
     """
-    for constant, v in self.__constants.items():
-      if value == v:
-        return constant
+    if value in self.__names:
+      return self.__names[value]
     raise Exception("Value {0} is not a valid value for this enum.".format(value))
 
   def get_value(self, name):
@@ -885,6 +2021,18 @@ class EnumDef(BaseDef):
   def _type_name(self):
     return 'enum'
 
+  def _get_constants(self):
+    return collections.OrderedDict(self.__constants)
+
+  def _get_byteorder(self):
+    return self.__byteorder
+
+  def _get_declared_byteorder(self):
+    return self.__declared_byteorder
+
+  def _is_signed(self):
+    return self.__signed
+
   def _bit_length(self, value):
     """ Get number of bits a value represents.
 
@@ -915,3 +2063,155 @@ class EnumDef(BaseDef):
       result.append('{:<30}{:<10}'.format(
         name,value))
     return '\n'.join(result)
+
+
+###############################################################################
+# RecordFile Class
+
+class RecordFile:
+  """This class represents a file of back-to-back structs (records), 
+  optionally preceded by a header. The file is memory mapped and records
+  are only deserialized when accessed, thus random access to a record in
+  a large file is fast.
+
+  Records are accessed by index or slice, and the instance can be used
+  as a context manager::
+
+    with pycstruct.RecordFile('myRecording.dat', myStruct) as records:
+      print(len(records))
+      last = records[-1]
+      first_ten = records[0:10]
+
+  Any bytes after the last complete record are ignored.
+
+  :param path: Path to the file
+  :type path: str
+  :param structdef: Definition of each record
+  :type structdef: StructDef
+  :param header_size: Number of bytes in the beginning of the file before
+                      the first record. Default is 0.
+  :type header_size: int, optional
+  :param writable: If True records may be assigned, which writes them
+                   directly to the file. Default is False.
+  :type writable: bool, optional
+  """
+
+  def __init__(self, path, structdef, header_size = 0, writable = False):
+    if structdef.size() == 0:
+      raise Exception('Unable to use struct of size 0 as record')
+    if header_size < 0:
+      raise Exception('Invalid header size: {0}.'.format(header_size))
+    self.structdef = structdef
+    self.header_size = header_size
+    self.writable = writable
+    self.__record_size = structdef.size()
+
+    mode = 'rb'
+    access = mmap.ACCESS_READ
+    if writable:
+      mode = 'r+b'
+      access = mmap.ACCESS_WRITE
+
+    self.__file = open(path, mode)
+    file_size = os.fstat(self.__file.fileno()).st_size
+    self.__len = max(0, (file_size - header_size) // self.__record_size)
+    self.__mmap = None
+    if file_size > 0:
+      self.__mmap = mmap.mmap(self.__file.fileno(), 0, access = access)
+
+  def __len__(self):
+    return self.__len
+
+  def __getitem__(self, index):
+    """ Deserialize record(s)
+
+    :param index: Index or slice of records
+    :type index: int or slice
+    :return: A dictionary, or a list of dictionaries if index is a slice
+    :rtype: dict or list
+    """
+    if isinstance(index, slice):
+      return [self.structdef.deserialize_from(self.__mmap, self.offset(i))
+              for i in range(*index.indices(self.__len))]
+    return self.structdef.deserialize_from(self.__mmap, self.offset(index))
+
+  def __setitem__(self, index, data):
+    """ Serialize record(s) directly into the file. Requires that the file
+    was opened as writable.
+
+    :param index: Index or slice of records
+    :type index: int or slice
+    :param data: A dictionary, or a list of dictionaries if index is a slice
+    :type data: dict or list
+    """
+    if not self.writable:
+      raise Exception('Record file is not writable')
+    if isinstance(index, slice):
+      indexes = range(*index.indices(self.__len))
+      if len(indexes) != len(data):
+        raise Exception('Unable to assign {0} records to {1} records'.format(
+          len(data), len(indexes)))
+      for i, record in zip(indexes, data):
+        self.structdef.serialize_into(self.__mmap, self.offset(i), record)
+    else:
+      self.structdef.serialize_into(self.__mmap, self.offset(index), data)
+
+  def __iter__(self):
+    for i in range(0, self.__len):
+      yield self.structdef.deserialize_from(self.__mmap, self.offset(i))
+
+  def view(self, index):
+    """ Get a lazy view of a record, see :meth:`StructDef.view`.
+    Assigning elements of the view writes them directly to the file
+    (requires that the file was opened as writable). The view must not be
+    used after the file is closed.
+
+    :param index: Index of record. Negative values count from the end.
+    :type index: int
+    :return: A view of the record
+    :rtype: StructView
+    """
+    return self.structdef.view(self.__mmap, self.offset(index))
+
+  def offset(self, index):
+    """ Get position of a record in the file
+
+    :param index: Index of record. Negative values count from the end.
+    :type index: int
+    :return: Offset in bytes from the beginning of the file
+    :rtype: int
+    """
+    if index < 0:
+      index += self.__len
+    if index < 0 or index >= self.__len:
+      raise IndexError('Record index out of range')
+    return self.header_size + index * self.__record_size
+
+  def header(self):
+    """ Get the header bytes
+
+    :return: The bytes before the first record
+    :rtype: bytes
+    """
+    if self.__mmap is None:
+      return b''
+    return self.__mmap[:self.header_size]
+
+  def flush(self):
+    """ Flush written records to the file """
+    if self.__mmap is not None and self.writable:
+      self.__mmap.flush()
+
+  def close(self):
+    """ Close the file. Written records are flushed. """
+    if self.__mmap is not None:
+      self.flush()
+      self.__mmap.close()
+      self.__mmap = None
+    self.__file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
@@ -22,6 +22,9 @@ setup(name='pycstruct',
       keywords = ['struct', 'enum', 'bitfield', 'binary', 'protocol', 'dict', 'dictionary'], 
       license='MIT',
       packages=['pycstruct'],
+      extras_require={
+            'numpy': ['numpy'],
+      },
       zip_safe=False,
       classifiers=[
       'Development Status :: 3 - Alpha',  
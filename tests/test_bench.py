@@ -0,0 +1,122 @@
+import unittest, os, sys, io, json, tempfile, contextlib
+
+test_dir = os.path.dirname(os.path.realpath(__file__))
+proj_dir = os.path.dirname(test_dir)
+
+sys.path.append(proj_dir)
+import pycstruct
+import pycstruct.bench
+
+class TestBench(unittest.TestCase):
+
+  def test_run(self):
+    results = pycstruct.bench.run(['bitfield', 'union'], min_time = 0.001, codegen = True)
+    self.assertEqual(results['format_version'], 1)
+    operations = [(r['case'], r['operation']) for r in results['results']]
+    self.assertEqual(operations, [
+      ('bitfield', 'deserialize'), ('bitfield', 'serialize'),
+      ('bitfield', 'codegen_deserialize'), ('bitfield', 'codegen_serialize'),
+      ('union', 'deserialize'), ('union', 'serialize'), ('union', 'serialize_many'),
+      ('union', 'codegen_deserialize'), ('union', 'codegen_serialize')])
+    for result in results['results']:
+      self.assertTrue(result['records_per_second'] > 0)
+      self.assertAlmostEqual(result['bytes_per_second'],
+                             result['records_per_second'] * result['record_size'])
+    self.assertEqual(results['results'][0]['record_size'], 8)
+
+    # Results shall be possible to save as JSON
+    json.dumps(results)
+
+    self.assertRaises(Exception, pycstruct.bench.run, ['invalid'])
+
+  def test_cases(self):
+    # All sample data shall be valid
+    for case, create in pycstruct.bench._CASES.items():
+      definition, data = create()
+      buffer = definition.serialize(data)
+      self.assertEqual(definition.serialize(definition.deserialize(buffer)), buffer, msg = case)
+
+  def test_compare(self):
+    results = pycstruct.bench.run(['enum'], min_time = 0.001)
+    self.assertEqual(pycstruct.bench.compare(results, results), [])
+
+    baseline = json.loads(json.dumps(results))
+    baseline['results'][0]['records_per_second'] *= 2
+    regressions = pycstruct.bench.compare(results, baseline)
+    self.assertEqual(len(regressions), 1)
+    self.assertEqual(regressions[0][:2], ('enum', 'deserialize'))
+    self.assertAlmostEqual(regressions[0][2], 0.5)
+    self.assertEqual(pycstruct.bench.compare(results, baseline, threshold = 0.6), [])
+
+  def test_generate(self):
+    header = pycstruct.bench.generate_header(2)
+    self.assertTrue('struct s1 {' in header)
+    self.assertTrue('struct s0 *prev;' in header)
+
+    xml_filename = os.path.join(tempfile.mkdtemp(), 'synthetic.xml')
+    with open(xml_filename, 'w') as f:
+      f.write(pycstruct.bench.generate_xml(2))
+    meta = pycstruct.cparser._CastXmlParser(xml_filename).parse()
+    self.assertEqual(sorted(meta.keys()), ['auto_bitfield_0', 'auto_bitfield_1', 'bf0', 'bf1',
+                                           'e0', 'e1', 'p0_t', 'p1_t', 's0', 's1', 'u0', 'u1'])
+    instances = pycstruct.cparser._TypeMetaParser(meta, 'little').parse()
+    s = instances['s1']
+    self.assertEqual(s.size(), 88)
+    data = {'id' : 1, 'name' : 'name', 'kind' : 'e1_0', 'flags' : {'c' : -3}, 'inline_b' : 5,
+            'value' : {'f' : 1.0}, 'prev' : 2, 'pos' : {'x' : 3}}
+    result = s.deserialize(s.serialize(data))
+    for name, value in data.items():
+      if isinstance(value, dict):
+        for subname, subvalue in value.items():
+          self.assertEqual(result[name][subname], subvalue)
+      else:
+        self.assertEqual(result[name], value)
+
+  def test_run_cparser(self):
+    results = pycstruct.bench.run_cparser(5, castxml_cmd = 'dontexist', repeat = 1)
+    self.assertEqual(results['xml_source'], 'synthetic')
+    self.assertEqual(results['nbr_of_types'], 30)
+    self.assertEqual(results['nbr_of_instances'], 30)
+    phases = [r['operation'] for r in results['results']]
+    self.assertEqual(phases, ['et_parse', 'castxml_parser', 'castxml_parser_streaming',
+                              'type_meta_parser', 'save_type_meta', 'load_type_meta'])
+
+    save_path = tempfile.mkdtemp()
+    results = pycstruct.bench.run_cparser(xml_filename = os.path.join(test_dir, 'savestruct.xml'),
+                                          repeat = 1, save_path = save_path)
+    self.assertEqual(results['xml_source'], 'replay')
+    self.assertTrue(results['nbr_of_instances'] > 0)
+    self.assertTrue(os.path.isfile(os.path.join(save_path, 'type_meta.json')))
+    self.assertEqual(pycstruct.bench.compare(results, results), [])
+
+    self.assertRaises(Exception, pycstruct.bench.run_cparser, 5, repeat = 0)
+    self.assertRaises(Exception, pycstruct.bench._time_best, lambda: None, 0)
+
+  def test_main_cparser(self):
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+      pycstruct.bench.main(['--cparser', '--groups', '2', '--repeat', '1',
+                            '--castxml-cmd', 'dontexist'])
+    self.assertTrue('castxml_parser' in out.getvalue())
+    with contextlib.redirect_stderr(io.StringIO()):
+      self.assertRaises(SystemExit, pycstruct.bench.main, ['--cparser', '--repeat', '0'])
+
+  def test_main(self):
+
+    filename = os.path.join(tempfile.mkdtemp(), 'bench.json')
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+      pycstruct.bench.main(['enum', '--min-time', '0.001', '--json', filename])
+    self.assertTrue('serialize' in out.getvalue())
+    with open(filename, 'r') as f:
+      results = json.load(f)
+    self.assertEqual(len(results['results']), 2)
+
+    with open(filename, 'w') as f:
+      for result in results['results']:
+        result['records_per_second'] *= 1000
+      json.dump(results, f)
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+      self.assertRaises(SystemExit, pycstruct.bench.main,
+                        ['enum', '--min-time', '0.001', '--compare', filename])
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,235 @@
+import unittest, os, sys, tempfile, test_pycstruct
+
+test_dir = os.path.dirname(os.path.realpath(__file__))
+proj_dir = os.path.dirname(test_dir)
+
+sys.path.append(proj_dir)
+import pycstruct
+import pycstruct.codegen
+
+class TestCodegen(unittest.TestCase):
+
+  def test_struct(self):
+    for byteorder, alignment, filename in [('little', 1, 'struct_little.dat'),
+                                           ('little', 8, 'struct_little_nopack.dat'),
+                                           ('big', 1, 'struct_big.dat'),
+                                           ('big', 8, 'struct_big_nopack.dat')]:
+      m = test_pycstruct.TestPyCStruct.create_struct(self, byteorder, alignment)
+      codec = pycstruct.codegen.generate_codec(m)
+      self.assertEqual(codec.SIZE, m.size())
+      test_pycstruct.check_struct(self, codec, filename)
+
+  def test_embedded_struct(self):
+    for alignment, filename in [(1, 'embedded_struct.dat'), (8, 'embedded_struct_nopack.dat')]:
+      house = test_pycstruct.TestPyCStruct.create_embedded_struct(self, alignment)
+      codec = pycstruct.codegen.generate_codec(house)
+      test_pycstruct.check_embedded_struct(self, codec, filename)
+
+      with open(os.path.join(test_dir, filename),'rb') as f:
+        inbytes = f.read()
+      result = codec.deserialize(inbytes)
+      self.assertEqual(result, house.deserialize(inbytes))
+      self.assertEqual(codec.serialize(result), house.serialize(result))
+
+  def test_bitfield(self):
+    for byteorder in ['little', 'big']:
+      b = test_pycstruct.TestPyCStruct.create_bitfield(self, byteorder)
+      codec = pycstruct.codegen.generate_codec(b)
+      with open(os.path.join(test_dir, 'bitfield_{0}.dat'.format(byteorder)),'rb') as f:
+        inbytes = f.read()
+      result = codec.deserialize(inbytes)
+      self.assertEqual(result, b.deserialize(inbytes))
+      self.assertEqual(bytes(codec.serialize(result)), inbytes)
+
+    b = pycstruct.BitfieldDef()
+    b.add('unsigned', 3)
+    b.add('signed', 3, signed = True)
+    codec = pycstruct.codegen.generate_codec(b)
+    self.assertRaises(Exception, codec.serialize, {'unsigned' : 8})
+    self.assertRaises(Exception, codec.serialize, {'signed' : 4})
+    self.assertRaises(Exception, codec.serialize, {'signed' : -5})
+    self.assertEqual(codec.deserialize(codec.serialize({'signed' : -4})), {'unsigned' : 0, 'signed' : -4})
+
+  def test_enum(self):
+    e = pycstruct.EnumDef('big', size = 2, signed = True)
+    e.add('zero', 0)
+    e.add('minus', -2)
+    e.add('alias', 0)
+    codec = pycstruct.codegen.generate_codec(e)
+    self.assertEqual(bytes(codec.serialize('minus')), bytes([0xFF, 0xFE]))
+    self.assertEqual(codec.deserialize(bytes([0, 0])), 'zero')
+    self.assertEqual(codec.deserialize(bytes([0, 9])), '__VALUE__9')
+    self.assertRaises(Exception, codec.serialize, 'invalid')
+
+  def test_mixed(self):
+    bitfield = pycstruct.BitfieldDef('big', size = 3)
+    bitfield.add('bf1', 3)
+    bitfield.add('bf2', 12, signed = True)
+
+    substruct = pycstruct.StructDef()
+    substruct.add('uint8', 'ss1')
+    substruct.add('int16', 'ss2', byteorder = 'big')
+
+    enum = pycstruct.EnumDef(size = 1)
+    enum.add('a')
+    enum.add('b')
+
+    union = pycstruct.StructDef(union = True)
+    union.add('uint32', 'u32')
+    union.add('uint8', 'u8', length = 3)
+
+    m = pycstruct.StructDef(alignment = 4)
+    m.add('uint16', 'little16')
+    m.add('uint16', 'big16', byteorder = 'big')
+    m.add(bitfield, 'bitfield')
+    m.add(bitfield, 'bitfields', length = 2)
+    m.add(substruct, 'substruct', same_level = True)
+    m.add(enum, 'enums', length = 3)
+    m.add('bool8', 'bools', length = 3)
+    m.add('float32', 'floats', length = 2, byteorder = 'big')
+    m.add(union, 'union')
+    m.add('utf-8', 'string', length = 5)
+    m.add(pycstruct.StringDef(4, encoding = 'latin-1', errors = 'replace'), 'latin1')
+    m.add(pycstruct.StringDef(3, raw = True), 'raw', length = 2)
+    m.add('bytes', 'payload', length = 5)
+    m.add(pycstruct.BytesDef(2), 'blobs', length = 2)
+
+    data = {
+      'little16' : 0x0102,
+      'big16' : 0x0304,
+      'bitfield' : {'bf1' : 7, 'bf2' : -1000},
+      'bitfields' : [{'bf1' : 1}],
+      'ss1' : 5,
+      'ss2' : -6,
+      'enums' : ['b', 'a'],
+      'bools' : [True, False, True],
+      'floats' : [1.5],
+      'union' : {'u8' : [1, 2]},
+      'string' : 'åä',
+      'latin1' : 'å\u20ac',
+      'raw' : [b'\x01', 'ab'],
+      'payload' : memoryview(b'\x00\x01'),
+      'blobs' : [b'\x02']
+    }
+    codec = pycstruct.codegen.generate_codec(m)
+    buf = codec.serialize(data)
+    self.assertEqual(buf, m.serialize(data))
+    self.assertEqual(codec.deserialize(buf), m.deserialize(buf))
+    self.assertEqual(list(codec.deserialize(buf).keys()), list(m.deserialize(buf).keys()))
+    self.assertEqual(codec.deserialize(buf)['latin1'], 'å?')
+    self.assertEqual(codec.deserialize(buf)['raw'], [b'\x01', b'ab'])
+    self.assertEqual(codec.deserialize(buf)['payload'], b'\x00\x01\x00\x00\x00')
+    self.assertEqual(codec.deserialize(buf)['blobs'], [b'\x02\x00', b'\x00\x00'])
+
+    # Offsets
+    buf = bytearray(m.size() + 3)
+    codec.serialize_into(buf, 3, data)
+    self.assertEqual(codec.deserialize_from(buf, 3), m.deserialize_from(buf, 3))
+    self.assertRaises(Exception, codec.serialize_into, buf, 4, data)
+    self.assertRaises(Exception, codec.deserialize_from, buf, 4)
+    self.assertRaises(Exception, codec.deserialize, buf)
+
+    # Invalid data
+    self.assertRaises(Exception, codec.serialize, {'bools' : [True] * 4})
+    self.assertRaises(Exception, codec.serialize, {'bools' : True})
+    self.assertRaises(Exception, codec.serialize, {'string' : 'too long'})
+    self.assertRaises(Exception, codec.serialize, {'string' : 5})
+    self.assertRaises(Exception, codec.serialize, {'payload' : 'string'})
+    self.assertRaises(Exception, codec.serialize, {'payload' : bytes(6)})
+    self.assertRaises(Exception, codec.serialize, {'little16' : -1})
+
+  def test_file(self):
+    m = pycstruct.StructDef()
+    m.add('uint8', 'e1')
+    filename = os.path.join(tempfile.gettempdir(), 'pycstruct_codec.py')
+    codec = pycstruct.codegen.generate_codec(m, filename)
+    with open(filename, 'r') as f:
+      self.assertEqual(f.read(), codec.source)
+
+    codec = pycstruct.codegen.load_codec(filename)
+    self.assertEqual(codec.deserialize(bytes([3])), {'e1' : 3})
+    os.remove(filename)
+
+  def test_definitions(self):
+    house = test_pycstruct.TestPyCStruct.create_embedded_struct(self, 8)
+    bitfield = test_pycstruct.TestPyCStruct.create_bitfield(self, 'big')
+    m = pycstruct.StructDef('big', union = True)
+    m.add('int16', 'little16', byteorder = 'little')
+    m.add(bitfield, 'bitfield', same_level = True)
+    m.add('utf-8', 'string', length = 5)
+    m.add(pycstruct.StringDef(4, encoding = 'ascii', raw = True), 'raw', length = 2)
+    m.add('bytes', 'payload', length = 3)
+    m.add(pycstruct.BytesDef(2), 'blobs', length = 2)
+    definitions = {'house' : house, 'house_alias' : house, 'union' : m, 'bitfield' : bitfield,
+                   'class' : house, '_private' : house}
+
+    module = pycstruct.codegen.load_source(pycstruct.codegen.generate_definitions_source(definitions))
+    self.assertEqual(list(module.definitions.keys()), list(definitions.keys()))
+    test_pycstruct.check_embedded_struct(self, module.house, 'embedded_struct_nopack.dat')
+    self.assertTrue(module.house_alias is module.house)
+    self.assertEqual(str(module.union), str(m))
+    self.assertEqual(str(module.bitfield), str(bitfield))
+    self.assertEqual(module.union.serialize({'little16' : -2}), m.serialize({'little16' : -2}))
+    self.assertEqual(module.union.serialize({'string' : 'ab'}), m.serialize({'string' : 'ab'}))
+    self.assertEqual(module.union.deserialize(m.serialize({'raw' : [b'ab']}))['raw'], [b'ab', b''])
+    self.assertEqual(module.union.deserialize(m.serialize({'payload' : b'ab'}))['blobs'],
+                     [b'ab', b'\x00\x00'])
+    self.assertFalse(hasattr(module, 'class'))
+    self.assertFalse(hasattr(module, '_private'))
+    self.assertFalse(hasattr(module, 'get_codec'))
+
+    module = pycstruct.codegen.load_source(pycstruct.codegen.generate_definitions_source(
+      definitions, codecs = True))
+    test_pycstruct.check_embedded_struct(self, module.get_codec('house'), 'embedded_struct_nopack.dat')
+    self.assertTrue(module.get_codec('house') is module.get_codec('house'))
+
+    self.assertRaises(Exception, pycstruct.codegen.generate_definitions_source, {'a' : 'uint8'})
+
+    # Native byteorder is kept, not resolved to the generating host
+    bitfield = pycstruct.BitfieldDef()
+    bitfield.add('a', 3)
+    enum = pycstruct.EnumDef()
+    enum.add('A')
+    big_bitfield = pycstruct.BitfieldDef('big')
+    big_bitfield.add('a', 3)
+    big_enum = pycstruct.EnumDef('big')
+    big_enum.add('A')
+    source = pycstruct.codegen.generate_definitions_source({
+      'bitfield' : bitfield, 'enum' : enum, 'big_bitfield' : big_bitfield, 'big_enum' : big_enum})
+    self.assertTrue("pycstruct.BitfieldDef('native', 1)" in source)
+    self.assertTrue("pycstruct.EnumDef('native', 1, signed=False)" in source)
+    self.assertTrue("pycstruct.BitfieldDef('big', 1)" in source)
+    self.assertTrue("pycstruct.EnumDef('big', 1, signed=False)" in source)
+    module = pycstruct.codegen.load_source(source)
+    self.assertEqual(module.bitfield._get_declared_byteorder(), 'native')
+    self.assertEqual(module.enum._get_declared_byteorder(), 'native')
+
+  def test_main(self):
+    tmp_path = tempfile.mkdtemp()
+    header = os.path.join(tmp_path, 'header.h')
+    with open(header, 'w') as f:
+      f.write(os.path.join(test_dir, 'savestruct.xml'))
+    output = os.path.join(tmp_path, 'mydefs.py')
+
+    # Fake castxml copying the XML file named in the source file
+    pycstruct.codegen.main([header, '-o', output, '--byteorder', 'little',
+                            '--castxml-cmd', sys.executable, '--castxml-arg=-c',
+                            '--castxml-arg=import sys, shutil; shutil.copy(open(sys.argv[1]).read(), sys.argv[-1])',
+                            '--cache-path', tmp_path, '--type', 'Data'])
+
+    sys.path.insert(0, tmp_path)
+    try:
+      import mydefs
+    finally:
+      sys.path.remove(tmp_path)
+    test_pycstruct.check_struct(self, mydefs.Data, 'struct_little.dat')
+    self.assertEqual(list(mydefs.definitions.keys()), ['Data'])
+
+  def test_unsupported(self):
+    m = pycstruct.StructDef()
+    m.add(test_pycstruct.UnserializableDef(), 'invalid')
+    self.assertRaises(Exception, pycstruct.codegen.generate_source, m)
+    self.assertRaises(Exception, pycstruct.codegen.generate_source, 'uint8')
+
+if __name__ == '__main__':
+  unittest.main()
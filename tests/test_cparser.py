@@ -1,4 +1,4 @@
-import unittest, os, sys, shutil, tempfile, test_pycstruct
+import unittest, os, sys, shutil, tempfile, asyncio, time, test_pycstruct
 
 test_dir = os.path.dirname(os.path.realpath(__file__))
 proj_dir = os.path.dirname(test_dir)
@@ -62,6 +62,8 @@ class TestCParser(unittest.TestCase):
     meta = parser.parse()
     self.assertTrue('Data' in meta)
     self.assertTrue(meta['Data']['type'] == 'struct')
+    self.assertRaises(Exception, parser._get_elem_with_id, 'invalid')
+    self.assertRaises(Exception, parser._get_elem_with_type, 'Typedef', 'invalid')
 
     type_meta_parser = pycstruct.cparser._TypeMetaParser(meta, 'little')
     instance = type_meta_parser.parse() 
@@ -110,6 +112,15 @@ class TestCParser(unittest.TestCase):
     self.assertEqual(rows[2].split()[1], 'uint8')
     self.assertEqual(rows[3].split()[1], 'int8')
 
+    # unsigned char arrays as bytes
+    instance = pycstruct.cparser._TypeMetaParser(meta, 'little', bytes_arrays = True).parse()
+    rows = str(instance['different_char_arrays']).splitlines()
+    self.assertEqual(rows[1].split()[1], 'utf-8')
+    self.assertEqual(rows[2].split()[1], 'bytes')
+    self.assertEqual(rows[3].split()[1], 'int8')
+    data = instance['different_char_arrays'].deserialize(bytes(range(30)))
+    self.assertEqual(data['unsigned_char_array'], bytes(range(10, 20)))
+
     # Check struct with struct inside
     s_dict = instance['struct_with_struct_inside'].create_empty_data()
     self.assertEqual(len(s_dict.keys()), 1)
@@ -174,6 +185,39 @@ class TestCParser(unittest.TestCase):
 
     test_pycstruct.check_embedded_struct(self, instance['house_s'], 'embedded_struct_nopack.dat')
 
+  def test_xml_parse_types(self):
+    parser = pycstruct.cparser._CastXmlParser(os.path.join(test_dir, 'embedded_struct.xml'))
+    meta = parser.parse()
+    instance = pycstruct.cparser._TypeMetaParser(meta, 'little', ['garage_s']).parse()
+
+    # Only requested type and types it depends on
+    self.assertTrue('garage_s' in instance)
+    self.assertTrue('car_s' in instance)
+    self.assertTrue('car_type' in instance)
+    self.assertFalse('house_s' in instance)
+    self.assertEqual(instance['garage_s'].size(), 
+                     pycstruct.cparser._TypeMetaParser(meta, 'little').parse()['garage_s'].size())
+
+    instance = pycstruct.cparser._TypeMetaParser(meta, 'little', 'car_type').parse()
+    self.assertEqual(list(instance.keys()), ['car_type'])
+
+    self.assertRaises(Exception, pycstruct.cparser._TypeMetaParser(meta, 'little', ['invalid']).parse)
+
+  def test_xml_parse_streaming(self):
+    _CastXmlParser = pycstruct.cparser._CastXmlParser
+    for xml in ['savestruct.xml', 'embedded_struct.xml', 'bitfield_struct.xml']:
+      parser = _CastXmlParser(os.path.join(test_dir, xml), streaming = True)
+      meta = parser.parse()
+      self.assertEqual(meta, _CastXmlParser(os.path.join(test_dir, xml)).parse())
+      self.assertTrue(len(parser.source_files) > 0)
+
+      # Unused elements are not kept
+      self.assertEqual(parser._get_elems_with_tag('Function'), [])
+      self.assertTrue(len(parser._get_elems_with_tag('Struct')) > 0)
+
+    instance = pycstruct.cparser._TypeMetaParser(meta, 'little').parse()
+    self.assertTrue('Data' in instance)
+
   def test_xml_parse_bitfield_struct(self):
     _CastXmlParser = pycstruct.cparser._CastXmlParser
     parser = _CastXmlParser(os.path.join(test_dir, 'bitfield_struct.xml'))
@@ -195,6 +239,164 @@ class TestCParser(unittest.TestCase):
     self.assertEqual(result['bf3b'], 8)
     self.assertEqual(result['m3'], 99)
 
+  def test_type_meta_cache(self):
+    cparser = pycstruct.cparser
+    cache_path = tempfile.mkdtemp()
+    header = os.path.join(cache_path, 'savestruct.h')
+    with open(header, 'w') as f:
+      f.write('struct Data { int member; };')
+
+    meta = cparser._CastXmlParser(os.path.join(test_dir, 'savestruct.xml')).parse()
+    meta_path = os.path.join(cache_path, cparser._get_type_meta_filename([header], 'dontexist', []))
+    cparser._save_type_meta(meta_path, meta, [header, 'dont_exist.h'])
+    self.assertEqual(cparser._load_type_meta(meta_path), (meta, [header]))
+
+    # castxml is not required when the cache is valid
+    result = pycstruct.parse_file(header, castxml_cmd = 'dontexist', 
+                                  cache_path = cache_path, use_cached = True)
+    test_pycstruct.check_struct(self, result['Data'], 'struct_little.dat')
+    self.assertRaises(Exception, pycstruct.parse_file, header, castxml_cmd = 'dontexist', 
+                      cache_path = cache_path, use_cached = False)
+
+    # Cache is invalid when a source file is changed
+    with open(header, 'a') as f:
+      f.write('\n')
+    self.assertEqual(cparser._load_type_meta(meta_path), (None, []))
+    self.assertRaises(Exception, pycstruct.parse_file, header, castxml_cmd = 'dontexist', 
+                      cache_path = cache_path, use_cached = True)
+
+    self.assertEqual(cparser._load_type_meta(os.path.join(cache_path, 'dont_exist.json')), (None, []))
+    shutil.rmtree(cache_path)
+
+  def create_cached_header(self, cache_path, header_name, xml_name):
+    ''' Create a header with cached type metadata from a castxml output '''
+    cparser = pycstruct.cparser
+    header = os.path.join(cache_path, header_name)
+    with open(header, 'w') as f:
+      f.write(header_name)
+    meta = cparser._CastXmlParser(os.path.join(test_dir, xml_name)).parse()
+    meta_path = os.path.join(cache_path, cparser._get_type_meta_filename([header], 'dontexist', []))
+    cparser._save_type_meta(meta_path, meta, [header])
+    return header
+
+  def test_parse_files_parallel(self):
+    cache_path = tempfile.mkdtemp()
+    headers = [self.create_cached_header(cache_path, 'savestruct.h', 'savestruct.xml'),
+               self.create_cached_header(cache_path, 'embedded.h', 'embedded_struct.xml'),
+               self.create_cached_header(cache_path, 'nopack.h', 'embedded_struct_nopack.xml')]
+
+    result = pycstruct.parse_files_parallel(headers, workers = 2, byteorder = 'little',
+                                            castxml_cmd = 'dontexist', 
+                                            cache_path = cache_path, use_cached = True)
+    test_pycstruct.check_struct(self, result['Data'], 'struct_little.dat')
+    test_pycstruct.check_embedded_struct(self, result['house_s'], 'embedded_struct.dat')
+    test_pycstruct.check_embedded_struct(self, result['house_s1'], 'embedded_struct_nopack.dat')
+    self.assertTrue('car_type' in result)
+    self.assertFalse('car_type1' in result) # Identical in both sources
+
+    # castxml is required when not cached
+    self.assertRaises(Exception, pycstruct.parse_files_parallel, headers, 
+                      castxml_cmd = 'dontexist', cache_path = cache_path)
+    shutil.rmtree(cache_path)
+
+  def test_parse_file_async(self):
+    cache_path = tempfile.mkdtemp()
+    header = self.create_cached_header(cache_path, 'savestruct.h', 'savestruct.xml')
+    loop = asyncio.new_event_loop()
+
+    # Cached
+    result = loop.run_until_complete(pycstruct.parse_file_async(header, castxml_cmd = 'dontexist',
+                                     cache_path = cache_path, use_cached = True))
+    test_pycstruct.check_struct(self, result['Data'], 'struct_little.dat')
+    self.assertRaises(Exception, loop.run_until_complete, pycstruct.parse_file_async(
+                      header, castxml_cmd = 'dontexist', cache_path = cache_path))
+
+    # Failing castxml
+    fail_args = ['-c', 'import sys; sys.exit(1)']
+    self.assertRaises(Exception, loop.run_until_complete, pycstruct.parse_str_async(
+                      'int a;', castxml_cmd = sys.executable, castxml_extra_args = fail_args,
+                      cache_path = cache_path))
+
+    # castxml is killed when cancelled
+    sleep_args = ['-c', 'import time; time.sleep(30)']
+    task = pycstruct.parse_file_async(header, castxml_cmd = sys.executable, 
+                                      castxml_extra_args = sleep_args, cache_path = cache_path)
+    start = time.time()
+    self.assertRaises(asyncio.TimeoutError, loop.run_until_complete, asyncio.wait_for(task, 0.5))
+    self.assertTrue(time.time() - start < 10)
+
+    loop.close()
+    shutil.rmtree(cache_path)
+
+  def test_incremental_parser(self):
+    cache_path = tempfile.mkdtemp()
+
+    # Fake castxml copying the XML file named in the source file
+    fake_castxml = ['-c', 'import sys, shutil; shutil.copy(open(sys.argv[1]).read(), sys.argv[-1])']
+    def write_source(name, xml):
+      filename = os.path.join(cache_path, name)
+      with open(filename, 'w') as f:
+        f.write(os.path.join(test_dir, xml))
+      return filename
+    first = write_source('first.h', 'savestruct.xml')
+    second = write_source('second.h', 'embedded_struct.xml')
+
+    parser = pycstruct.IncrementalParser([first, second], byteorder = 'little', 
+                                         castxml_cmd = sys.executable, 
+                                         castxml_extra_args = fake_castxml, 
+                                         cache_path = cache_path)
+    result = parser.parse()
+    test_pycstruct.check_struct(self, result['Data'], 'struct_little.dat')
+    test_pycstruct.check_embedded_struct(self, result['house_s'], 'embedded_struct.dat')
+    self.assertTrue(first in parser.get_source_files())
+    self.assertTrue(second in parser.get_source_files())
+
+    # Nothing changed
+    result2 = parser.reparse(second)
+    for name, instance in result.items():
+      self.assertTrue(result2[name] is instance, msg = name)
+
+    # Only types that changed, and types depending on them, are new
+    write_source('second.h', 'embedded_struct_nopack.xml')
+    result3 = parser.reparse([second])
+    test_pycstruct.check_embedded_struct(self, result3['house_s'], 'embedded_struct_nopack.dat')
+    self.assertTrue(result3['Data'] is result['Data'])
+    self.assertTrue(result3['car_type'] is result['car_type'])
+    self.assertFalse(result3['house_s'] is result['house_s'])
+    self.assertFalse(result3['garage_s'] is result['garage_s'])
+    
+    # Input files not depending on the changed file are not parsed
+    os.remove(first)
+    result4 = parser.reparse([second])
+    self.assertTrue(result4['Data'] is result['Data'])
+    self.assertRaises(Exception, parser.reparse, [first])
+
+    shutil.rmtree(cache_path)
+
+  def test_merge_type_meta(self):
+    def struct(name, reference = None):
+      member = {'name' : 'm', 'type' : 'int32', 'length' : 1}
+      if reference:
+        member = {'name' : 'm', 'type' : 'enum', 'length' : 1, 'reference' : reference}
+      return {'type' : 'struct', 'name' : name, 'size' : 4, 'align' : 4,
+              'supported' : True, 'members' : [member]}
+    def enum(name, value):
+      return {'type' : 'enum', 'name' : name, 'size' : 4, 'align' : 4, 'signed' : False,
+              'supported' : True, 'members' : [{'name' : 'c', 'value' : value}]}
+
+    first = {'e' : enum('e', 1), 'user' : struct('user', 'e'), 's' : struct('s')}
+    second = {'e' : enum('e', 2), 'user' : struct('user', 'e'), 's' : struct('s'),
+              'e1' : enum('e1', 3)}
+    merged = pycstruct.cparser._merge_type_meta([first, second])
+    self.assertEqual(list(merged.keys()), ['e', 'user', 's', 'e2', 'user1', 'e1'])
+    self.assertEqual(merged['user']['members'][0]['reference'], 'e')
+    self.assertEqual(merged['user1']['members'][0]['reference'], 'e2')
+    self.assertEqual(merged['e2']['members'][0]['value'], 2)
+    self.assertEqual(merged['e1']['members'][0]['value'], 3)
+
+    # Input is not modified
+    self.assertEqual(second['user']['members'][0]['reference'], 'e')
+
   @unittest.skipIf(shutil.which('castxml') == None, 'castxml is not installed')
   def test_run_castxml_real(self):
     _run_castxml = pycstruct.cparser._run_castxml
@@ -253,6 +455,8 @@ class TestCParser(unittest.TestCase):
     self.assertNotEqual(first_timestamp, third_timestamp)
 
     os.remove(xml_filename)
+    os.remove(pycstruct.cparser._get_type_meta_filename(
+        pycstruct.cparser._listify(input_file), 'castxml', []))
   
   @unittest.skipIf(shutil.which('castxml') == None, 'castxml is not installed')
   def test_run_parse_str_real(self):
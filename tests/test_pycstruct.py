@@ -1,4 +1,4 @@
-import unittest, os, sys
+import unittest, os, sys, io, array, copy, pickle, struct, tempfile
 
 test_dir = os.path.dirname(os.path.realpath(__file__))
 proj_dir = os.path.dirname(test_dir)
@@ -6,6 +6,11 @@ proj_dir = os.path.dirname(test_dir)
 sys.path.append(proj_dir)
 import pycstruct
 
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
 def check_struct(t, structdef_instance, filename):
     #############################################
     # Load pre-stored binary data and deserialize
@@ -153,6 +158,7 @@ class TestPyCStruct(unittest.TestCase):
     self.assertRaises(NotImplementedError, b.size)
     self.assertRaises(NotImplementedError, b.serialize, 0)
     self.assertRaises(NotImplementedError, b.deserialize, 0)
+    self.assertRaises(NotImplementedError, b.dtype)
     self.assertRaises(NotImplementedError, b._largest_member)
     self.assertRaises(NotImplementedError, b._type_name)
 
@@ -295,6 +301,121 @@ class TestPyCStruct(unittest.TestCase):
     check_struct(self, m, filename)
 
 
+  @unittest.skipIf(numpy == None, 'numpy is not installed')
+  def test_dtype(self):
+    m = self.create_struct('little', 8)
+    dtype = m.dtype()
+    self.assertEqual(dtype.itemsize, m.size())
+
+    with open(os.path.join(test_dir, 'struct_little_nopack.dat'),'rb') as f:
+      inbytes = f.read()
+    expected = m.deserialize(inbytes)
+
+    array = m.deserialize_array(inbytes * 3)
+    self.assertEqual(len(array), 3)
+    self.assertFalse(array.flags.owndata)
+    for name in ['int8_low', 'uint16_high', 'int32_low', 'uint64_high', 'float64_high']:
+      self.assertEqual(array[name][2], expected[name], msg=name)
+    self.assertEqual(bool(array['bool8_true'][0]), True)
+    self.assertEqual(bool(array['bool64_true'][0]), True)
+
+    # Bools of all sizes are unsigned integers of the same size
+    for bits in [8, 16, 32, 64]:
+      name = 'bool{0}_true'.format(bits)
+      self.assertEqual(dtype.fields[name][0], numpy.dtype('<u{0}'.format(bits // 8)), msg=name)
+      self.assertEqual(array[name][0], 1, msg=name)
+      self.assertEqual(list(array[name] != 0), [True] * 3, msg=name)
+      self.assertEqual(list(array['bool{0}_false'.format(bits)] != 0), [False] * 3, msg=name)
+    self.assertEqual(list(array['int32_array'][1]), expected['int32_array'])
+    self.assertEqual(array['utf8_ascii'][0].decode(), expected['utf8_ascii'])
+
+    array = m.deserialize_array(inbytes * 3, count = 1, offset = m.size())
+    self.assertEqual(len(array), 1)
+
+    self.assertRaises(Exception, m.deserialize_array, inbytes + bytes(1))
+
+    big = self.create_struct('big', 1)
+    self.assertEqual(big.dtype().fields['int32_low'][0], numpy.dtype('>i4'))
+
+  @unittest.skipIf(numpy == None, 'numpy is not installed')
+  def test_dtype_embedded(self):
+    bitfield = pycstruct.BitfieldDef('big')
+    bitfield.add('bf1', 3)
+    bitfield.add('bf2', 10)
+    self.assertEqual(bitfield.dtype(), numpy.dtype('>u2'))
+
+    enum = pycstruct.EnumDef('little', size = 4, signed = True)
+    enum.add('minus_one', -1)
+    self.assertEqual(enum.dtype(), numpy.dtype('<i4'))
+    self.assertEqual(pycstruct.EnumDef(size = 3).dtype().itemsize, 3)
+
+    substruct = pycstruct.StructDef('little', alignment = 4)
+    substruct.add('uint8', 'ss1')
+    substruct.add('int32', 'ss2')
+
+    union = pycstruct.StructDef('little', union = True)
+    union.add('uint32', 'u32')
+    union.add('uint8', 'u8', length = 4)
+
+    s = pycstruct.StructDef('little', alignment = 4)
+    s.add('uint8', 'e1')
+    s.add(substruct, 'sub', length = 2)
+    s.add(substruct, 'flat', same_level = True)
+    s.add(bitfield, 'bf')
+    s.add(enum, 'enum')
+    s.add(union, 'union')
+
+    data = {'e1' : 1, 'sub' : [{'ss2' : 2}, {'ss2' : 3}], 'ss1' : 4,
+            'ss2' : 5, 'bf' : {'bf2' : 6}, 'enum' : 'minus_one',
+            'union' : {'u32' : 0x01020304}}
+    buf = s.serialize(data)
+    array = s.deserialize_array(buf)
+
+    self.assertEqual(s.dtype().itemsize, s.size())
+    self.assertEqual(array['e1'][0], 1)
+    self.assertEqual(array['sub'][0][1]['ss2'], 3)
+    self.assertEqual(array['ss1'][0], 4)
+    self.assertEqual(array['ss2'][0], 5)
+    self.assertEqual(array['bf'][0], 6 << 3)
+    self.assertEqual(array['enum'][0], -1)
+    self.assertEqual(array['union']['u32'][0], 0x01020304)
+    self.assertEqual(list(array['union']['u8'][0]), [4, 3, 2, 1])
+
+  @unittest.skipIf(numpy == None, 'numpy is not installed')
+  def test_bitfield_array(self):
+    for byteorder, size in [('little', -1), ('big', -1), ('little', 3), ('big', 3)]:
+      b = pycstruct.BitfieldDef(byteorder, size = size)
+      b.add('unsigned', 3)
+      b.add('signed', 12, signed = True)
+      b.add('onesigned', 1, signed = True)
+
+      s = pycstruct.StructDef(byteorder)
+      s.add('uint8', 'counter')
+      s.add(b, 'status')
+
+      datalist = [{'counter' : i, 'status' : {'unsigned' : i % 8, 'signed' : i * 37 % 4096 - 2048,
+                                              'onesigned' : -(i % 2)}} for i in range(100)]
+      buf = b''.join([s.serialize(data) for data in datalist])
+      array = s.deserialize_array(buf)
+      result = b.unpack_array(array['status'])
+      self.assertEqual(result['unsigned'].dtype, numpy.dtype('u1'))
+      self.assertEqual(result['signed'].dtype, numpy.dtype('i2'))
+      for i, data in enumerate(datalist):
+        for name, value in data['status'].items():
+          self.assertEqual(result[name][i], value)
+
+      packed = b.pack_array(result)
+      self.assertEqual(packed.dtype, b.dtype())
+      self.assertTrue((packed == array['status']).all())
+
+    # Scalars are broadcasted and missing elements are 0
+    packed = b.pack_array({'unsigned' : numpy.arange(3), 'onesigned' : -1})
+    self.assertEqual(b.unpack_array(packed)['onesigned'].tolist(), [-1, -1, -1])
+    self.assertEqual(b.unpack_array(packed)['signed'].tolist(), [0, 0, 0])
+
+    self.assertRaises(Exception, b.pack_array, {'unsigned' : numpy.array([1, 8])})
+    self.assertRaises(Exception, b.pack_array, {'signed' : numpy.array([-2049])})
+
   def test_embedded_struct(self):
     self.embedded_struct('embedded_struct.dat', alignment = 1)
 
@@ -302,6 +423,13 @@ class TestPyCStruct(unittest.TestCase):
     self.embedded_struct('embedded_struct_nopack.dat', alignment = 8)
 
   def embedded_struct(self, filename, alignment = 1):
+    house = self.create_embedded_struct(alignment)
+
+    #############################################
+    # Load pre-stored binary data and deserialize and check
+    check_embedded_struct(self, house, filename)
+
+  def create_embedded_struct(self, alignment):
     car_type = pycstruct.EnumDef(size = 4)
     car_type.add('Sedan', 0)
     car_type.add('Station_Wagon', 5)
@@ -365,9 +493,261 @@ class TestPyCStruct(unittest.TestCase):
     stringrep = str(house)
     self.assertTrue('nbr_of_levels' in stringrep)
 
-    #############################################
-    # Load pre-stored binary data and deserialize and check
-    check_embedded_struct(self, house, filename)
+    return house
+
+  def test_deserialize_from_serialize_into(self):
+    m = self.create_struct('little', 8)
+    with open(os.path.join(test_dir, 'struct_little_nopack.dat'),'rb') as f:
+      inbytes = f.read()
+    expected = m.deserialize(inbytes)
+
+    # Three structs after a header of 3 bytes
+    buffer = bytearray(3 + 3 * m.size())
+    for i in range(0, 3):
+      m.serialize_into(buffer, 3 + i * m.size(), expected)
+    self.assertEqual(bytes(buffer[3 + m.size():3 + 2 * m.size()]), inbytes)
+
+    view = memoryview(buffer)
+    for i in range(0, 3):
+      self.assertEqual(m.deserialize_from(view, 3 + i * m.size()), expected)
+    self.assertEqual(m.deserialize_from(bytes(buffer[3:])), expected)
+
+    # Writing into a memoryview shall update the underlying buffer
+    expected['int8_low'] = 11
+    m.serialize_into(view, 3, expected)
+    self.assertEqual(buffer[3], 11)
+
+    # Out of bounds
+    self.assertRaises(Exception, m.deserialize_from, buffer, 4 + 2 * m.size())
+    self.assertRaises(Exception, m.serialize_into, buffer, 4 + 2 * m.size(), expected)
+    self.assertRaises(Exception, m.deserialize_from, buffer, -1)
+
+  def test_deserialize_from_serialize_into_types(self):
+    buffer = bytearray(8)
+
+    bitfield = self.create_bitfield('big')
+    bitfield.serialize_into(buffer, 0, {'fivebits' : 16, 'onebit' : 1})
+    self.assertEqual(bytes(buffer), bitfield.serialize({'fivebits' : 16, 'onebit' : 1}))
+    self.assertEqual(bitfield.deserialize_from(memoryview(buffer))['fivebits'], 16)
+    self.assertRaises(Exception, bitfield.deserialize_from, buffer, 1)
+
+    enum = pycstruct.EnumDef('little', size = 2)
+    enum.add('one', 1)
+    enum.serialize_into(buffer, 6, 'one')
+    self.assertEqual(buffer[6], 1)
+    self.assertEqual(enum.deserialize_from(buffer, 6), 'one')
+    self.assertRaises(Exception, enum.serialize_into, buffer, 7, 'one')
+
+    string = pycstruct.pycstruct.StringDef(4)
+    string.serialize_into(buffer, 2, 'abcd')
+    string.serialize_into(buffer, 2, 'ef')
+    self.assertEqual(bytes(buffer[2:6]), b'ef\x00\x00')
+    self.assertEqual(string.deserialize_from(buffer, 2), 'ef')
+
+    # Subclasses of BaseDef only implementing serialize and deserialize
+    class ByteDef(UnserializableDef):
+      def serialize(self, data):
+        return bytes([data])
+      def deserialize(self, buffer):
+        return buffer[0]
+
+    s = pycstruct.StructDef()
+    s.add('uint8', 'a')
+    s.add(ByteDef(), 'b', length = 2)
+    s.serialize_into(buffer, 1, {'a' : 1, 'b' : [2, 3]})
+    self.assertEqual(s.deserialize_from(buffer, 1), {'a' : 1, 'b' : [2, 3]})
+
+  def test_serialize_many(self):
+    m = self.create_struct('big', 8)
+    with open(os.path.join(test_dir, 'struct_big_nopack.dat'),'rb') as f:
+      inbytes = f.read()
+    expected = m.deserialize(inbytes)
+    records = [expected, {}, expected]
+
+    buffer = m.serialize_many(records)
+    self.assertEqual(bytes(buffer), inbytes + bytes(m.size()) + inbytes)
+    self.assertEqual(m.serialize_many(iter(records)), buffer)
+    self.assertEqual(m.serialize_many([]), bytearray())
+
+    # Into existing buffer, also from a generator
+    out = bytearray(b'\xFF' * (1 + 3 * m.size()))
+    self.assertEqual(m.serialize_many_into(out, 1, (r for r in records)), 3)
+    self.assertEqual(out[0], 0xFF)
+    self.assertEqual(out[1:], buffer)
+    self.assertRaises(Exception, m.serialize_many_into, out, 2, records)
+    self.assertRaises(Exception, m.serialize_many_into, out, 2, iter(records))
+    self.assertRaises(Exception, m.serialize_many, [{}, {'int8_low' : 1000}])
+
+    # Union
+    u = pycstruct.StructDef(union = True)
+    u.add('uint32', 'u32', byteorder = 'little')
+    u.add('uint8', 'u8')
+    out = bytearray(b'\xFF' * 8)
+    u.serialize_many_into(out, 0, [{'u8' : 1}, {'u32' : 0x02030405}])
+    self.assertEqual(bytes(out), bytes([1, 0, 0, 0, 5, 4, 3, 2]))
+
+  def test_iter_unpack(self):
+    m = pycstruct.StructDef()
+    m.add('uint16', 'index')
+    m.add('utf-8', 'name', length = 3)
+
+    records = [{'index' : i, 'name' : str(i)} for i in range(0, 100)]
+    data = b''.join([m.serialize(r) for r in records])
+
+    # Chunk sizes smaller than, not multiple of and larger than struct
+    for chunk_size in [1, 7, 65536]:
+      result = list(m.iter_unpack(io.BytesIO(data), chunk_size = chunk_size))
+      self.assertEqual(result, records)
+
+    # File-like object without readinto returning short reads
+    class ShortReader():
+      def __init__(self, data):
+        self.data = data
+      def read(self, size):
+        result = self.data[:min(size, 3)]
+        self.data = self.data[len(result):]
+        return result
+    self.assertEqual(list(m.iter_unpack(ShortReader(data), chunk_size = 50)), records)
+
+    # Path
+    filename = os.path.join(tempfile.gettempdir(), 'pycstruct_iter_unpack.dat')
+    with open(filename, 'wb') as f:
+      f.write(data)
+    self.assertEqual(list(m.iter_unpack(filename)), records)
+    os.remove(filename)
+
+    # Incomplete struct in the end
+    iterator = m.iter_unpack(io.BytesIO(data + bytes(2)), chunk_size = 5)
+    self.assertRaises(Exception, list, iterator)
+
+    self.assertRaises(Exception, list, pycstruct.StructDef().iter_unpack(io.BytesIO(data)))
+
+  def test_record_file(self):
+    m = pycstruct.StructDef('little')
+    m.add('uint32', 'index')
+    m.add('utf-8', 'name', length = 4)
+
+    records = [{'index' : i, 'name' : str(i)} for i in range(0, 50)]
+    filename = os.path.join(tempfile.gettempdir(), 'pycstruct_record_file.dat')
+    with open(filename, 'wb') as f:
+      f.write(b'HEAD')
+      for record in records:
+        f.write(m.serialize(record))
+      f.write(bytes(3)) # Incomplete record, shall be ignored
+
+    with pycstruct.RecordFile(filename, m, header_size = 4) as rf:
+      self.assertEqual(len(rf), 50)
+      self.assertEqual(rf.header(), b'HEAD')
+      self.assertEqual(rf[0], records[0])
+      self.assertEqual(rf[-1], records[-1])
+      self.assertEqual(rf[10:20:3], records[10:20:3])
+      self.assertEqual(list(rf), records)
+      self.assertEqual(rf.offset(2), 4 + 2 * m.size())
+      self.assertRaises(IndexError, rf.__getitem__, 50)
+      self.assertRaises(IndexError, rf.__getitem__, -51)
+      self.assertRaises(Exception, rf.__setitem__, 0, records[1])
+      self.assertEqual(rf.view(5).name, '5')
+
+    with pycstruct.RecordFile(filename, m, header_size = 4, writable = True) as rf:
+      rf[1] = {'index' : 1000, 'name' : 'new'}
+      rf[2:4] = [records[0], records[0]]
+      rf.view(4).index = 2000
+      self.assertRaises(Exception, rf.__setitem__, slice(2, 4), [records[0]])
+
+    with open(filename, 'rb') as f:
+      data = f.read()
+    self.assertEqual(m.deserialize(data[4 + m.size():4 + 2 * m.size()]),
+                     {'index' : 1000, 'name' : 'new'})
+    self.assertEqual(m.deserialize(data[4 + 3 * m.size():4 + 4 * m.size()]), records[0])
+    self.assertEqual(m.deserialize(data[4 + 4 * m.size():4 + 5 * m.size()])['index'], 2000)
+
+    # Empty file
+    with open(filename, 'wb') as f:
+      pass
+    with pycstruct.RecordFile(filename, m) as rf:
+      self.assertEqual(len(rf), 0)
+      self.assertEqual(list(rf), [])
+    os.remove(filename)
+
+    self.assertRaises(Exception, pycstruct.RecordFile, filename, pycstruct.StructDef())
+    self.assertRaises(Exception, pycstruct.RecordFile, filename, m, header_size = -1)
+
+  def test_view(self):
+    substruct = pycstruct.StructDef()
+    substruct.add('uint8', 'ss1')
+    substruct.add('int16', 'ss2')
+
+    bitfield = pycstruct.BitfieldDef()
+    bitfield.add('bf1', 3)
+    bitfield.add('bf2', 4, signed = True)
+
+    enum = pycstruct.EnumDef()
+    enum.add('zero')
+    enum.add('one')
+
+    s = pycstruct.StructDef(alignment = 4)
+    s.add('uint16', 'e1')
+    s.add('int32', 'array', length = 3)
+    s.add('utf-8', 'name', length = 8)
+    s.add(substruct, 'sub')
+    s.add(substruct, 'subs', length = 2)
+    s.add(substruct, 'flat', same_level = True)
+    s.add(bitfield, 'bf', same_level = True)
+    s.add(enum, 'enum')
+
+    data = {'e1' : 12, 'array' : [1, 2, 3], 'name' : 'hello', 'sub' : {'ss2' : -5},
+            'subs' : [{'ss1' : 1}, {'ss1' : 2}], 'ss1' : 7, 'ss2' : 8, 'bf1' : 5,
+            'bf2' : -3, 'enum' : 'one'}
+    buffer = bytearray(1) + s.serialize(data)
+
+    v = s.view(buffer, 1)
+    self.assertEqual(v.e1, 12)
+    self.assertEqual(v['array'], [1, 2, 3])
+    self.assertEqual(v.name, 'hello')
+    self.assertEqual(v.sub.ss2, -5)
+    self.assertEqual(v.subs[1]['ss1'], 2)
+    self.assertEqual(v.ss1, 7)
+    self.assertEqual(v.bf2, -3)
+    self.assertEqual(v.enum, 'one')
+    self.assertTrue('bf1' in v)
+    self.assertFalse('bf' in v)
+    self.assertTrue('ss2' in dir(v))
+    self.assertEqual(v.to_dict(), s.deserialize(buffer[1:]))
+    self.assertEqual(list(v), v.keys())
+    self.assertTrue('hello' in repr(v))
+
+    # Assignments are written to the buffer
+    v.e1 = 13
+    v['array'] = [4]
+    v.name = 'bye'
+    v.sub.ss1 = 9
+    v.subs = [{'ss2' : 10}]
+    v.bf1 = 2
+    v.enum = 'zero'
+    data.update({'e1' : 13, 'array' : [4, 0, 0], 'name' : 'bye', 'sub' : {'ss1' : 9, 'ss2' : -5},
+                 'subs' : [{'ss1' : 0, 'ss2' : 10}, {'ss1' : 0, 'ss2' : 0}], 'bf1' : 2,
+                 'enum' : 'zero'})
+    self.assertEqual(s.deserialize(buffer[1:]), data)
+
+    self.assertRaises(AttributeError, getattr, v, 'invalid')
+    self.assertRaises(AttributeError, setattr, v, 'invalid', 1)
+    self.assertRaises(KeyError, v.__getitem__, 'invalid')
+    self.assertRaises(KeyError, v.__setitem__, 'invalid', 1)
+    self.assertRaises(Exception, setattr, v, 'array', [1, 2, 3, 4])
+    self.assertRaises(Exception, s.view, buffer, 2)
+
+    # Read only buffer
+    v = s.view(bytes(buffer), 1)
+    self.assertEqual(v.e1, 13)
+    self.assertRaises(Exception, setattr, v, 'e1', 1)
+
+    # Union
+    u = pycstruct.StructDef(union = True)
+    u.add('uint8', 'small')
+    u.add('uint16', 'large')
+    v = u.view(bytearray(2))
+    v.large = 0x101
+    self.assertEqual(v.small, 1)
 
   def test_embedded_exception(self):
     unserializable = UnserializableDef()
@@ -419,6 +799,66 @@ class TestPyCStruct(unittest.TestCase):
 
 
 
+  def test_struct_mixed_byteorder(self):
+    m = pycstruct.StructDef('little')
+    m.add('uint16', 'little16')
+    m.add('uint16', 'big16', byteorder = 'big')
+    m.add('uint32', 'big32_array', length = 2, byteorder = 'big')
+    m.add('bool8', 'bools', length = 3)
+
+    buf = m.serialize({'little16' : 0x0102, 'big16' : 0x0304,
+                       'big32_array' : [0x05060708], 'bools' : [True, False, True]})
+    self.assertEqual(bytes(buf), bytes([2, 1, 3, 4, 5, 6, 7, 8, 0, 0, 0, 0, 1, 0, 1]))
+
+    result = m.deserialize(buf)
+    self.assertEqual(result['little16'], 0x0102)
+    self.assertEqual(result['big16'], 0x0304)
+    self.assertEqual(result['big32_array'], [0x05060708, 0])
+    self.assertEqual(result['bools'], [True, False, True])
+
+    # Arrays in another byteorder than the default
+    m.add('bool16', 'big_bools', length = 2, byteorder = 'big')
+    m.add('float32', 'big_floats', length = 1024, byteorder = 'big')
+    floats = [i * 0.25 for i in range(1000)]
+    buf = m.serialize({'big_bools' : [True, True], 'big_floats' : floats})
+    self.assertEqual(bytes(buf[15:19]), bytes([0, 1, 0, 1]))
+    self.assertEqual(bytes(buf[23:27]), struct.pack('>f', 0.25))
+    result = m.deserialize(buf)
+    self.assertEqual(result['big_bools'], [True, True])
+    self.assertEqual(result['big_floats'], floats + [0.0] * 24)
+    self.assertEqual(m.view(buf).big_floats[1], 0.25)
+    view = m.view(buf)
+    view.big32_array = [1]
+    self.assertEqual(m.deserialize(buf)['big32_array'], [1, 0])
+    self.assertRaises(Exception, m.serialize, {'big32_array' : [-1]})
+    self.assertRaises(Exception, m.serialize, {'big32_array' : [1, 2, 3]})
+
+    # Arrays in unions
+    u = pycstruct.StructDef('little', union = True)
+    u.add('uint16', 'big16', length = 2, byteorder = 'big')
+    u.add('bool8', 'bools', length = 4)
+    buf = u.serialize({'big16' : [0x0102]})
+    self.assertEqual(bytes(buf), bytes([1, 2, 0, 0]))
+    self.assertEqual(u.deserialize(buf), {'big16' : [0x0102, 0], 'bools' : [True, True, False, False]})
+    self.assertRaises(Exception, u.serialize, {'big16' : [0x10000]})
+
+  def test_struct_add_after_use(self):
+    m = pycstruct.StructDef()
+    m.add('uint8', 'e1')
+    self.assertEqual(m.deserialize(bytes([1])), {'e1' : 1})
+
+    # Layout shall be recompiled when elements are added or removed
+    m.add('uint8', 'e2')
+    self.assertEqual(m.deserialize(bytes([1, 2])), {'e1' : 1, 'e2' : 2})
+    self.assertEqual(m.serialize({'e2' : 3}), bytearray([0, 3]))
+
+    m.remove_from('e2')
+    self.assertEqual(m.deserialize(bytes([4])), {'e1' : 4})
+
+    # Invalid value for a basic type
+    self.assertRaises(Exception, m.serialize, {'e1' : 256})
+    self.assertRaises(Exception, m.serialize, {'e1' : 'invalid'})
+
   def test_struct_remove_from(self):
 
     m = pycstruct.StructDef()
@@ -465,6 +905,172 @@ class TestPyCStruct(unittest.TestCase):
     self.assertTrue('e5' in d)
     self.assertTrue('e6' in d)
 
+  def test_struct_size_cache(self):
+    m = pycstruct.StructDef(alignment = 4)
+    m.add('int8', 'e1')
+    m.add('int32', 'e2')
+    m.add('int8', 'e3')
+    self.assertEqual(m.size(), 12)
+    self.assertEqual(m._largest_member(), 4)
+
+    m.remove_from('e2')
+    self.assertEqual(m.size(), 4)
+    self.assertEqual(m._largest_member(), 1)
+
+    m.add('int16', 'e4')
+    self.assertEqual(m.size(), 6)
+    self.assertEqual(m._largest_member(), 2)
+
+    m.remove_to('e1')
+    self.assertEqual(m.size(), 5)
+    self.assertEqual(m._largest_member(), 2)
+
+    u = pycstruct.StructDef(alignment = 4, union = True)
+    u.add('int8', 'e1')
+    u.add(m, 'e2')
+    self.assertEqual(u.size(), 6)
+    u.remove_from('e2')
+    self.assertEqual(u.size(), 2)
+
+  def test_struct_embedded_changed(self):
+    # Nested struct growing after it was added
+    inner = pycstruct.StructDef()
+    inner.add('uint8', 'a')
+    outer = pycstruct.StructDef()
+    outer.add(inner, 'inner')
+    outer.add('uint8', 'b')
+    top = pycstruct.StructDef()
+    top.add(outer, 'outer')
+    self.assertEqual(outer.size(), 2)
+    outer.deserialize(bytes(2)) # Compile the codec
+    inner.add('uint8', 'c')
+    self.assertEqual(outer.size(), 3)
+    self.assertEqual(top.size(), 3)
+    data = {'inner' : {'a' : 1, 'c' : 2}, 'b' : 3}
+    self.assertEqual(outer.deserialize(outer.serialize(data)), data)
+
+    # Enum growing after it was added
+    e = pycstruct.EnumDef()
+    e.add('A', 1)
+    m = pycstruct.StructDef()
+    m.add('uint8', 'u8')
+    m.add(e, 'e')
+    self.assertEqual(m.serialize({'e' : 'A'}), bytes([0, 1]))
+    e.add('B', 1000)
+    self.assertEqual(m.size(), 3)
+    self.assertEqual(m.deserialize(m.serialize({'u8' : 1, 'e' : 'B'})), {'u8' : 1, 'e' : 'B'})
+
+    # Bitfield growing after it was added to a union
+    bitfield = pycstruct.BitfieldDef()
+    bitfield.add('a', 4)
+    u = pycstruct.StructDef(union = True)
+    u.add(bitfield, 'bitfield')
+    u.add('uint8', 'u8')
+    bitfield.add('b', 12)
+    self.assertEqual(u.size(), 2)
+
+  def test_pickle_copy(self):
+    inner = pycstruct.StructDef('big')
+    inner.add('int16', 'i16')
+    enum = pycstruct.EnumDef()
+    enum.add('a')
+    bitfield = pycstruct.BitfieldDef()
+    bitfield.add('b', 3)
+    m = pycstruct.StructDef('little', alignment = 4)
+    m.add('uint8', 'u8')
+    m.add('float32', 'floats', length = 3, byteorder = 'big')
+    m.add('utf-8', 'string', length = 5)
+    m.add('bytes', 'payload', length = 3)
+    m.add(inner, 'inner')
+    m.add(enum, 'enum')
+    m.add(bitfield, 'bitfield')
+    data = {'u8' : 1, 'floats' : [1.5, 2.5, 3.5], 'string' : 'abc', 'payload' : b'\x01\x02\x03',
+            'inner' : {'i16' : -2}, 'enum' : 'a', 'bitfield' : {'b' : 5}}
+    buf = m.serialize(data)
+    m.deserialize(buf) # Compile everything
+
+    for m_copy in [pickle.loads(pickle.dumps(m)), copy.deepcopy(m)]:
+      self.assertEqual(m_copy.size(), m.size())
+      self.assertEqual(m_copy.serialize(data), buf)
+      self.assertEqual(m_copy.deserialize(buf), m.deserialize(buf))
+
+    # The copy has its own parents
+    m_copy = copy.deepcopy(m)
+    inner_copy = [datatype for name, datatype, _, _, _ in m_copy._get_layout() if name == 'inner'][0]
+    self.assertFalse(inner_copy is inner)
+    inner_copy.add('int32', 'i32')
+    self.assertEqual(m_copy.size(), m.size() + 4)
+    inner.add('int8', 'i8')
+    self.assertEqual(m_copy.size(), m.size() + 3)
+    self.assertEqual(copy.deepcopy(inner)._parents, None)
+
+  def test_string_options(self):
+    self.assertRaises(Exception, pycstruct.StringDef, 8, encoding = 'invalid')
+
+    m = pycstruct.StructDef()
+    m.add('utf-8', 'utf8', length = 8)
+    m.add(pycstruct.StringDef(8, encoding = 'latin-1'), 'latin1')
+    m.add(pycstruct.StringDef(4, encoding = 'ascii', errors = 'replace'), 'ascii')
+    m.add(pycstruct.StringDef(4, raw = True), 'raw', length = 2)
+    self.assertEqual(m.size(), 28)
+
+    data = {'utf8' : 'åäö', 'latin1' : 'åäö', 'ascii' : 'aå', 'raw' : [b'\x01\x02', 'ab']}
+    buf = m.serialize(data)
+    self.assertEqual(buf, 'åäö'.encode('utf-8') + bytes(2) + 'åäö'.encode('latin-1') + bytes(5) +
+                     b'a?' + bytes(2) + b'\x01\x02' + bytes(2) + b'ab' + bytes(2))
+    result = m.deserialize(buf)
+    self.assertEqual(result, {'utf8' : 'åäö', 'latin1' : 'åäö', 'ascii' : 'a?',
+                              'raw' : [b'\x01\x02', b'ab']})
+    self.assertEqual(m.deserialize_from(memoryview(b'\x00' + buf), 1), result)
+
+    # Bytes are accepted as is, also when not raw
+    self.assertEqual(m.serialize({'utf8' : b'abc'})[:4], b'abc\x00')
+    self.assertRaises(Exception, m.serialize, {'raw' : [b'abcde']})
+    self.assertRaises(Exception, m.serialize, {'latin1' : '\u20ac'})
+
+    # Decode errors
+    s = pycstruct.StringDef(4)
+    self.assertRaises(Exception, s.deserialize, b'\xff\x00')
+    self.assertEqual(pycstruct.StringDef(4, errors = 'replace').deserialize(b'\xffa'), '\ufffda')
+    self.assertEqual(s.deserialize_from(bytearray(b'xab\x00c'), 1), 'ab')
+    self.assertEqual(s.deserialize_from(b'xabcd', 1), 'abcd')
+
+  def test_bytes(self):
+    m = pycstruct.StructDef('little', alignment = 4)
+    m.add('uint8', 'u8')
+    m.add('bytes', 'payload', length = 6)
+    m.add('uint32', 'u32')
+    m.add(pycstruct.BytesDef(3), 'blobs', length = 2)
+    self.assertEqual(m.size(), 20)
+    self.assertEqual(m._largest_member(), 4)
+
+    data = {'u8' : 1, 'payload' : memoryview(b'abc'), 'u32' : 2,
+            'blobs' : [bytearray(b'\x00\x01\x02'), array.array('B', [3])]}
+    buf = m.serialize(data)
+    self.assertEqual(buf, b'\x01abc' + bytes(4) + b'\x02\x00\x00\x00' + b'\x00\x01\x02\x03' +
+                     bytes(4))
+    result = m.deserialize(buf)
+    self.assertEqual(result, {'u8' : 1, 'payload' : b'abc\x00\x00\x00', 'u32' : 2,
+                              'blobs' : [b'\x00\x01\x02', b'\x03\x00\x00']})
+    self.assertEqual(type(result['payload']), bytes)
+    self.assertEqual(m.deserialize_from(memoryview(b'\x00' + buf), 1), result)
+    self.assertEqual(m.serialize({})[1:7], bytes(6))
+
+    # View and union
+    view = pycstruct.StructView(m, bytearray(buf))
+    self.assertEqual(view['payload'], b'abc\x00\x00\x00')
+    view['payload'] = b'xyz123'
+    self.assertEqual(view['payload'], b'xyz123')
+    u = pycstruct.StructDef(union = True)
+    u.add('bytes', 'raw', length = 4)
+    u.add('uint32', 'value', byteorder = 'big')
+    self.assertEqual(u.deserialize(u.serialize({'raw' : b'\x00\x00\x01'}))['value'], 256)
+
+    self.assertRaises(Exception, m.serialize, {'payload' : 'string'})
+    self.assertRaises(Exception, m.serialize, {'payload' : [1, 2]})
+    self.assertRaises(Exception, m.serialize, {'payload' : bytes(7)})
+    self.assertRaises(Exception, m.serialize, {'blobs' : [bytes(4)]})
+
   def test_bitfield_invalid_creation(self):
     # Invalid byteorder on creation
     self.assertRaises(Exception, pycstruct.BitfieldDef, 'invalid')
@@ -593,26 +1199,55 @@ class TestPyCStruct(unittest.TestCase):
     buffer = bytearray(b.size() + 1)
     self.assertRaises(Exception, b.deserialize, buffer)
 
+  def test_bitfield_all_values(self):
+    b = pycstruct.BitfieldDef()
+    b.add('unsigned', 3)
+    b.add('signed', 4, signed = True)
+    b.add('onesigned', 1, signed = True)
+    self.assertEqual(b.assigned_bits(), 8)
+    self.assertEqual(b.size(), 1)
+
+    for value in range(256):
+      result = b.deserialize(bytes([value]))
+      signed = (value >> 3) & 0xF
+      if signed >= 8:
+        signed -= 16
+      self.assertEqual(result['unsigned'], value & 0x7)
+      self.assertEqual(result['signed'], signed)
+      self.assertEqual(result['onesigned'], -1 if value & 0x80 else 0)
+      self.assertEqual(b.serialize(result)[0], value)
+
+    self.assertRaises(Exception, b.serialize, {'unsigned' : 8})
+    self.assertRaises(Exception, b.serialize, {'unsigned' : -1})
+    self.assertRaises(Exception, b.serialize, {'signed' : 8})
+    self.assertRaises(Exception, b.serialize, {'signed' : -9})
+    self.assertRaises(Exception, b.serialize, {'onesigned' : 1})
+
   def test_bitfield_getsubvalue(self):
-    bitstruct = pycstruct.BitfieldDef()
     value = int('0101110001010011', 2)
 
+    def get_subvalue(nbr_of_bits, start_bit, signed):
+      bitstruct = pycstruct.BitfieldDef('little', size = 2)
+      if start_bit > 0:
+        bitstruct.add('before', start_bit)
+      bitstruct.add('subvalue', nbr_of_bits, signed)
+      return bitstruct.deserialize(value.to_bytes(2, 'little'))['subvalue']
+
     # Unsigned tests
-    self.assertEqual(bitstruct._get_subvalue(value, nbr_of_bits = 1, start_bit = 0, signed = False), 1)
-    self.assertEqual(bitstruct._get_subvalue(value, nbr_of_bits = 4, start_bit = 0, signed = False), 3)
-    self.assertEqual(bitstruct._get_subvalue(value, nbr_of_bits = 16, start_bit = 0, signed = False), 23635)
-    self.assertEqual(bitstruct._get_subvalue(value, nbr_of_bits = 15, start_bit = 0, signed = False), 23635)
-    self.assertEqual(bitstruct._get_subvalue(value, nbr_of_bits = 14, start_bit = 2, signed = False), 5908)
-    self.assertEqual(bitstruct._get_subvalue(value, nbr_of_bits = 3, start_bit = 4, signed = False), 5)
+    self.assertEqual(get_subvalue(nbr_of_bits = 1, start_bit = 0, signed = False), 1)
+    self.assertEqual(get_subvalue(nbr_of_bits = 4, start_bit = 0, signed = False), 3)
+    self.assertEqual(get_subvalue(nbr_of_bits = 16, start_bit = 0, signed = False), 23635)
+    self.assertEqual(get_subvalue(nbr_of_bits = 15, start_bit = 0, signed = False), 23635)
+    self.assertEqual(get_subvalue(nbr_of_bits = 14, start_bit = 2, signed = False), 5908)
+    self.assertEqual(get_subvalue(nbr_of_bits = 3, start_bit = 4, signed = False), 5)
 
     # Signed tests
-    self.assertEqual(bitstruct._get_subvalue(value, nbr_of_bits = 1, start_bit = 0, signed = True), -1)
-    self.assertEqual(bitstruct._get_subvalue(value, nbr_of_bits = 4, start_bit = 0, signed = True), 3)
-    self.assertEqual(bitstruct._get_subvalue(value, nbr_of_bits = 16, start_bit = 0, signed = True), 23635)
-    self.assertEqual(bitstruct._get_subvalue(value, nbr_of_bits = 15, start_bit = 0, signed = True), -9133)
-    self.assertEqual(bitstruct._get_subvalue(value, nbr_of_bits = 14, start_bit = 2, signed = True), 5908)
-    self.assertEqual(bitstruct._get_subvalue(value, nbr_of_bits = 3, start_bit = 4, signed = True), -3)
-
+    self.assertEqual(get_subvalue(nbr_of_bits = 1, start_bit = 0, signed = True), -1)
+    self.assertEqual(get_subvalue(nbr_of_bits = 4, start_bit = 0, signed = True), 3)
+    self.assertEqual(get_subvalue(nbr_of_bits = 16, start_bit = 0, signed = True), 23635)
+    self.assertEqual(get_subvalue(nbr_of_bits = 15, start_bit = 0, signed = True), -9133)
+    self.assertEqual(get_subvalue(nbr_of_bits = 14, start_bit = 2, signed = True), 5908)
+    self.assertEqual(get_subvalue(nbr_of_bits = 3, start_bit = 4, signed = True), -3)
 
   def test_bitfield_setsubvalue(self):
     bitstruct = pycstruct.BitfieldDef()
@@ -684,6 +1319,32 @@ class TestPyCStruct(unittest.TestCase):
     # Get invalid name
     self.assertRaises(Exception, e.get_name, "invalid")
 
+  def test_enum_auto_value(self):
+    e = pycstruct.EnumDef(signed = True)
+    e.add("minus", -1)
+    e.add("one", 1)
+    e.add("two", 2)
+    e.add("auto0")
+    e.add("auto3")
+    e.add("alias", 3)
+    e.add("auto4")
+    self.assertEqual(e.get_value("auto0"), 0)
+    self.assertEqual(e.get_value("auto3"), 3)
+    self.assertEqual(e.get_value("auto4"), 4)
+
+    # First name of a value is used
+    self.assertEqual(e.get_name(3), "auto3")
+    self.assertEqual(e.deserialize(bytes([3])), "auto3")
+    self.assertEqual(e.deserialize(bytes([0xFF])), "minus")
+
+    # Failing add shall not assign the value
+    e = pycstruct.EnumDef(size = 1)
+    for i in range(256):
+      e.add("v{0}".format(i))
+    self.assertEqual(e.get_value("v255"), 255)
+    self.assertRaises(Exception, e.add, "v256")
+    self.assertEqual(e.size(), 1)
+
   def test_enum_fixed_unsigned(self):
     e = pycstruct.EnumDef(size = 4, signed = False)
 